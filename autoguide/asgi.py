@@ -5,12 +5,23 @@ It exposes the ASGI callable as a module-level variable named ``application``.
 
 For more information on this file, see
 https://docs.djangoproject.com/en/4.2/howto/deployment/asgi/
+
+Запуск, например: uvicorn autoguide.asgi:application --workers 4
+Горячие представления каталога — async (см. catalog/views.py).
 """
 
 import os
+import time
+
+_started = time.perf_counter()
 
-from django.core.asgi import get_asgi_application
+from django.core.asgi import get_asgi_application  # noqa: E402
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'autoguide.settings')
 
 application = get_asgi_application()
+
+# Прогрев до первого запроса и замеры старта (catalog/warmup.py)
+from catalog import warmup  # noqa: E402
+
+warmup.run('asgi', _started)
@@ -22,7 +22,8 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
-    'whitenoise.middleware.WhiteNoiseMiddleware',  # статика в проде
+    'catalog.middleware.StaticFilesMiddleware',  # статика в проде (WhiteNoise, умеет async)
+    'catalog.middleware.RequestMetricsMiddleware',  # Server-Timing, гистограммы, медленный SQL
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -37,15 +38,22 @@ TEMPLATES = [
     {
         'BACKEND': 'django.template.backends.django.DjangoTemplates',
         'DIRS': [BASE_DIR / 'templates'],  # общая папка шаблонов
-        'APP_DIRS': True,
         'OPTIONS': {
+            # Скомпилированные шаблоны живут в памяти процесса; templates/ компилируются
+            # ещё до первого запроса (прогрев, catalog/warmup.py)
+            'loaders': [
+                ('django.template.loaders.cached.Loader', [
+                    'django.template.loaders.filesystem.Loader',
+                    'django.template.loaders.app_directories.Loader',
+                ]),
+            ],
             'context_processors': [
                 'django.template.context_processors.debug',
                 'django.template.context_processors.request',
                 'django.contrib.auth.context_processors.auth',
                 'django.contrib.messages.context_processors.messages',
-                # === наше избранное (бейдж в шапке) ===
-                'catalog.context_processors.favorites_count',
+                # Процессоры проекта из METRICS_CONTEXT_PROCESSORS — с замером времени
+                'catalog.metrics.timed_context_processors',
             ],
         },
     },
@@ -53,12 +61,104 @@ TEMPLATES = [
 
 WSGI_APPLICATION = 'autoguide.wsgi.application'
 
-# База по умолчанию — SQLite (подходит нам)
+# База по умолчанию — SQLite (подходит нам).
+# AUTOGUIDE_DB — другой файл БД, например для бенчмарка (catalog/bench.py)
+# 'default' — запись, 'replica' — тот же файл для чтения каталога
+# (ReadWriteRouter, catalog/db.py). Соединения переиспользуются CONN_MAX_AGE секунд.
+DATABASE_FILE = os.environ.get('AUTOGUIDE_DB') or BASE_DIR / 'db.sqlite3'
 DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
-    }
+        'NAME': DATABASE_FILE,
+        'CONN_MAX_AGE': 600,
+        'CONN_HEALTH_CHECKS': True,
+    },
+    'replica': {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': DATABASE_FILE,
+        'CONN_MAX_AGE': 600,
+        'CONN_HEALTH_CHECKS': True,
+        'TEST': {'MIRROR': 'default'},
+    },
+}
+DATABASE_ROUTERS = ['catalog.db.ReadWriteRouter']
+CATALOG_READ_DB = 'replica'
+
+# PRAGMA на каждое новое соединение SQLite (catalog/db.py)
+SQLITE_PRAGMAS = {
+    'journal_mode': 'wal',
+    'synchronous': 'normal',
+    'busy_timeout': 5000,           # мс ждать блокировку до «database is locked»
+    'cache_size': -20000,           # ~20 МБ кеша страниц на соединение
+    'mmap_size': 256 * 1024 * 1024,
+    'temp_store': 'memory',
+}
+
+# Кеш. LocMemCache ('default') — свой у каждого процесса: в нём только то,
+# что можно пересчитать (карточки, счётчики, таблица сравнения; ключи
+# включают штампы). Штампы каталога, версии карточек и счётчики избранного
+# должны видеть все воркеры — они в 'shared' (SHARED_CACHE_ALIAS).
+# Больше одного воркера — только с общим 'shared': файловый на одной машине,
+# Memcached/Redis, если воркеры на разных; LocMemCache там не подходит —
+# воркеры будут отдавать 304 и устаревшие страницы. Файловый — свой класс
+# с атомарными add()/incr() для штампов (catalog/cache.py).
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'shared': {
+        'BACKEND': 'catalog.cache.LockingFileBasedCache',
+        'LOCATION': os.environ.get('AUTOGUIDE_SHARED_CACHE', BASE_DIR / 'var' / 'cache'),
+    },
+}
+SHARED_CACHE_ALIAS = 'shared'
+
+# Кеш карточек авто в списке (catalog/fragments.py)
+CARD_CACHE_ALIAS = 'default'
+CARD_CACHE_TIMEOUT = 24 * 60 * 60
+
+# Число результатов в списке авто считается не дальше этого порога,
+# сверх — «10000+» (catalog/counts.py)
+CAR_LIST_COUNT_LIMIT = 10_000
+
+# Сколько секунд обратный прокси может отдавать страницы каталога гостям
+# без перепроверки (s-maxage); дальше — условный запрос с ETag (catalog/stamps.py)
+CATALOG_PROXY_MAX_AGE = 60
+# Версия выкладки в ETag; пусто — отпечаток шаблонов и кода (stamps.release())
+CATALOG_RELEASE = os.environ.get('AUTOGUIDE_RELEASE', '')
+
+# Снимок индекса похожих авто (catalog/similar.py, команда build_similar_index)
+SIMILAR_INDEX_DIR = BASE_DIR / 'var' / 'similar'
+
+# Прогрев воркера до первого запроса (catalog/warmup.py): шаблоны, справочники,
+# соединения с БД и запросы к этим адресам. AUTOGUIDE_WARMUP=0 — выключить.
+WARMUP = os.environ.get('AUTOGUIDE_WARMUP', '1') != '0'
+WARMUP_URLS = ['/']
+
+# Замеры запросов (catalog/metrics.py). metrics/ — персоналу или сборщику
+# с заголовком Authorization: Bearer <METRICS_TOKEN>; пустой токен — только персоналу
+METRICS_TOKEN = os.environ.get('AUTOGUIDE_METRICS_TOKEN', '')
+# Контекст-процессоры проекта; вызываются через catalog.metrics.timed_context_processors,
+# их время — в Server-Timing: ctx
+METRICS_CONTEXT_PROCESSORS = [
+    # === наше избранное (бейдж в шапке) ===
+    'catalog.context_processors.favorites_count',
+    # === список сравнения (бейдж в шапке) ===
+    'catalog.context_processors.compare_ids',
+]
+# SQL дольше порога (мс) — в лог catalog.slow_sql
+SLOW_QUERY_MS = 100
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {'class': 'logging.StreamHandler'},
+    },
+    'loggers': {
+        'catalog.slow_sql': {'handlers': ['console'], 'level': 'WARNING', 'propagate': False},
+        'catalog.warmup': {'handlers': ['console'], 'level': 'INFO', 'propagate': False},
+    },
 }
 
 LANGUAGE_CODE = 'ru-ru'
@@ -72,6 +172,12 @@ STATIC_ROOT = BASE_DIR / 'staticfiles'     # для collectstatic
 
 MEDIA_URL = 'media/'
 MEDIA_ROOT = BASE_DIR / 'media'
+# Отдавать /media/ самим Django (иначе — прокси, см. catalog/storage.py)
+SERVE_MEDIA = DEBUG
+
+# Превью фото авто для srcset (catalog/images.py): ширины и число фоновых потоков
+CAR_IMAGE_WIDTHS = (320, 640, 960)
+CAR_IMAGE_WORKERS = 2
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
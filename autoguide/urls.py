@@ -1,7 +1,7 @@
 from django.conf import settings
-from django.conf.urls.static import static
 from django.contrib import admin
-from django.urls import path, include
+from django.urls import path, include, re_path
+from catalog import storage
 from catalog.views import RegisterView
 
 urlpatterns = [
@@ -11,5 +11,8 @@ urlpatterns = [
     path('accounts/register/', RegisterView.as_view(), name='register'),  # <-- регистрация
 ]
 
-if settings.DEBUG:
-    urlpatterns += static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
+if settings.SERVE_MEDIA:
+    # Фото с именами по хешу — с Cache-Control: immutable (catalog/storage.py)
+    urlpatterns += [
+        re_path(r'^%s(?P<path>.*)$' % settings.MEDIA_URL.lstrip('/'), storage.serve),
+    ]
@@ -5,12 +5,24 @@ It exposes the WSGI callable as a module-level variable named ``application``.
 
 For more information on this file, see
 https://docs.djangoproject.com/en/4.2/howto/deployment/wsgi/
+
+Горячие представления каталога — async (catalog/views.py): под WSGI каждое
+из них Django выполняет через async_to_sync, с отдельным event loop на
+запрос. Это работает, но дороже, чем под ASGI (autoguide/asgi.py).
 """
 
 import os
+import time
+
+_started = time.perf_counter()
 
-from django.core.wsgi import get_wsgi_application
+from django.core.wsgi import get_wsgi_application  # noqa: E402
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'autoguide.settings')
 
 application = get_wsgi_application()
+
+# Прогрев до первого запроса и замеры старта (catalog/warmup.py)
+from catalog import warmup  # noqa: E402
+
+warmup.run('wsgi', _started)
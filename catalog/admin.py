@@ -1,23 +1,114 @@
-from django.contrib import admin
+"""
+Админка для больших таблиц.
+
+Списки тянут связанные объекты одним JOIN (list_select_related), внешние
+ключи выбираются через автодополнение вместо <select> на все строки,
+а вместо точного COUNT(*) по всей выборке считается не больше
+COUNT_CAP строк («10000+»). Массовые действия — один UPDATE; производные
+данные, которые обычно поддерживают сигналы, обновляются после него явно.
+"""
+from decimal import Decimal
+
+from django.contrib import admin, messages
+from django.core.paginator import Paginator
+from django.db import transaction
+from django.db.models import F
+from django.db.models.functions import Round
+from django.utils.functional import cached_property
+
+from . import changes, fragments, pricestats, search, stamps
 from .models import Brand, CarModel, Car, Favorite
+from .pagination import capped_count
+
+# Дальше этого числа строк changelist не считает
+COUNT_CAP = 10_000
+
+
+class CappedCountPaginator(Paginator):
+    @cached_property
+    def count(self):
+        return capped_count(self.object_list, COUNT_CAP)
+
+
+class LargeTableAdmin(admin.ModelAdmin):
+    paginator = CappedCountPaginator
+    # Без второго COUNT(*) по всей таблице ради «N из M»
+    show_full_result_count = False
+
+
+# ---------- Массовые действия ----------
+def _cars_changed(pks):
+    """Сбросить кеши страниц авто после UPDATE в обход save()."""
+    # Индекс похожих авто дочитает журнал изменений сам (catalog/similar.py)
+    fragments.bump_cars(pks)
+    stamps.bump_cars(pks)
 
+
+def _price_action(percent):
+    factor = Decimal(100 + percent) / 100
+
+    def action(modeladmin, request, queryset):
+        pks = list(queryset.values_list('id', flat=True))
+        # Статистика цен: ячейки этих авто вычитаются до UPDATE и прибавляются после
+        with transaction.atomic(), pricestats.updating(pks):
+            updated = Car.objects.filter(id__in=pks).update(price=Round(F('price') * factor, 2))
+            changes.record_many('car', pks)
+        _cars_changed(pks)
+        modeladmin.message_user(request, f'Цена изменена у {updated} авто.', messages.SUCCESS)
+
+    action.__name__ = f'price_{"up" if percent > 0 else "down"}_{abs(percent)}'
+    return admin.action(description=f'Цена {percent:+d}%%', permissions=('change',))(action)
+
+
+# ---------- Модели ----------
 @admin.register(Brand)
 class BrandAdmin(admin.ModelAdmin):
     search_fields = ('name',)
 
+
 @admin.register(CarModel)
-class CarModelAdmin(admin.ModelAdmin):
+class CarModelAdmin(LargeTableAdmin):
     list_display = ('name', 'brand')
-    list_filter = ('brand',)
+    # Без list_filter = ('brand',): он выводил все марки списком; фильтр по
+    # марке — поиск или ?brand__id__exact=<id>
+    list_select_related = ('brand',)
     search_fields = ('name', 'brand__name')
+    autocomplete_fields = ('brand',)
+
 
 @admin.register(Car)
-class CarAdmin(admin.ModelAdmin):
+class CarAdmin(LargeTableAdmin):
     list_display = ('brand', 'model', 'year', 'engine_type', 'transmission', 'price')
-    list_filter = ('brand', 'engine_type', 'transmission', 'year')
-    search_fields = ('brand__name', 'model__name')
+    # Марка и модель — через поиск или ?brand__id__exact=<id>, а не список всех марок
+    list_filter = ('engine_type', 'transmission', 'year')
+    # model__brand: CarModel.__str__ выводит и марку
+    list_select_related = ('brand', 'model__brand')
+    search_fields = ('brand__name', 'model__name', 'description')
+    autocomplete_fields = ('brand', 'model')
+    actions = [_price_action(p) for p in (5, 10, -5, -10)]
+
+    def get_search_results(self, request, queryset, search_term):
+        # Поиск через FTS5-индекс вместо LIKE '%…%' по join'ам
+        if not search_term or not search.fts_available():
+            return super().get_search_results(request, queryset, search_term)
+        return search.apply(queryset, search_term), False
+
 
 @admin.register(Favorite)
-class FavoriteAdmin(admin.ModelAdmin):
+class FavoriteAdmin(LargeTableAdmin):
     list_display = ('user', 'car', 'created_at')
-    list_filter = ('user',)
+    list_select_related = ('user', 'car__brand', 'car__model')
+    autocomplete_fields = ('user', 'car')
+    # Фильтр по пользователю — ?user__id__exact=<id>; list_filter = ('user',)
+    # выводил всех пользователей списком
+    search_fields = ('user__username',)
+
+    def get_search_results(self, request, queryset, search_term):
+        # Точное совпадение по индексам: логин (unique) или id авто,
+        # без LIKE по всей таблице пользователей
+        term = search_term.strip()
+        if not term:
+            return queryset, False
+        if term.isdigit():
+            return queryset.filter(car_id=int(term)), False
+        return queryset.filter(user__username=term), False
@@ -0,0 +1,367 @@
+"""
+Read-only JSON API каталога (для мобильного клиента).
+
+Ответы собираются прямо из .values_list() — без экземпляров моделей,
+select_related и шаблонов — и сериализуются компактно (без пробелов,
+UTF-8 без \\uXXXX). Список:
+  - те же фильтры CarFilter, ?q= и ?sort=, что у CarListView;
+  - ?fields=id,brand,price — набор полей (см. FIELDS);
+  - ?limit= и ?cursor= — keyset-пагинация без COUNT(*);
+  - большие страницы отдаются потоком: первые байты уходят раньше,
+    чем БД дочитает выборку.
+Журнал изменений для синхронизации — api/changes/?since=<токен>
+(catalog/changes.py).
+Ответы сжимаются gzip, а brotli — если установлен пакет brotli.
+ETag строится по штампам каталога (catalog/stamps.py), поэтому повторный
+запрос без изменений отвечает 304, не трогая БД.
+"""
+import hashlib
+import json
+import re
+from decimal import Decimal
+from functools import wraps
+
+from django.conf import settings
+from django.http import HttpResponse, HttpResponseRedirect, StreamingHttpResponse
+from django.utils.cache import patch_cache_control, patch_vary_headers
+from django.views.decorators.gzip import gzip_page
+from django.views.decorators.http import condition, require_GET
+
+from . import changes, export, facets, lookups, pricestats, similar, stamps
+from .models import Brand, Car, CarModel
+from .pagination import ALLOWED_SORTS, decode_cursor, encode_cursor, normalize_sort, seek
+
+try:
+    import brotli
+except ImportError:  # необязательная зависимость
+    brotli = None
+
+# Имя поля в ответе -> путь для .values_list()
+FIELDS = dict(export.COLUMNS, brand_id='brand_id', model_id='model_id', image='image')
+LIST_FIELDS = ('id', 'brand', 'model', 'year', 'engine_type', 'transmission', 'price', 'image')
+DEFAULT_LIMIT = 20
+MAX_LIMIT = 1000
+# Страницы больше этого отдаём StreamingHttpResponse
+STREAM_FROM = 200
+# Авто в журнале изменений: связи — id, их строки приходят там же
+CHANGE_FIELDS = ('id', 'brand_id', 'model_id', 'year', 'engine_type', 'transmission',
+                 'price', 'image', 'description', 'created_at')
+SIMILAR_LIMIT = 6
+SIMILAR_MAX = 50
+CONTENT_TYPE = 'application/json'
+
+
+class ApiError(Exception):
+    pass
+
+
+# ---------- Сериализация ----------
+def _default(value):
+    if isinstance(value, Decimal):
+        return str(value)
+    if hasattr(value, 'isoformat'):
+        return value.isoformat()
+    raise TypeError(f'{type(value).__name__} не сериализуется в JSON')
+
+
+def dumps(data):
+    return json.dumps(data, default=_default, ensure_ascii=False, separators=(',', ':'))
+
+
+def _json(data, status=200):
+    return HttpResponse(dumps(data), content_type=CONTENT_TYPE, status=status)
+
+
+def _fields(request, default):
+    raw = request.GET.get('fields')
+    if not raw:
+        return list(default)
+    names = [n.strip() for n in raw.split(',') if n.strip()]
+    unknown = [n for n in names if n not in FIELDS]
+    if unknown or not names:
+        raise ApiError(f'fields: неизвестные поля {", ".join(unknown)}; доступны {", ".join(FIELDS)}')
+    return list(dict.fromkeys(names))
+
+
+def _limit(request, default=DEFAULT_LIMIT, maximum=MAX_LIMIT):
+    raw = request.GET.get('limit')
+    if not raw:
+        return default
+    try:
+        value = int(raw)
+    except ValueError:
+        raise ApiError('limit: нужно целое число')
+    if not 1 <= value <= maximum:
+        raise ApiError(f'limit: от 1 до {maximum}')
+    return value
+
+
+def _rows(queryset, names, extra=()):
+    """
+    (dict по полям names, хвост extra) для каждой строки.
+    extra — служебные колонки (ключ сортировки и id для курсора).
+    """
+    image_url = Car._meta.get_field('image').storage.url
+    paths = [FIELDS[n] for n in names] + list(extra)
+    with_image = 'image' in names
+    for row in queryset.values_list(*paths).iterator(chunk_size=export.CHUNK_SIZE):
+        data = dict(zip(names, row))
+        if with_image:
+            data['image'] = image_url(data['image']) if data['image'] else None
+        yield data, row[len(names):]
+
+
+# ---------- Сжатие ----------
+_BR_RE = re.compile(r'\bbr\b')
+
+
+def _brotli(response):
+    if response.status_code != 200 or response.has_header('Content-Encoding'):
+        return response
+    patch_vary_headers(response, ('Accept-Encoding',))
+    if response.streaming:
+        compressor = brotli.Compressor()
+
+        def chunks(content):
+            for chunk in content:
+                data = compressor.process(chunk)
+                if data:
+                    yield data
+            yield compressor.finish()
+
+        async def async_chunks(content):
+            async for chunk in content:
+                data = compressor.process(chunk)
+                if data:
+                    yield data
+            yield compressor.finish()
+
+        wrap = async_chunks if response.is_async else chunks
+        response.streaming_content = wrap(response.streaming_content)
+        del response.headers['Content-Length']
+    else:
+        if len(response.content) < 200:
+            return response
+        response.content = brotli.compress(response.content)
+        response.headers['Content-Length'] = str(len(response.content))
+    etag = response.get('ETag')
+    if etag and etag.startswith('"'):
+        response.headers['ETag'] = 'W/' + etag
+    response.headers['Content-Encoding'] = 'br'
+    return response
+
+
+def compressed(view):
+    """brotli, если клиент его принимает и пакет установлен, иначе gzip."""
+    gzipped = gzip_page(view)
+
+    @wraps(view)
+    def inner(request, *args, **kwargs):
+        if brotli is None or not _BR_RE.search(request.META.get('HTTP_ACCEPT_ENCODING', '')):
+            return gzipped(request, *args, **kwargs)
+        return _brotli(view(request, *args, **kwargs))
+    return inner
+
+
+# ---------- Кеширование ----------
+def _etag(request, *args, pk=None, **kwargs):
+    parts = [request.path, request.GET.urlencode(), stamps.release()]
+    if pk is not None:
+        parts += [str(stamps.get('car', pk)), str(stamps.get('names'))]
+    else:
+        parts.append(str(stamps.get()))
+    return hashlib.md5('|'.join(parts).encode()).hexdigest()
+
+
+def api_view(view):
+    """GET-only, ApiError -> 400, ETag по штампам, сжатие, Cache-Control для прокси."""
+    @wraps(view)
+    def guarded(request, *args, **kwargs):
+        try:
+            return view(request, *args, **kwargs)
+        except ApiError as exc:
+            return _json({'error': str(exc)}, status=400)
+
+    conditional = condition(etag_func=_etag)(guarded)
+
+    @wraps(view)
+    def inner(request, *args, **kwargs):
+        response = conditional(request, *args, **kwargs)
+        if response.status_code in (200, 304):
+            # Данные общие для всех — можно кешировать на прокси
+            patch_cache_control(response, public=True, max_age=0,
+                                s_maxage=getattr(settings, 'CATALOG_PROXY_MAX_AGE', 60))
+        return response
+    return require_GET(compressed(inner))
+
+
+# ---------- Представления ----------
+def _list_chunks(rows, sort, limit):
+    """Тело ответа списка по кускам: {"results":[...],"next":"<курсор>"|null}."""
+    yield '{"results":['
+    last = None
+    for n, (data, extra) in enumerate(rows):
+        if n == limit:
+            # Строка limit+1 только говорит, что дальше что-то есть
+            break
+        yield (',' if n else '') + dumps(data)
+        last = extra
+    else:
+        last = None
+    cursor = None
+    if last and sort:
+        value, pk = last
+        cursor = encode_cursor(sort, {sort.lstrip('-'): value, 'id': pk})
+    yield '],"next":' + dumps(cursor) + '}'
+
+
+@api_view
+def car_list(request):
+    names = _fields(request, LIST_FIELDS)
+    limit = _limit(request)
+    filterset, qs = export.filtered_queryset(request.GET)
+    if qs is None:
+        return _json({'errors': filterset.errors}, status=400)
+    sort = normalize_sort(request.GET.get('sort'))
+    if request.GET.get('q') and request.GET.get('sort') not in ALLOWED_SORTS:
+        # Выдача по релевантности — одна страница, курсора нет
+        sort = None
+    token = request.GET.get('cursor')
+    if token:
+        decoded = decode_cursor(token, sort) if sort else None
+        if decoded is None or decoded[0] != 'next':
+            raise ApiError('cursor: неверный курсор')
+        qs = seek(qs, sort, *decoded)
+    extra = (sort.lstrip('-'), 'id') if sort else ()
+    chunks = _list_chunks(_rows(qs[:limit + 1], names, extra), sort, limit)
+    if limit >= STREAM_FROM:
+        # Под ASGI — асинхронный итератор, иначе Django соберёт тело в память
+        return StreamingHttpResponse(export.streaming(request, chunks), content_type=CONTENT_TYPE)
+    return HttpResponse(''.join(chunks), content_type=CONTENT_TYPE)
+
+
+@api_view
+def car_detail(request, pk):
+    names = _fields(request, FIELDS)
+    for data, _ in _rows(Car.objects.filter(pk=pk), names):
+        return _json(data)
+    return _json({'error': 'не найдено'}, status=404)
+
+
+@api_view
+def car_similar(request, car_id):
+    """
+    Похожие авто (catalog/similar.py): ?limit= штук, по умолчанию 6;
+    фильтры CarFilter ограничивают кандидатов. Без NumPy — пустой список.
+    Параметр пути не pk: ответ зависит от всего каталога, ETag — по общему штампу.
+    """
+    names = _fields(request, LIST_FIELDS)
+    limit = min(_limit(request) if request.GET.get('limit') else SIMILAR_LIMIT, SIMILAR_MAX)
+    filterset, qs = export.filtered_queryset(request.GET)
+    if qs is None:
+        return _json({'errors': filterset.errors}, status=400)
+    ranked = similar.similar_ids(car_id, limit, filterset)
+    rows = {extra[0]: data for data, extra in
+            _rows(Car.objects.filter(pk__in=[i for i, _ in ranked]), names, ('id',))}
+    results = []
+    for car_id, distance in ranked:
+        data = rows.get(car_id)
+        if data is not None:
+            results.append(dict(data, distance=round(distance, 4)))
+    return _json({'results': results})
+
+
+@api_view
+def change_list(request):
+    """
+    Изменения каталога после ?since= (токен из прошлого ответа, 0 — с начала),
+    не больше ?limit= записей журнала; ?fields= — поля авто:
+    {"changes":{"brand":{"changed":[...],"deleted":[id,...]},"model":{...},"car":{...}},
+     "next":"<токен>","more":true|false}
+    Виды без изменений в пачке не выводятся; при "more" — сразу за следующей.
+    """
+    try:
+        since = changes.parse_token(request.GET.get('since'))
+    except ValueError:
+        raise ApiError('since: неверный токен')
+    limit = _limit(request, changes.DEFAULT_LIMIT, changes.MAX_LIMIT)
+    names = _fields(request, CHANGE_FIELDS)
+    if 'id' not in names:
+        names.insert(0, 'id')
+    changed, token, more = changes.batch(since, limit)
+    result = {}
+    for kind, items in changed.items():
+        if not items:
+            continue
+        ids = [pk for pk, deleted in items.items() if not deleted]
+        if kind == 'car':
+            rows = [data for data, _ in _rows(Car.objects.filter(id__in=ids).order_by('id'), names)]
+        else:
+            rows = changes.names(kind, ids)
+        result[kind] = {'changed': rows,
+                        'deleted': sorted(pk for pk, deleted in items.items() if deleted)}
+    return _json({'changes': result, 'next': str(token), 'more': more})
+
+
+@api_view
+def facet_list(request):
+    filterset, qs = export.filtered_queryset(request.GET)
+    if qs is None:
+        return _json({'errors': filterset.errors}, status=400)
+    counts = facets.facet_counts(filterset)
+    counts['year_buckets'] = [
+        {'from': start, 'to': end, 'count': n} for start, end, n in facets.year_buckets(counts)
+    ]
+    return _json(counts)
+
+
+@api_view
+def price_stats(request):
+    """
+    Гистограммы цены и года и мин./ср./макс. цены для тех же фильтров, что
+    у списка, — из CarPriceStat, без прохода по Car (catalog/pricestats.py).
+    """
+    filterset, qs = export.filtered_queryset(request.GET)
+    if qs is None:
+        return _json({'errors': filterset.errors}, status=400)
+    stats = pricestats.histograms(filterset)
+    bucket = stats['bucket']
+    stats['price'] = [{'from': start, 'to': start + bucket, 'count': n} for start, n in stats['price']]
+    stats['year'] = [{'year': year, 'count': n} for year, n in stats['year']]
+    return _json(stats)
+
+
+@api_view
+def brand_list(request):
+    return _json(list(Brand.objects.order_by('name').values('id', 'name')))
+
+
+@api_view
+def model_list(request):
+    # ?brand=, как у остальных эндпоинтов (brand_id — старое имя); без него — все модели
+    qs = CarModel.objects.order_by('name')
+    brand_id = request.GET.get('brand') or request.GET.get('brand_id')
+    if brand_id:
+        if not brand_id.isdigit():
+            raise ApiError('brand: нужно целое число')
+        qs = qs.filter(brand_id=brand_id)
+    return _json(list(qs.values('id', 'brand_id', 'name')))
+
+
+@require_GET
+@compressed
+def brand_models(request, digest):
+    """
+    Весь справочник марка → модели (catalog/lookups.py). Адрес содержит хеш
+    содержимого, поэтому ответ неизменяем и кешируется навсегда; устаревший
+    хеш перенаправляется на текущий.
+    """
+    lookup = lookups.get()
+    if digest != lookup.digest:
+        response = HttpResponseRedirect(lookup.url)
+        patch_cache_control(response, no_cache=True)
+        return response
+    response = HttpResponse(lookup.payload, content_type=CONTENT_TYPE)
+    response['ETag'] = f'"{lookup.digest}"'
+    patch_cache_control(response, public=True, max_age=365 * 24 * 60 * 60, immutable=True)
+    return response
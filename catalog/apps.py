@@ -4,3 +4,11 @@ from django.apps import AppConfig
 class CatalogConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'catalog'
+
+    def ready(self):
+        from . import signals  # noqa: F401  (регистрация обработчиков)
+        from . import db, metrics, warmup
+        db.install()
+        metrics.install()
+        # Отметка для замеров старта; сам прогрев — из wsgi.py/asgi.py (catalog/warmup.py)
+        warmup.mark('ready')
@@ -0,0 +1,581 @@
+"""
+Бенчмарк каталога: генератор синтетических данных и прогон сценариев.
+
+Генератор (команда bench_generate) детерминирован: один и тот же --seed
+даёт один и тот же каталог. Данные пишутся bulk_create пачками в обход
+сигналов, производные таблицы (фасеты, FTS, счётчики избранного)
+пересчитываются в конце. Генерировать лучше в отдельную БД:
+
+    AUTOGUIDE_DB=bench.sqlite3 python manage.py migrate
+    AUTOGUIDE_DB=bench.sqlite3 python manage.py bench_generate --cars 1000000
+    AUTOGUIDE_DB=bench.sqlite3 python manage.py bench_run --output bench.json
+
+Прогон (команда bench_run) ходит тестовым клиентом Django по сценариям
+(список со всеми фильтрами и сортировками, глубокие страницы, карточка,
+сравнение, модели марки, избранное, API) и для каждого считает задержку
+p50/p95/p99 и число SQL-запросов на запрос. Результат — JSON, который
+можно сравнить с сохранённым базовым прогоном.
+
+bench_similar — индекс похожих авто на синтетическом миллионе (без БД).
+
+bench_contention — читатели и писатели одновременно в режимах журнала
+SQLite delete и wal: видно, кто кого ждёт и сколько «database is locked».
+
+bench_cold_start — старт нового процесса (импорт autoguide.wsgi) и первые
+запросы к нему, с прогревом (catalog/warmup.py) и без.
+"""
+import json
+import math
+import os
+import platform
+import random
+import sqlite3
+import statistics
+import subprocess
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import ExitStack
+from datetime import datetime, timezone
+from decimal import Decimal
+
+import django
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.conf import settings
+from django.db import connection, connections, transaction
+from django.db.models import Max, Min, Sum
+from django.test import Client
+from django.test.utils import CaptureQueriesContext, override_settings
+
+from . import changes, facets, favorites, pricestats, search, similar, stamps
+from .compare import COOKIE_NAME as COMPARE_COOKIE, MAX_CARS as COMPARE_MAX, cookie_value
+from .models import Brand, Car, CarFacet, CarModel, Favorite
+from .pagination import ALLOWED_SORTS, encode_cursor, ordering_for
+
+BATCH = 5000
+USER_PREFIX = 'bench_user_'
+WORDS = ('пробег', 'один владелец', 'сервисная книжка', 'не бит', 'не крашен',
+         'зимняя резина', 'кожаный салон', 'панорама', 'подогрев сидений',
+         'камера заднего вида', 'полный привод', 'турбо', 'гарантия', 'торг',
+         'обмен', 'такси не был', 'дилерский', 'тюнинг', 'ксенон', 'парктроник')
+ENGINES = [value for value, _ in Car.ENGINE_CHOICES]
+TRANSMISSIONS = [value for value, _ in Car.TRANSMISSION_CHOICES]
+
+
+# ---------- Генератор ----------
+def generate(cars=10000, brands=50, models_per_brand=20, users=100,
+             favorites_per_user=20, seed=42, progress=None):
+    """Создаёт синтетический каталог. Возвращает dict с числом созданных строк."""
+    rnd = random.Random(seed)
+    progress = progress or (lambda message: None)
+
+    Brand.objects.bulk_create([Brand(name=f'Bench {n:05d}') for n in range(brands)],
+                              batch_size=BATCH, ignore_conflicts=True)
+    brand_ids = list(Brand.objects.filter(name__startswith='Bench ')
+                     .order_by('id').values_list('id', flat=True))
+    changes.record_many('brand', brand_ids)
+    CarModel.objects.bulk_create(
+        [CarModel(brand_id=b, name=f'M{n:04d}') for b in brand_ids for n in range(models_per_brand)],
+        batch_size=BATCH, ignore_conflicts=True,
+    )
+    models = list(CarModel.objects.filter(brand_id__in=brand_ids)
+                  .order_by('id').values_list('id', 'brand_id'))
+    changes.record_many('model', [pk for pk, _ in models])
+    progress(f'марок: {len(brand_ids)}, моделей: {len(models)}')
+
+    # Популярность моделей неравномерная, как в жизни: несколько моделей дают
+    # большую часть объявлений
+    weights = [1 / (rank + 1) for rank in range(len(models))]
+    rnd.shuffle(weights)
+    created = 0
+    while created < cars:
+        size = min(BATCH, cars - created)
+        picked = rnd.choices(models, weights=weights, k=size)
+        batch = []
+        for model_id, brand_id in picked:
+            batch.append(Car(
+                brand_id=brand_id, model_id=model_id,
+                year=rnd.randint(1995, 2025),
+                engine_type=rnd.choice(ENGINES),
+                transmission=rnd.choice(TRANSMISSIONS),
+                price=Decimal(rnd.randrange(100_000, 15_000_000, 1000)),
+                description=', '.join(rnd.sample(WORDS, 3)),
+            ))
+        with transaction.atomic():
+            Car.objects.bulk_create(batch)
+            changes.record_many('car', [c.pk for c in batch])
+        created += size
+        progress(f'авто: {created}/{cars}')
+
+    User = get_user_model()
+    User.objects.bulk_create(
+        [User(username=f'{USER_PREFIX}{n:05d}', password='!') for n in range(users)],
+        batch_size=BATCH, ignore_conflicts=True,
+    )
+    user_ids = list(User.objects.filter(username__startswith=USER_PREFIX)
+                    .values_list('id', flat=True))
+    bounds = Car.objects.aggregate(lo=Min('id'), hi=Max('id'))
+    fav_rows = [Favorite(user_id=u, car_id=rnd.randint(bounds['lo'], bounds['hi']))
+                for u in user_ids for _ in range(favorites_per_user)] if bounds['lo'] else []
+    with transaction.atomic():
+        # id могут быть с дырами — Favorite на несуществующее авто не вставится
+        existing = set(Car.objects.filter(id__in={f.car_id for f in fav_rows})
+                       .values_list('id', flat=True)) if fav_rows else set()
+        Favorite.objects.bulk_create([f for f in fav_rows if f.car_id in existing],
+                                     batch_size=BATCH, ignore_conflicts=True)
+    progress(f'пользователей: {len(user_ids)}')
+
+    progress('пересчёт фасетов, поискового индекса и счётчиков избранного...')
+    facets.rebuild()
+    pricestats.rebuild()
+    search.rebuild()
+    favorites.repair(user_ids)
+    stamps.bump_names()
+    stamps.bump_catalog()
+    return {'brands': len(brand_ids), 'models': len(models), 'cars': created,
+            'users': len(user_ids), 'favorites': Favorite.objects.filter(user_id__in=user_ids).count()}
+
+
+# ---------- Сценарии ----------
+def _probe():
+    """Значения для фильтров: самые частые марка/модель, середина годов и цен."""
+    top = (CarFacet.objects.values('brand_id', 'model_id')
+           .annotate(n=Sum('count')).order_by('-n').first())
+    if top is None:
+        return None
+    years = Car.objects.aggregate(lo=Min('year'), hi=Max('year'))
+    mid_year = (years['lo'] + years['hi']) // 2
+    price = Car.objects.order_by('price').values_list('price', flat=True)[
+        Car.objects.count() // 2]
+    word = Car.objects.exclude(description='').values_list('description', flat=True).first()
+    return {
+        'brand': top['brand_id'], 'model': top['model_id'],
+        'year_min': mid_year - 2, 'year_max': mid_year + 2,
+        'price_min': int(price * Decimal('0.8')), 'price_max': int(price * Decimal('1.2')),
+        'engine_type': ENGINES[0], 'transmission': TRANSMISSIONS[0],
+        'q': (word or 'пробег').split(',')[0].split()[0],
+    }
+
+
+def scenarios(deep_fraction=0.9):
+    """
+    ([(имя, метод, url, параметры, клиент), ...], id авто для сравнения) по текущей БД.
+    клиент: False — гость, True — вошедший пользователь, 'compare' — со списком сравнения.
+    """
+    probe = _probe()
+    if probe is None:
+        return [], []
+    filters = {
+        'none': {},
+        'brand': {'brand': probe['brand']},
+        'brand_model': {'brand': probe['brand'], 'model': probe['model']},
+        'year': {'year_min': probe['year_min'], 'year_max': probe['year_max']},
+        'price': {'price_min': probe['price_min'], 'price_max': probe['price_max']},
+        'engine': {'engine_type': probe['engine_type']},
+        'transmission': {'transmission': probe['transmission']},
+        'search': {'q': probe['q']},
+    }
+    result = []
+    for fname, params in filters.items():
+        for sort in ALLOWED_SORTS:
+            result.append((f'list[{fname},{sort}]', 'get', '/', dict(params, sort=sort), False))
+    result.append(('list[search,rank]', 'get', '/', filters['search'], False))
+
+    total = Car.objects.count()
+    per_page = 9
+    deep = max(0, int(total * deep_fraction) // per_page * per_page)
+    for sort in ALLOWED_SORTS:
+        result.append((f'list_deep_page[{sort}]', 'get', '/',
+                       {'sort': sort, 'page': deep // per_page + 1}, False))
+        row = Car.objects.order_by(*ordering_for(sort))[deep:deep + 1].first()
+        if row is not None:
+            result.append((f'list_deep_cursor[{sort}]', 'get', '/',
+                           {'sort': sort, 'cursor': encode_cursor(sort, row)}, False))
+
+    car_ids = list(Car.objects.filter(model_id=probe['model'])
+                   .order_by('id').values_list('id', flat=True)[:4])
+    result += [
+        ('detail', 'get', f'/cars/{car_ids[0]}/', {}, False),
+        ('compare', 'get', '/compare/', {}, 'compare'),
+        ('load_models', 'get', '/ajax/models/', {'brand_id': probe['brand']}, False),
+        ('favorite_toggle', 'get', f'/favorites/toggle/{car_ids[0]}/', {}, True),
+        ('api_list', 'get', '/api/cars/', {'limit': 100}, False),
+        ('api_facets', 'get', '/api/facets/', {'brand': probe['brand']}, False),
+        ('api_price_stats', 'get', '/api/price-stats/', {'brand': probe['brand']}, False),
+    ]
+    return result, car_ids
+
+
+# ---------- Прогон ----------
+def _client(auth, car_ids, user, **kwargs):
+    client = Client(**kwargs)
+    if auth is True:
+        client.force_login(user)
+    elif auth == 'compare':
+        client.cookies[COMPARE_COOKIE] = cookie_value(car_ids[:COMPARE_MAX])
+    return client
+
+
+def _percentile(values, p):
+    ordered = sorted(values)
+    # nearest-rank
+    return ordered[max(0, math.ceil(p / 100 * len(ordered)) - 1)]
+
+
+def _measure(client, method, url, params, headers):
+    # Запросы на всех алиасах: чтение каталога уходит в алиас реплики (catalog/db.py)
+    with ExitStack() as stack:
+        captured = [stack.enter_context(CaptureQueriesContext(connections[alias]))
+                    for alias in connections]
+        started = time.perf_counter()
+        response = getattr(client, method)(url, params, **headers)
+        if response.streaming:
+            b''.join(response.streaming_content)
+        elapsed = time.perf_counter() - started
+    return elapsed * 1000, sum(len(queries) for queries in captured), response.status_code
+
+
+def _throughput(method, url, params, auth, car_ids, user, concurrency, requests):
+    """
+    (запросов в секунду, число ответов 5xx) при concurrency параллельных
+    клиентах (потоках). Ошибки вроде «database is locked» не прерывают прогон.
+    """
+    def worker(count):
+        client = _client(auth, car_ids, user, raise_request_exception=False)
+        errors = 0
+        try:
+            for _ in range(count):
+                response = getattr(client, method)(url, params,
+                                                   HTTP_X_REQUESTED_WITH='XMLHttpRequest')
+                errors += response.status_code >= 500
+        finally:
+            connections.close_all()  # у каждого потока свои соединения
+        return errors
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(concurrency) as pool:
+        per_worker = max(1, requests // concurrency)
+        errors = sum(pool.map(worker, [per_worker] * concurrency))
+    return round(per_worker * concurrency / (time.perf_counter() - started), 1), errors
+
+
+def run(repeat=30, warmup=3, only=None, cold=False, concurrency=0, progress=None):
+    """Прогон всех сценариев; возвращает dict, готовый для json.dump."""
+    progress = progress or (lambda message: None)
+    items, car_ids = scenarios()
+    user = (get_user_model().objects.filter(username__startswith=USER_PREFIX).first()
+            or get_user_model().objects.first())
+    results = {}
+    # Тестовому клиенту нужен хост testserver
+    with override_settings(ALLOWED_HOSTS=['testserver', 'localhost']):
+        for name, method, url, params, auth in items:
+            if only and not any(part in name for part in only):
+                continue
+            if auth is True and user is None:
+                continue
+            client = _client(auth, car_ids, user)
+            headers = {'HTTP_X_REQUESTED_WITH': 'XMLHttpRequest'}
+            for _ in range(warmup):
+                getattr(client, method)(url, params, **headers)
+            timings, query_counts, statuses = [], [], set()
+            for _ in range(repeat):
+                if cold:
+                    cache.clear()
+                ms, n, status = _measure(client, method, url, params, headers)
+                timings.append(ms)
+                query_counts.append(n)
+                statuses.add(status)
+            results[name] = {
+                'url': url, 'params': {k: str(v) for k, v in params.items()},
+                'p50_ms': round(_percentile(timings, 50), 3),
+                'p95_ms': round(_percentile(timings, 95), 3),
+                'p99_ms': round(_percentile(timings, 99), 3),
+                'mean_ms': round(statistics.fmean(timings), 3),
+                'queries': statistics.median_low(query_counts),
+                'queries_max': max(query_counts),
+                'status': sorted(statuses),
+            }
+            if concurrency:
+                rps, errors = _throughput(method, url, params, auth, car_ids, user,
+                                          concurrency, repeat * concurrency)
+                results[name].update(rps=rps, errors=errors)
+            progress(f"{name}: p50 {results[name]['p50_ms']} мс, "
+                     f"p95 {results[name]['p95_ms']} мс, запросов {results[name]['queries']}")
+    return {'meta': _meta(repeat, cold, concurrency), 'results': results}
+
+
+def _meta(repeat, cold, concurrency=0):
+    return {
+        'created': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'django': django.get_version(),
+        'sqlite': sqlite3.sqlite_version,
+        'vendor': connection.vendor,
+        'cars': Car.objects.count(),
+        'brands': Brand.objects.count(),
+        'models': CarModel.objects.count(),
+        'favorites': Favorite.objects.count(),
+        'repeat': repeat,
+        'cold_cache': cold,
+        'concurrency': concurrency,
+    }
+
+
+# ---------- Читатели против писателей ----------
+def _summary(timings, errors, seconds):
+    if not timings:
+        return {'ops': 0, 'ops_per_s': 0, 'errors': errors}
+    return {
+        'ops': len(timings),
+        'ops_per_s': round(len(timings) / seconds, 1),
+        'p50_ms': round(_percentile(timings, 50), 3),
+        'p95_ms': round(_percentile(timings, 95), 3),
+        'p99_ms': round(_percentile(timings, 99), 3),
+        'max_ms': round(max(timings), 3),
+        'errors': errors,
+    }
+
+
+def _contend(mode, readers, writers, seconds, car_ids, users):
+    """Один прогон: readers потоков читают список, writers — переключают избранное."""
+    connections.close_all()
+    pragmas = dict(settings.SQLITE_PRAGMAS, journal_mode=mode)
+    with override_settings(SQLITE_PRAGMAS=pragmas):
+        # Режим журнала переключается на первом соединении после close_all()
+        Car.objects.using('default').exists()
+        deadline = time.perf_counter() + seconds
+
+        def reader(n):
+            client = Client(raise_request_exception=False)
+            params = [{}, {'sort': 'price'}, {'sort': '-year'}, {'page': 2}]
+            timings, errors = [], 0
+            try:
+                while time.perf_counter() < deadline:
+                    started = time.perf_counter()
+                    response = client.get('/', params[(n + len(timings)) % len(params)])
+                    timings.append((time.perf_counter() - started) * 1000)
+                    errors += response.status_code >= 500
+            finally:
+                connections.close_all()
+            return 'read', timings, errors
+
+        def writer(n):
+            client = _client(True, car_ids, users[n % len(users)], raise_request_exception=False)
+            timings, errors = [], 0
+            try:
+                while time.perf_counter() < deadline:
+                    car_id = car_ids[(n + len(timings)) % len(car_ids)]
+                    started = time.perf_counter()
+                    response = client.get(f'/favorites/toggle/{car_id}/',
+                                          HTTP_X_REQUESTED_WITH='XMLHttpRequest')
+                    timings.append((time.perf_counter() - started) * 1000)
+                    errors += response.status_code >= 500
+            finally:
+                connections.close_all()
+            return 'write', timings, errors
+
+        jobs = [(reader, n) for n in range(readers)] + [(writer, n) for n in range(writers)]
+        collected = {'read': ([], 0), 'write': ([], 0)}
+        with ThreadPoolExecutor(len(jobs)) as pool:
+            for role, timings, errors in pool.map(lambda job: job[0](job[1]), jobs):
+                all_timings, all_errors = collected[role]
+                collected[role] = (all_timings + timings, all_errors + errors)
+    connections.close_all()
+    return {role: _summary(timings, errors, seconds)
+            for role, (timings, errors) in collected.items()}
+
+
+def contention(readers=4, writers=2, seconds=5.0, modes=('delete', 'wal'), progress=None):
+    """
+    Читатели (страница списка) и писатели (переключение избранного, сессия)
+    одновременно, для каждого режима журнала SQLite из modes: пропускная
+    способность, задержки и число ответов 5xx («database is locked») по ролям.
+    """
+    progress = progress or (lambda message: None)
+    _, car_ids = scenarios()
+    users = list(get_user_model().objects.filter(username__startswith=USER_PREFIX)[:max(writers, 1)])
+    if writers and not users:
+        users = list(get_user_model().objects.all()[:1])
+    results = {}
+    with override_settings(ALLOWED_HOSTS=['testserver', 'localhost']):
+        for mode in modes:
+            results[mode] = _contend(mode, readers, writers if users else 0, seconds, car_ids, users)
+            progress(f"{mode}: чтение {results[mode]['read']['ops_per_s']}/с "
+                     f"(p95 {results[mode]['read'].get('p95_ms')} мс, ошибок {results[mode]['read']['errors']}), "
+                     f"запись {results[mode]['write']['ops_per_s']}/с "
+                     f"(p95 {results[mode]['write'].get('p95_ms')} мс, ошибок {results[mode]['write']['errors']})")
+    meta = _meta(0, False, readers + writers)
+    meta.update(readers=readers, writers=writers, seconds=seconds,
+                pragmas={k: v for k, v in settings.SQLITE_PRAGMAS.items() if k != 'journal_mode'})
+    return {'meta': meta, 'modes': results}
+
+
+# ---------- Индекс похожих авто ----------
+def similar_benchmark(cars=1_000_000, queries=200, k=6, seed=42, path=None, progress=None):
+    """
+    Индекс похожих авто (catalog/similar.py) на синтетических данных без БД:
+    построение, снимок на диск и открытие через mmap, задержка top-k
+    без фильтров и с маской CarFilter, правка строк.
+    """
+    import tempfile
+    from types import SimpleNamespace
+
+    np = similar.np
+    progress = progress or (lambda message: None)
+    rng = np.random.default_rng(seed)
+    brand_ids = rng.integers(1, 51, cars)
+    result = {'cars': cars, 'queries': queries, 'k': k}
+
+    started = time.perf_counter()
+    index = similar.Index.from_arrays(
+        np.arange(1, cars + 1, dtype=np.int64),
+        np.round(rng.lognormal(14.5, 0.6, cars), 2),
+        rng.integers(2000, 2026, cars).astype(np.int16),
+        np.vstack([rng.integers(0, len(ENGINES), cars), rng.integers(0, len(TRANSMISSIONS), cars),
+                   brand_ids, brand_ids * 100 + rng.integers(0, 20, cars)]).astype(np.int32),
+    )
+    result['build_s'] = round(time.perf_counter() - started, 3)
+    result['memory_mb'] = round(sum(getattr(index, name).nbytes for name in similar.ARRAYS) / 2 ** 20, 1)
+    progress(f"построение: {result['build_s']} с, {result['memory_mb']} МБ")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        started = time.perf_counter()
+        index.save(path or tmp, {'change_id': 0})
+        result['save_s'] = round(time.perf_counter() - started, 3)
+        started = time.perf_counter()
+        index, _ = similar.Index.load(path or tmp)
+        result['mmap_open_ms'] = round((time.perf_counter() - started) * 1000, 3)
+        pks = rng.integers(1, cars + 1, queries)
+        started = time.perf_counter()
+        index.nearest(int(pks[0]), k)
+        result['first_query_ms'] = round((time.perf_counter() - started) * 1000, 3)
+        progress(f"снимок: запись {result['save_s']} с, mmap {result['mmap_open_ms']} мс, "
+                 f"первый запрос {result['first_query_ms']} мс")
+
+        cd = {'engine_type': ENGINES[0], 'year_min': 2015, 'price_max': Decimal('3000000'),
+              'brand': SimpleNamespace(pk=int(brand_ids[0]))}
+        for name, query in (('nearest', lambda pk: index.nearest(pk, k)),
+                            ('nearest_filtered', lambda pk: index.nearest(pk, k, index.mask(cd)))):
+            timings = []
+            for pk in pks:
+                started = time.perf_counter()
+                query(int(pk))
+                timings.append((time.perf_counter() - started) * 1000)
+            result[name] = {'p50_ms': round(_percentile(timings, 50), 3),
+                            'p95_ms': round(_percentile(timings, 95), 3),
+                            'p99_ms': round(_percentile(timings, 99), 3)}
+            progress(f"{name}: p50 {result[name]['p50_ms']} мс, p95 {result[name]['p95_ms']} мс")
+
+        rows = [(int(pk), Decimal('1500000'), 2020, ENGINES[0], TRANSMISSIONS[0], 1, 100)
+                for pk in pks[:100]] + [(cars + 1, Decimal('900000'), 2024, ENGINES[1], TRANSMISSIONS[1], 2, 200)]
+        started = time.perf_counter()
+        index.patch({r[0] for r in rows}, rows)
+        result['patch_101_rows_ms'] = round((time.perf_counter() - started) * 1000, 3)
+        progress(f"правка 100 строк + 1 новая: {result['patch_101_rows_ms']} мс")
+        del index  # закрыть mmap до удаления каталога
+    return {'meta': _meta(queries, False), 'results': result}
+
+
+# ---------- Холодный старт ----------
+# Выполняется в отдельном процессе: импорт WSGI-приложения (с прогревом или без)
+# и по два запроса к каждому адресу прямо через WSGI, без сервера
+_COLD_PROBE = """
+import json, sys, time
+started = time.perf_counter()
+from autoguide.wsgi import application
+from catalog import warmup
+from django.conf import settings
+boot_ms = (time.perf_counter() - started) * 1000
+hosts = [h.lstrip('.') for h in settings.ALLOWED_HOSTS if h != '*']
+host = hosts[0] if hosts else 'localhost'
+
+def call(url):
+    path, _, query = url.partition('?')
+    environ = {
+        'REQUEST_METHOD': 'GET', 'PATH_INFO': path, 'QUERY_STRING': query,
+        'SERVER_NAME': host, 'SERVER_PORT': '80', 'HTTP_HOST': host, 'REMOTE_ADDR': '127.0.0.1',
+        'SERVER_PROTOCOL': 'HTTP/1.1', 'wsgi.url_scheme': 'http', 'wsgi.input': sys.stdin.buffer,
+        'wsgi.errors': sys.stderr, 'wsgi.version': (1, 0), 'wsgi.multithread': False,
+        'wsgi.multiprocess': True, 'wsgi.run_once': False,
+    }
+    status = []
+    started = time.perf_counter()
+    body = application(environ, lambda s, headers, exc_info=None: status.append(s))
+    try:
+        for _ in body:
+            pass
+    finally:
+        getattr(body, 'close', lambda: None)()
+    return (time.perf_counter() - started) * 1000, int(status[0].split()[0])
+
+requests = {}
+for url in json.loads(sys.argv[1]):
+    first, code = call(url)
+    second, _ = call(url)
+    requests[url] = {'first_ms': first, 'second_ms': second, 'status': code}
+print(json.dumps({'boot_ms': boot_ms, 'report': warmup.report(), 'requests': requests}))
+"""
+
+
+def _cold_process(urls, warm):
+    env = dict(os.environ, AUTOGUIDE_WARMUP='1' if warm else '0',
+               DJANGO_SETTINGS_MODULE=os.environ.get('DJANGO_SETTINGS_MODULE', 'autoguide.settings'))
+    started = time.perf_counter()
+    done = subprocess.run([sys.executable, '-c', _COLD_PROBE, json.dumps(urls)], cwd=settings.BASE_DIR,
+                          env=env, capture_output=True, text=True, check=True)
+    data = json.loads(done.stdout.strip().splitlines()[-1])
+    data['process_ms'] = (time.perf_counter() - started) * 1000
+    return data
+
+
+def cold_start(runs=5, urls=('/',), progress=None):
+    """
+    Для прогрева on/off runs раз запускает новый процесс: время старта
+    (импорт autoguide.wsgi, включая прогрев), время процесса целиком и
+    задержка первого и второго запроса к каждому адресу — медианы по прогонам.
+    Страничный кеш ОС между прогонами не сбрасывается.
+    """
+    progress = progress or (lambda message: None)
+    urls = list(urls)
+    results = {}
+    for mode, warm in (('warmup', True), ('no_warmup', False)):
+        samples = [_cold_process(urls, warm) for _ in range(runs)]
+
+        def median(values):
+            return round(statistics.median(values), 1)
+
+        results[mode] = {
+            'boot_ms': median(s['boot_ms'] for s in samples),
+            'process_ms': median(s['process_ms'] for s in samples),
+            'warmup_steps_ms': samples[-1]['report'].get('warmup'),
+            'requests': {url: {'first_ms': median(s['requests'][url]['first_ms'] for s in samples),
+                               'second_ms': median(s['requests'][url]['second_ms'] for s in samples),
+                               'status': samples[-1]['requests'][url]['status']}
+                         for url in urls},
+        }
+        first = ', '.join(f"{url} {r['first_ms']} мс" for url, r in results[mode]['requests'].items())
+        progress(f"{mode}: старт {results[mode]['boot_ms']} мс, процесс {results[mode]['process_ms']} мс, "
+                 f"первый запрос: {first}")
+    meta = _meta(runs, True)
+    meta.update(runs=runs, urls=urls)
+    return {'meta': meta, 'modes': results}
+
+
+# ---------- Сравнение с базовым прогоном ----------
+def compare(current, baseline, tolerance=0.2, metric='p95_ms'):
+    """
+    Список регрессий: сценарий медленнее базового больше чем на tolerance
+    (доля) по metric или делает больше SQL-запросов.
+    """
+    regressions = []
+    for name, now in current['results'].items():
+        before = baseline.get('results', {}).get(name)
+        if before is None:
+            continue
+        # queries_max, а не медиана: favorite_toggle чередует добавление и удаление
+        if now['queries_max'] > before['queries_max']:
+            regressions.append((name, 'queries_max', before['queries_max'], now['queries_max']))
+        if before[metric] and now[metric] > before[metric] * (1 + tolerance):
+            regressions.append((name, metric, before[metric], now[metric]))
+    return regressions
@@ -0,0 +1,40 @@
+"""
+Файловый кеш, общий для воркеров одной машины (settings.CACHES['shared']).
+
+Штампы ETag (catalog/stamps.py) заводятся add() и двигаются incr(), и эти
+две операции должны быть атомарными между процессами: иначе два воркера,
+одновременно сдвинувшие штамп, запишут одно и то же число, и изменённая
+страница сохранит старый ETag. У Memcached/Redis так и есть, а у
+FileBasedCache add() и incr() — это чтение и запись файла, поэтому здесь
+они идут под блокировкой flock на файл в папке кеша.
+"""
+import os
+
+from django.core.cache.backends.base import DEFAULT_TIMEOUT
+from django.core.cache.backends.filebased import FileBasedCache
+
+try:
+    import fcntl
+except ImportError:  # Windows: блокировки нет, add()/incr() — как у FileBasedCache
+    fcntl = None
+
+LOCK_FILE = 'atomic.lock'
+
+
+class LockingFileBasedCache(FileBasedCache):
+    def _locked(self, method, *args, **kwargs):
+        if fcntl is None:
+            return method(*args, **kwargs)
+        self._createdir()
+        with open(os.path.join(self._dir, LOCK_FILE), 'ab') as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            try:
+                return method(*args, **kwargs)
+            finally:
+                fcntl.flock(lock, fcntl.LOCK_UN)
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        return self._locked(super().add, key, value, timeout, version)
+
+    def incr(self, key, delta=1, version=None):
+        return self._locked(super().incr, key, delta, version)
@@ -0,0 +1,82 @@
+"""
+Журнал изменений каталога для синхронизации внешних потребителей
+(поисковый индексатор, сервис цен, кеш мобильного клиента).
+
+Каждое сохранение или удаление марки, модели и авто добавляет строку
+CatalogChange(kind, object_id, deleted) в той же транзакции, что и само
+изменение: сигналы (catalog/signals.py) срабатывают внутри save()
+(AtomicSaveModel) и delete(), массовые операции пишут журнал сами
+(record_many). Запись SQLite идёт по одной транзакции за раз, поэтому id
+журнала растут в порядке коммитов и «после id N» не пропускает ничего.
+
+Потребитель хранит токен (id последней прочитанной записи) и запрашивает
+api/changes/?since=<токен>: в ответе — пачка изменений по видам, текущие
+данные изменённых объектов, id удалённых и токен продолжения.
+compact() (команда compact_changes) оставляет по одной, последней записи
+на объект: ответ для любого токена остаётся верным, журнал — не больше
+числа когда-либо существовавших объектов.
+"""
+from django.db.models import Exists, OuterRef
+
+from .models import Brand, CarModel, CatalogChange
+
+DEFAULT_LIMIT = 500
+MAX_LIMIT = 5000
+# Порядок видов в ответе: сначала марки, потом модели, потом авто
+KINDS = ('brand', 'model', 'car')
+
+
+def record(kind, object_id, deleted=False):
+    """Вызывается из сигналов — внутри транзакции изменения."""
+    CatalogChange.objects.create(kind=kind, object_id=object_id, deleted=deleted)
+
+
+def record_many(kind, ids, deleted=False):
+    """То же для массовых операций в обход save() (bulk_create, update())."""
+    CatalogChange.objects.bulk_create(
+        [CatalogChange(kind=kind, object_id=pk, deleted=deleted) for pk in ids], batch_size=1000
+    )
+
+
+def parse_token(value):
+    """'' -> 0; иначе неотрицательное целое или ValueError."""
+    if not value:
+        return 0
+    token = int(value)
+    if token < 0:
+        raise ValueError(value)
+    return token
+
+
+def batch(since, limit=DEFAULT_LIMIT):
+    """
+    Изменения после токена since, не больше limit записей журнала:
+    ({kind: {id: deleted}}, токен продолжения, есть ли ещё).
+    Для объекта, изменённого в пачке несколько раз, берётся последняя запись.
+    """
+    rows = list(CatalogChange.objects.filter(id__gt=since).order_by('id')
+                .values_list('id', 'kind', 'object_id', 'deleted')[:limit + 1])
+    more = len(rows) > limit
+    rows = rows[:limit]
+    changed = {kind: {} for kind in KINDS}
+    for _, kind, object_id, deleted in rows:
+        changed[kind][object_id] = deleted
+    return changed, (rows[-1][0] if rows else since), more
+
+
+def names(kind, ids):
+    """Текущие строки марок/моделей для ответа."""
+    if kind == 'brand':
+        return [{'id': pk, 'name': name}
+                for pk, name in Brand.objects.filter(id__in=ids).order_by('id').values_list('id', 'name')]
+    return [{'id': pk, 'brand_id': brand_id, 'name': name}
+            for pk, brand_id, name in CarModel.objects.filter(id__in=ids).order_by('id')
+            .values_list('id', 'brand_id', 'name')]
+
+
+def compact():
+    """Удалить записи, у объекта которых есть более поздняя. Возвращает число удалённых."""
+    later = CatalogChange.objects.filter(kind=OuterRef('kind'), object_id=OuterRef('object_id'),
+                                         id__gt=OuterRef('id'))
+    deleted, _ = CatalogChange.objects.filter(Exists(later)).delete()
+    return deleted
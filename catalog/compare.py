@@ -0,0 +1,106 @@
+"""
+Список сравнения в подписанной куке и кеш таблицы сравнения.
+
+Раньше список жил в сессии: каждый гость получал строку в django_session,
+а каждый клик «В сравнение» — чтение и запись этой строки. Теперь это
+кука вида «12.7.99» (id в порядке добавления, не больше MAX_CARS),
+подписанная SECRET_KEY, — БД для списка сравнения не нужна вовсе.
+
+Отрисованная таблица сравнения кешируется по набору id; ключ включает
+штампы этих авто и справочника названий (catalog/stamps.py), так что
+после правки авто таблица рисуется заново, а при попадании в кеш
+страница сравнения обходится без запросов к БД.
+"""
+import hashlib
+
+from django.conf import settings
+from django.core import signing
+from django.core.cache import caches
+from django.template.loader import render_to_string
+
+from . import stamps
+from .models import Car
+
+COOKIE_NAME = 'compare'
+COOKIE_SALT = 'catalog.compare'
+COOKIE_MAX_AGE = 30 * 24 * 60 * 60
+MAX_CARS = 4
+MATRIX_TEMPLATE = 'catalog/includes/compare_matrix.html'
+
+
+# ---------- Кука ----------
+def _parse(value):
+    ids = []
+    for part in value.split('.'):
+        if part.isdigit() and int(part) not in ids:
+            ids.append(int(part))
+    return ids[:MAX_CARS]
+
+
+def get_ids(request):
+    """id авто в сравнении, в порядке добавления (разбирается раз на запрос)."""
+    if not hasattr(request, '_compare_ids'):
+        value = request.get_signed_cookie(COOKIE_NAME, default='', salt=COOKIE_SALT)
+        request._compare_ids = _parse(value)
+    return request._compare_ids
+
+
+def cookie_value(ids):
+    """Подписанное значение куки — то же, что кладёт set_signed_cookie()."""
+    return signing.get_cookie_signer(salt=COOKIE_NAME + COOKIE_SALT).sign('.'.join(map(str, ids)))
+
+
+def save_ids(request, response, ids):
+    request._compare_ids = list(ids)
+    if not ids:
+        response.delete_cookie(COOKIE_NAME, samesite='Lax')
+        return response
+    response.set_signed_cookie(
+        COOKIE_NAME, '.'.join(map(str, ids)), salt=COOKIE_SALT,
+        max_age=COOKIE_MAX_AGE, httponly=True, samesite='Lax',
+        secure=settings.SESSION_COOKIE_SECURE,
+    )
+    return response
+
+
+def add(ids, pk):
+    """Новый список или None, если он уже полон."""
+    if pk in ids:
+        return ids
+    if len(ids) >= MAX_CARS:
+        return None
+    return ids + [pk]
+
+
+def remove(ids, pk):
+    return [i for i in ids if i != pk]
+
+
+# ---------- Таблица сравнения ----------
+def _cache():
+    return caches[getattr(settings, 'CARD_CACHE_ALIAS', 'default')]
+
+
+def _matrix_key(ids):
+    parts = [str(stamps.get('names'))]
+    parts += [f'{pk}.{stamps.get("car", pk)}' for pk in ids]
+    return 'compare:matrix:' + hashlib.md5('|'.join(parts).encode()).hexdigest()
+
+
+def matrix(ids):
+    """
+    HTML таблицы: из кеша, а если его нет — один запрос с select_related,
+    порядок — как в списке, результат — в кеш. Штампы в ключе читаются из
+    общего кеша, поэтому из async-кода — через sync_to_async, целиком.
+    """
+    if not ids:
+        return ''
+    key = _matrix_key(ids)
+    html = _cache().get(key)
+    if html is not None:
+        return html
+    by_pk = {car.pk: car for car in Car.objects.filter(id__in=ids).select_related('brand', 'model')}
+    cars = [by_pk[pk] for pk in ids if pk in by_pk]
+    html = render_to_string(MATRIX_TEMPLATE, {'cars': cars}) if cars else ''
+    _cache().set(key, html, getattr(settings, 'CARD_CACHE_TIMEOUT', 24 * 60 * 60))
+    return html
@@ -1,12 +1,24 @@
-from .models import Favorite
+from django.utils.functional import SimpleLazyObject
+
+from . import compare, favorites, metrics
+
 
 def favorites_count(request):
     """
     Кол-во авто в избранном для отображения бейджа в шапке.
     Гостям показываем 0 (у нас избранное для залогиненных).
+    Значение ленивое: шаблоны без бейджа не трогают ни сессию, ни БД;
+    само число берётся из кеша/счётчика FavoriteCount, а не COUNT(*).
     """
-    if not request.user.is_authenticated:
-        return {'favorites_count': 0}
-    return {
-        'favorites_count': Favorite.objects.filter(user=request.user).count()
-    }
+    def get_count():
+        # Считается лениво, уже при отрисовке шаблона — замер отдельно (Server-Timing: ctx)
+        with metrics.timed('ctx'):
+            if not request.user.is_authenticated:
+                return 0
+            return favorites.get_count(request.user.pk)
+    return {'favorites_count': SimpleLazyObject(get_count)}
+
+
+def compare_ids(request):
+    """Список сравнения для бейджа в шапке — из подписанной куки, без сессии и БД."""
+    return {'compare_ids': compare.get_ids(request)}
@@ -0,0 +1,81 @@
+"""
+Число результатов для пагинатора списка авто.
+
+Paginator считает COUNT(*) по отфильтрованной выборке на каждой странице,
+хотя показываем только 9 строк. Здесь число кешируется по нормализованному
+набору фильтров CarFilter (сортировка и страница на него не влияют), а в
+ключ входит общий штамп каталога (catalog/stamps.py): любая запись в каталог
+даёт новые ключи, старые просто истекают.
+
+Считаем не дальше settings.CAR_LIST_COUNT_LIMIT строк: сверх порога число
+становится pagination.AtLeast и выводится как «10000+».
+"""
+import hashlib
+import json
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.paginator import Paginator
+from django.db.models import Model
+from django.utils.functional import cached_property
+
+from . import stamps
+from .pagination import AtLeast, capped_count
+
+
+def _cache():
+    return caches[getattr(settings, 'CARD_CACHE_ALIAS', 'default')]
+
+
+def limit():
+    return getattr(settings, 'CAR_LIST_COUNT_LIMIT', 10_000)
+
+
+def signature(filterset):
+    """Фильтры без пустых значений, в постоянном порядке; None — если форма невалидна."""
+    if not filterset.is_bound:  # без GET-параметров — весь каталог
+        return '{}'
+    if not filterset.is_valid():
+        return None
+    values = {}
+    for name, value in filterset.form.cleaned_data.items():
+        if value in (None, ''):
+            continue
+        if isinstance(value, Model):
+            value = value.pk
+        values[name] = str(value)
+    return json.dumps(values, sort_keys=True, ensure_ascii=False)
+
+
+def _key(sig):
+    digest = hashlib.md5(sig.encode()).hexdigest()
+    return f'counts:{stamps.get()}:{digest}'
+
+
+def get(queryset, sig):
+    """Число строк queryset (или AtLeast(limit())) — из кеша, если sig не None."""
+    if sig is None:
+        return capped_count(queryset, limit())
+    key = _key(sig)
+    n = _cache().get(key)
+    if n is None:
+        n = capped_count(queryset, limit())
+        _cache().set(key, n, getattr(settings, 'CARD_CACHE_TIMEOUT', 24 * 60 * 60))
+    return n
+
+
+class CachedCountPaginator(Paginator):
+    """Paginator с count из get(); signature передаёт CarListView.get_paginator()."""
+
+    def __init__(self, object_list, per_page, signature=None, **kwargs):
+        super().__init__(object_list, per_page, **kwargs)
+        self.signature = signature
+
+    @cached_property
+    def count(self):
+        return get(self.object_list, self.signature)
+
+    @cached_property
+    def num_pages(self):
+        pages = super().num_pages
+        return AtLeast(pages) if isinstance(self.count, AtLeast) else pages
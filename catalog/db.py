@@ -0,0 +1,102 @@
+"""
+Профиль SQLite для продакшна и маршрутизация чтения/записи.
+
+На каждое новое соединение SQLite применяются PRAGMA из settings.SQLITE_PRAGMAS:
+WAL (читатели не ждут писателя и наоборот), synchronous=NORMAL (в WAL это
+безопасно при сбое процесса), mmap, размер кеша страниц и busy_timeout —
+сколько ждать блокировку, прежде чем ответить «database is locked».
+Соединения живут CONN_MAX_AGE секунд (см. DATABASES), так что PRAGMA
+выполняются раз на соединение, а не на запрос.
+
+ReadWriteRouter отправляет чтение моделей каталога в алиас
+settings.CATALOG_READ_DB — тот же файл, но соединение с query_only, — а
+запись и всё внутри транзакции на основном соединении — в 'default':
+внутри atomic() чтение должно видеть ещё не зафиксированные изменения.
+
+Транзакции SQLite начинаются с обычного BEGIN: блокировка записи берётся
+на первой записи, и транзакции, которые только читают, друг другу не
+мешают. Где проверку и запись надо сделать под одной блокировкой (фото:
+Car.save() и сборка мусора, catalog/images.py), блок начинается с
+write_locked() — блокировка берётся сразу, как при BEGIN IMMEDIATE.
+"""
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections, transaction
+from django.db.backends.signals import connection_created
+
+APPS = ('catalog',)
+
+
+def read_alias():
+    alias = getattr(settings, 'CATALOG_READ_DB', None)
+    return alias if alias in settings.DATABASES else DEFAULT_DB_ALIAS
+
+
+def pragmas(alias):
+    """PRAGMA для соединения alias: общие плюс query_only для алиаса чтения."""
+    values = dict(getattr(settings, 'SQLITE_PRAGMAS', {}))
+    if alias != DEFAULT_DB_ALIAS and alias == read_alias():
+        # После остальных: journal_mode=wal — запись в заголовок файла, если
+        # соединение для чтения открылось раньше основного
+        values['query_only'] = 'on'
+    return values
+
+
+def _configure(sender, connection, **kwargs):
+    if connection.vendor != 'sqlite':
+        return
+    # Напрямую через sqlite3, мимо обёрток execute (замеры, CaptureQueriesContext)
+    raw = connection.connection
+    for name, value in pragmas(connection.alias).items():
+        raw.execute(f'PRAGMA {name} = {value}')
+
+
+def lock(using=DEFAULT_DB_ALIAS):
+    """
+    Взять блокировку записи текущей транзакции сейчас, а не на первой записи.
+    Пустой UPDATE ... WHERE 0 строк не меняет, но делает транзакцию пишущей:
+    она ждёт других писателей busy_timeout. Начни её транзакция с чтения —
+    SQLite отказал бы в блокировке без ожидания, если кто-то успел закоммитить,
+    поэтому lock() зовут первым в блоке. Вне atomic() и не на SQLite — ничего.
+    """
+    connection = connections[using]
+    if connection.vendor != 'sqlite' or not connection.in_atomic_block:
+        return
+    with connection.cursor() as cursor:
+        cursor.execute('UPDATE django_migrations SET id = id WHERE 0')
+
+
+@contextmanager
+def write_locked(using=DEFAULT_DB_ALIAS):
+    """atomic(), который сразу держит блокировку записи (как BEGIN IMMEDIATE)."""
+    with transaction.atomic(using=using):
+        lock(using)
+        yield
+
+
+def install():
+    """Подключается в CatalogConfig.ready(); уже открытые соединения настраиваются сразу."""
+    connection_created.connect(_configure, dispatch_uid='catalog.db')
+    for connection in connections.all(initialized_only=True):
+        if connection.connection is not None:
+            _configure(None, connection)
+
+
+class ReadWriteRouter:
+    def db_for_read(self, model, **hints):
+        if model._meta.app_label not in APPS:
+            return None
+        if connections[DEFAULT_DB_ALIAS].in_atomic_block:
+            return DEFAULT_DB_ALIAS
+        return read_alias()
+
+    def db_for_write(self, model, **hints):
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Оба алиаса смотрят в одну БД
+        return True
+
+    def allow_migrate(self, db, app_label, **hints):
+        return db == DEFAULT_DB_ALIAS
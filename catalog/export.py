@@ -0,0 +1,111 @@
+"""
+Потоковая выгрузка отфильтрованного каталога в CSV / JSONL.
+
+Строки берутся через .values() (без экземпляров моделей и select_related:
+названия марки и модели — просто колонки из JOIN) и iterator(chunk_size=...),
+поэтому память не растёт с числом авто, а первые байты уходят клиенту
+раньше, чем БД дочитает выборку.
+
+Под ASGI Django 4.2 синхронный итератор ответа сначала целиком собирает
+в список (sync_to_async(list)), поэтому там тело отдаётся асинхронным
+итератором (streaming()), который тянет строки пачками в потоке.
+"""
+import csv
+import json
+from itertools import islice
+
+from asgiref.sync import sync_to_async
+from django.core.handlers.asgi import ASGIRequest
+
+from .filters import CarFilter
+from .models import Car
+from .pagination import ALLOWED_SORTS, normalize_sort, ordering_for
+
+# Имя колонки в выгрузке -> путь для .values()
+COLUMNS = {
+    'id': 'id',
+    'brand': 'brand__name',
+    'model': 'model__name',
+    'year': 'year',
+    'engine_type': 'engine_type',
+    'transmission': 'transmission',
+    'price': 'price',
+    'description': 'description',
+    'created_at': 'created_at',
+}
+CHUNK_SIZE = 2000
+CONTENT_TYPES = {
+    'csv': 'text/csv; charset=utf-8',
+    'jsonl': 'application/x-ndjson; charset=utf-8',
+}
+
+
+def filtered_queryset(params):
+    """
+    Тот же набор и порядок, что у CarListView: фильтры CarFilter + ?sort=.
+    Возвращает (filterset, queryset); queryset = None, если параметры невалидны.
+    """
+    sort = normalize_sort(params.get('sort'))
+    filterset = CarFilter(params, queryset=Car.objects.order_by(*ordering_for(sort)))
+    if not filterset.is_valid():
+        return filterset, None
+    qs = filterset.qs
+    if params.get('q') and params.get('sort') not in ALLOWED_SORTS:
+        # Поиск без явной сортировки — по релевантности (порядок задал CarFilter)
+        return filterset, qs
+    return filterset, qs.order_by(*ordering_for(sort))
+
+
+def _value(value):
+    if hasattr(value, 'isoformat'):
+        return value.isoformat()
+    if value is None or isinstance(value, (int, str)):
+        return value
+    return str(value)  # Decimal
+
+
+def iter_rows(queryset, columns=COLUMNS):
+    names = list(columns)
+    paths = [columns[n] for n in names]
+    for row in queryset.values_list(*paths).iterator(chunk_size=CHUNK_SIZE):
+        yield dict(zip(names, (_value(v) for v in row)))
+
+
+class _Echo:
+    """Псевдо-файл для csv.writer: возвращает строку вместо записи."""
+    def write(self, value):
+        return value
+
+
+def stream_csv(queryset, columns=COLUMNS):
+    writer = csv.writer(_Echo())
+    # Заголовок — сразу, до первого запроса к БД; BOM — чтобы Excel понял UTF-8
+    yield '\ufeff' + writer.writerow(list(columns))
+    for row in iter_rows(queryset, columns):
+        yield writer.writerow(row.values())
+
+
+def stream_jsonl(queryset, columns=COLUMNS):
+    for row in iter_rows(queryset, columns):
+        yield json.dumps(row, ensure_ascii=False, separators=(',', ':')) + '\n'
+
+
+STREAMS = {'csv': stream_csv, 'jsonl': stream_jsonl}
+
+
+async def _async_chunks(chunks, size=CHUNK_SIZE):
+    # Пачка кусков за один переход в поток; поток тот же, что у представления
+    # (thread_sensitive), — курсор iterator() остаётся на своём соединении
+    take = sync_to_async(lambda: ''.join(islice(chunks, size)))
+    while True:
+        part = await take()
+        if not part:
+            return
+        yield part
+
+
+def streaming(request, chunks):
+    """Тело для StreamingHttpResponse: под ASGI — асинхронный итератор по пачкам."""
+    if isinstance(request, ASGIRequest):
+        return _async_chunks(iter(chunks))
+    return chunks
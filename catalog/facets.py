@@ -0,0 +1,146 @@
+"""
+Счётчики фасетов для CarFilter (сколько авто у каждой марки, двигателя,
+коробки и в каждом интервале годов).
+
+Считаем не по таблице Car, а по предрасчитанной CarFacet: одна строка на
+комбинацию (марка, модель, двигатель, коробка, год). Строки правятся
+инкрементально при сохранении/удалении Car, а счётчики с учётом остальных
+активных фильтров — это GROUP BY по маленькой CarFacet.
+
+С фильтром по цене считаем по CarPriceStat (те же ячейки, разбитые по
+интервалам цены): интервалы внутри фильтра — из неё, и только авто из двух
+крайних интервалов, разрезанных границами, — из Car (catalog/pricestats.py).
+По таблице Car целиком считается лишь полнотекстовый ?q=: текста нет
+среди измерений предрасчитанных таблиц.
+"""
+from django.db import transaction
+from django.db.models import Count, F, Sum
+
+from . import search
+from .models import Car, CarFacet
+
+# Фасеты сайдбара; 'year' показываем интервалами по YEAR_BUCKET лет
+FACETS = ('brand', 'model', 'engine_type', 'transmission', 'year')
+YEAR_BUCKET = 5
+
+KEY_FIELDS = ('brand_id', 'model_id', 'engine_type', 'transmission', 'year')
+
+
+def facet_key(car):
+    return tuple(getattr(car, f) for f in KEY_FIELDS)
+
+
+# ---------- Инкрементальное обновление ----------
+def _bump(key, delta):
+    lookup = dict(zip(KEY_FIELDS, key))
+    updated = CarFacet.objects.filter(**lookup).update(count=F('count') + delta)
+    if not updated and delta > 0:
+        CarFacet.objects.create(count=delta, **lookup)
+    elif delta < 0:
+        CarFacet.objects.filter(count__lte=0, **lookup).delete()
+
+
+def apply_change(old_key=None, new_key=None):
+    """Перенести авто из одной ячейки в другую (None — нет ячейки)."""
+    if old_key == new_key:
+        return
+    with transaction.atomic():
+        if old_key is not None:
+            _bump(old_key, -1)
+        if new_key is not None:
+            _bump(new_key, +1)
+
+
+def rebuild():
+    """Полный пересчёт CarFacet по таблице Car. Возвращает число ячеек."""
+    rows = (Car.objects.order_by()
+            .values(*KEY_FIELDS)
+            .annotate(n=Count('id')))
+    with transaction.atomic():
+        CarFacet.objects.all().delete()
+        CarFacet.objects.bulk_create(
+            [CarFacet(count=r.pop('n'), **r) for r in rows], batch_size=1000
+        )
+    return CarFacet.objects.count()
+
+
+# ---------- Чтение ----------
+def _lookups(cd, exclude):
+    """Фильтры из cleaned_data CarFilter, кроме фасета exclude."""
+    q = {}
+    for name in ('brand', 'model', 'engine_type', 'transmission'):
+        if name != exclude and cd.get(name):
+            q[name] = cd[name]
+    if exclude != 'year':
+        if cd.get('year_min') is not None:
+            q['year__gte'] = cd['year_min']
+        if cd.get('year_max') is not None:
+            q['year__lte'] = cd['year_max']
+    return q
+
+
+def facet_counts(filterset):
+    """
+    {'brand': {id: n}, 'model': {id: n}, 'engine_type': {'petrol': n}, ...,
+     'year': {2015: n, 2020: n}} — ключ 'year' это начало интервала.
+    Для каждого фасета учитываются все остальные активные фильтры.
+    """
+    from . import pricestats  # pricestats сам импортирует отсюда KEY_FIELDS
+
+    cd = filterset.form.cleaned_data if filterset.is_valid() else {}
+    price_active = cd.get('price_min') is not None or cd.get('price_max') is not None
+    if cd.get('q'):
+        # Текста нет среди измерений предрасчитанных таблиц — считаем по Car
+        source = search.apply(Car.objects.order_by(), cd['q'])
+        if cd.get('price_min') is not None:
+            source = source.filter(price__gte=cd['price_min'])
+        if cd.get('price_max') is not None:
+            source = source.filter(price__lte=cd['price_max'])
+        sources = [(source, Count('id'))]
+    elif price_active:
+        stats, edge_cars = pricestats.price_sources(cd)
+        sources = [(stats, Sum('count'))]
+        if edge_cars is not None:
+            sources.append((edge_cars, Count('id')))
+    else:
+        sources = [(CarFacet.objects.order_by(), Sum('count'))]
+
+    result = {}
+    for facet in FACETS:
+        column = facet + '_id' if facet in ('brand', 'model') else facet
+        counts = {}
+        for source, total in sources:
+            rows = (source.filter(**_lookups(cd, facet))
+                    .values_list(column)
+                    .annotate(n=total))
+            for value, n in rows:
+                if facet == 'year':
+                    value -= value % YEAR_BUCKET
+                counts[value] = counts.get(value, 0) + n
+        result[facet] = counts
+    return result
+
+
+def year_buckets(counts):
+    """[(2015, 2019, n), ...] по возрастанию — для ссылок в сайдбаре."""
+    return [(start, start + YEAR_BUCKET - 1, n)
+            for start, n in sorted(counts.get('year', {}).items())]
+
+
+def annotate_form(form, counts):
+    """Дописывает «(N)» к вариантам селектов формы фильтра."""
+    for name in ('engine_type', 'transmission'):
+        field = form.fields[name]
+        per_value = counts.get(name, {})
+        field.choices = [
+            (value, f'{label} ({per_value.get(value, 0)})') if value else (value, label)
+            for value, label in field.choices
+        ]
+    for name in ('brand', 'model'):
+        # Варианты уже из справочника (catalog/lookups.py): (id, название)
+        widget = form.fields[name].widget
+        per_pk = counts.get(name, {})
+        widget.choices = [
+            (pk, f'{label} ({per_pk.get(pk, 0)})') if pk else (pk, label)
+            for pk, label in widget.choices
+        ]
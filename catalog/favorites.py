@@ -0,0 +1,186 @@
+"""
+Счётчик избранного пользователя (бейдж в шапке, ответ favorite_toggle).
+
+Источник правды — таблица Favorite; FavoriteCount — её денормализованная
+сумма, которую сигналы Favorite двигают на ±1 в той же транзакции.
+Перед FavoriteCount стоит общий для воркеров кеш (stamps.shared_cache()).
+Ключ счётчика включает поколение пользователя, которое после коммита
+сдвигается incr(): читатель, посчитавший старое значение до коммита и
+записавший его уже после, пишет его под мёртвым ключом.
+Если строки счётчика нет (новый пользователь, сбой) — она считается
+при первом чтении.
+
+Членство в избранном проверяется только для авто текущей страницы
+(member_ids), а не всем списком пользователя. Массовые add()/remove() —
+по одному INSERT ... ON CONFLICT DO NOTHING / DELETE на пачку, в обход
+сигналов: счётчик и штамп пользователя они двигают сами.
+"""
+import time
+
+from django.contrib.auth import get_user_model
+from django.db import connection, transaction
+from django.db.models import Count, F
+from django.db.models.functions import Greatest
+from django.utils import timezone
+
+from . import stamps
+from .models import Car, Favorite, FavoriteCount
+
+CACHE_TIMEOUT = 60 * 60
+# Не больше стольких авто за один пакетный запрос (и параметров в одном SQL)
+MAX_BATCH = 500
+
+
+def _generation_key(user_id):
+    return f'favorites:gen:{user_id}'
+
+
+def _generation(user_id):
+    cache = stamps.shared_cache()
+    key = _generation_key(user_id)
+    value = cache.get(key)
+    if value is None:
+        # Вытесненное поколение начинается заново не с 0, а с «сейчас»:
+        # значения под прежними поколениями так и не станут читаться
+        cache.add(key, time.time_ns(), None)
+        value = cache.get(key)
+    return value
+
+
+def _key(user_id, generation):
+    return f'favorites:count:{user_id}:{generation}'
+
+
+def _invalidate(user_ids):
+    """Новое поколение после коммита — прежние значения счётчиков больше не читаются."""
+    if not user_ids:
+        return
+
+    def advance():
+        cache = stamps.shared_cache()
+        for user_id in user_ids:
+            key = _generation_key(user_id)
+            cache.add(key, time.time_ns(), None)
+            try:
+                cache.incr(key)
+            except ValueError:  # успели вытеснить
+                cache.add(key, time.time_ns(), None)
+    transaction.on_commit(advance)
+
+
+def adjust(user_id, delta):
+    """±delta к счётчику; вызывается из сигналов Favorite (и массовых операций)."""
+    FavoriteCount.objects.filter(user_id=user_id).update(
+        count=Greatest(F('count') + delta, 0)
+    )
+    _invalidate([user_id])
+
+
+def get_count(user_id):
+    cache = stamps.shared_cache()
+    # Поколение — до чтения БД: иначе значение до коммита легло бы под новый ключ
+    key = _key(user_id, _generation(user_id))
+    value = cache.get(key)
+    if value is not None:
+        return value
+    row = FavoriteCount.objects.filter(user_id=user_id).values_list('count', flat=True).first()
+    if row is None:
+        row = Favorite.objects.filter(user_id=user_id).count()
+        FavoriteCount.objects.get_or_create(user_id=user_id, defaults={'count': row})
+    cache.set(key, row, CACHE_TIMEOUT)
+    return row
+
+
+def member_ids(user_id, car_ids):
+    """Какие из car_ids в избранном у пользователя — по уникальному индексу (user, car)."""
+    car_ids = list(car_ids)
+    if not car_ids:
+        return set()
+    return set(Favorite.objects.filter(user_id=user_id, car_id__in=car_ids)
+               .order_by().values_list('car_id', flat=True))
+
+
+# ---------- Массовые изменения ----------
+def _columns():
+    qn = connection.ops.quote_name
+    meta = Favorite._meta
+    return (qn(meta.db_table), qn(meta.get_field('user').column),
+            qn(meta.get_field('car').column), qn(meta.get_field('created_at').column))
+
+
+def _insert(user_id, car_ids):
+    """Одним INSERT ... SELECT: несуществующие авто и уже добавленные пропускаются."""
+    table, user_col, car_col, created_col = _columns()
+    marks = ', '.join(['%s'] * len(car_ids))
+    now = connection.ops.adapt_datetimefield_value(timezone.now())
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'INSERT INTO {table} ({user_col}, {car_col}, {created_col}) '
+            f'SELECT %s, id, %s FROM {connection.ops.quote_name(Car._meta.db_table)} '
+            f'WHERE id IN ({marks}) ON CONFLICT DO NOTHING',
+            [user_id, now, *car_ids],
+        )
+        return cursor.rowcount
+
+
+def _delete(user_id, car_ids):
+    table, user_col, car_col, _ = _columns()
+    marks = ', '.join(['%s'] * len(car_ids))
+    with connection.cursor() as cursor:
+        cursor.execute(f'DELETE FROM {table} WHERE {user_col} = %s AND {car_col} IN ({marks})',
+                       [user_id, *car_ids])
+        return cursor.rowcount
+
+
+def _changed(user_id, added, removed):
+    # То, что для одиночных строк делают сигналы Favorite
+    if added != removed:
+        adjust(user_id, added - removed)
+    if added or removed:
+        stamps.bump_user(user_id)
+
+
+def update(user_id, add=(), remove=()):
+    """
+    Добавить add и убрать remove (id авто, не больше MAX_BATCH всего) одной
+    транзакцией. Возвращает (добавлено, удалено) — реально изменённые строки.
+    """
+    add, remove = sorted(set(add)), sorted(set(remove))
+    if len(add) + len(remove) > MAX_BATCH:
+        raise ValueError(f'не больше {MAX_BATCH} авто за раз')
+    with transaction.atomic():
+        added = _insert(user_id, add) if add else 0
+        removed = _delete(user_id, remove) if remove else 0
+        _changed(user_id, added, removed)
+    return added, removed
+
+
+def toggle(user_id, car_id):
+    """Убрать из избранного, а если не было — добавить. True — добавлено."""
+    with transaction.atomic():
+        if _delete(user_id, [car_id]):
+            _changed(user_id, 0, 1)
+            return False
+        added = _insert(user_id, [car_id])
+        _changed(user_id, added, 0)
+    return bool(added)
+
+
+def repair(user_ids=None):
+    """
+    Пересчитать счётчики по таблице Favorite (всех или указанных пользователей).
+    Возвращает число исправленных строк.
+    """
+    users = get_user_model().objects.order_by()
+    counters = FavoriteCount.objects.all()
+    if user_ids is not None:
+        users = users.filter(pk__in=user_ids)
+        counters = counters.filter(user_id__in=user_ids)
+    actual = dict(users.annotate(n=Count('favorites')).values_list('pk', 'n'))
+    stored = dict(counters.values_list('user_id', 'count'))
+    fixed = [FavoriteCount(user_id=pk, count=n) for pk, n in actual.items() if stored.get(pk) != n]
+    with transaction.atomic():
+        FavoriteCount.objects.bulk_create(fixed, batch_size=1000, update_conflicts=True,
+                                          unique_fields=['user'], update_fields=['count'])
+    _invalidate([row.user_id for row in fixed])
+    return len(fixed)
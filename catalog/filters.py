@@ -1,8 +1,21 @@
 import django_filters
-from django_filters import NumberFilter, ChoiceFilter, ModelChoiceFilter
+from django.db.models import Func
+from django_filters import CharFilter, NumberFilter, ChoiceFilter, ModelChoiceFilter
+from . import lookups, search
 from .models import Car, Brand, CarModel
+from .pagination import ALLOWED_SORTS, normalize_sort
+
+# Поля фильтров-диапазонов
+RANGE_FIELDS = ('year', 'price')
+
+
+class Unindexed(Func):
+    """«+поле» в SQL: то же значение и аффинити, но SQLite не берёт для условия индекс."""
+    template = '+%(expressions)s'
+
 
 class CarFilter(django_filters.FilterSet):
+    q = CharFilter(method='filter_search', label='Поиск')
     brand = ModelChoiceFilter(queryset=Brand.objects.all(), label='Марка')
     model = ModelChoiceFilter(queryset=CarModel.objects.none(), label='Модель')
     year_min = NumberFilter(field_name='year', lookup_expr='gte', label='Год от')
@@ -24,3 +37,39 @@ class CarFilter(django_filters.FilterSet):
             self.filters['model'].queryset = CarModel.objects.filter(brand_id=brand_id)
         else:
             self.filters['model'].queryset = CarModel.objects.all()
+        # Диапазон по полю, отличному от поля сортировки, проверяем построчно
+        # (+year): иначе SQLite выбирает весь диапазон по индексу года и сортирует
+        # его во временном B-tree, а так идёт по индексу сортировки до LIMIT
+        # (см. catalog/queryplan.py)
+        sort_field = normalize_sort(self.data.get('sort') if self.data else None).lstrip('-')
+        self._unindexed = [f for f in RANGE_FIELDS if f != sort_field]
+        for f in self.filters.values():
+            if f.field_name in self._unindexed:
+                f.field_name = f'{f.field_name}_unindexed'
+
+    @property
+    def form(self):
+        form = super().form
+        if not getattr(self, '_choices_ready', False):
+            # Варианты марки/модели — из справочника в памяти (catalog/lookups.py),
+            # а не Brand/CarModel-запросами на каждую отрисовку
+            lookup = lookups.get()
+            brand_id = lookups.brand_id_from(self.data.get('brand')) if self.data else None
+            # Сеттер choices у полей django-filter оборачивает их в ModelChoiceIterator,
+            # поэтому готовые пары отдаём прямо виджету; проверка — по queryset
+            form.fields['brand'].widget.choices = lookup.brand_choices()
+            form.fields['model'].widget.choices = lookup.model_choices(brand_id)
+            self._choices_ready = True
+        return form
+
+    def filter_queryset(self, queryset):
+        queryset = queryset.alias(**{f'{f}_unindexed': Unindexed(f) for f in self._unindexed})
+        return super().filter_queryset(queryset)
+
+    def filter_search(self, queryset, name, value):
+        # Полнотекстовый поиск (FTS5); без явной сортировки — по релевантности
+        qs = search.apply(queryset, value)
+        if search.fts_available() and search.to_match_query(value) \
+                and self.data.get('sort') not in ALLOWED_SORTS:
+            qs = qs.order_by('search_rank', 'id')
+        return qs
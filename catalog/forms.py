@@ -1,4 +1,5 @@
 from django import forms
+from . import lookups
 from .models import Car, CarModel
 
 class CarForm(forms.ModelForm):
@@ -18,13 +19,19 @@ class CarForm(forms.ModelForm):
             if not isinstance(field.widget, (forms.CheckboxInput, forms.FileInput)):
                 field.widget.attrs.setdefault('class', 'form-select' if name in ('brand', 'model', 'engine_type', 'transmission') else 'form-control')
 
-        # Динамический queryset для 'model'
+        # Динамический queryset для 'model' (по нему проверяется выбор)
         self.fields['model'].queryset = CarModel.objects.none()
+        brand_id = None
         if 'brand' in self.data:
-            try:
-                brand_id = int(self.data.get('brand'))
+            brand_id = lookups.brand_id_from(self.data.get('brand'))
+            if brand_id is not None:
                 self.fields['model'].queryset = CarModel.objects.filter(brand_id=brand_id)
-            except (TypeError, ValueError):
-                pass
         elif self.instance.pk:
-            self.fields['model'].queryset = CarModel.objects.filter(brand=self.instance.brand)
+            brand_id = self.instance.brand_id
+            self.fields['model'].queryset = CarModel.objects.filter(brand_id=brand_id)
+
+        # Варианты селектов — из справочника в памяти, без запросов (catalog/lookups.py)
+        lookup = lookups.get()
+        self.fields['brand'].choices = lookup.brand_choices()
+        self.fields['model'].choices = (lookup.model_choices(brand_id) if brand_id is not None
+                                        else [('', lookups.EMPTY_LABEL)])
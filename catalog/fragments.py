@@ -0,0 +1,160 @@
+"""
+Кеш отрисованных карточек авто для списка (CarListView).
+
+Карточка (фото, марка/модель, характеристики, цена, общие ссылки) одинакова
+для всех посетителей, поэтому её HTML кешируется. Ключ включает версии
+авто, его марки и модели: сохранение/удаление Car и переименование
+Brand/CarModel выдают новую версию (см. catalog/signals.py), и старая
+запись просто перестаёт читаться. Версии лежат в общем для воркеров кеше
+(stamps.shared_cache()), сами карточки — в CARD_CACHE_ALIAS.
+
+Всё, что зависит от пользователя (звёздочка избранного, кнопки персонала),
+подставляется поверх закешированного HTML на каждый запрос.
+Работает с любым бэкендом Django-кеша (LocMemCache, FileBasedCache, ...).
+"""
+from uuid import uuid4
+
+from django.conf import settings
+from django.core.cache import caches
+from django.template.loader import render_to_string
+from django.utils.safestring import mark_safe
+
+from .stamps import shared_cache
+
+CARD_TEMPLATE = 'catalog/includes/car_card.html'
+STAFF_TEMPLATE = 'catalog/includes/car_card_staff.html'
+PREFIX = 'card'
+
+# Метки в закешированном HTML, которые заменяются на каждый запрос
+SLOTS = {
+    'fav_btn': '%%card:fav-btn%%',
+    'fav_icon': '%%card:fav-icon%%',
+    'staff': '<!--card:staff-->',
+}
+FAV_ON = ('btn-warning', 'bi-star-fill')
+FAV_OFF = ('btn-outline-warning', 'bi-star')
+
+
+def _cache():
+    return caches[getattr(settings, 'CARD_CACHE_ALIAS', 'default')]
+
+
+def _timeout():
+    return getattr(settings, 'CARD_CACHE_TIMEOUT', 24 * 60 * 60)
+
+
+# ---------- Версии ----------
+def _version_key(kind, pk):
+    return f'{PREFIX}:v:{kind}:{pk}'
+
+
+def bump(kind, pk):
+    """Новая версия для 'car' / 'brand' / 'model' — старые карточки больше не читаются."""
+    shared_cache().set(_version_key(kind, pk), uuid4().hex[:12], None)
+
+
+def bump_car(pk):
+    bump('car', pk)
+
+
+def bump_cars(pks):
+    """То же для многих авто сразу (массовые операции в обход save())."""
+    if pks:
+        shared_cache().set_many({_version_key('car', pk): uuid4().hex[:12] for pk in pks}, None)
+
+
+def _versions(cars):
+    """{version_key: token}; отсутствующие (новые или вытесненные) версии заводим."""
+    cache = shared_cache()
+    keys = set()
+    for car in cars:
+        keys.update((_version_key('car', car.pk),
+                     _version_key('brand', car.brand_id),
+                     _version_key('model', car.model_id)))
+    found = cache.get_many(keys)
+    missing = {key: uuid4().hex[:12] for key in keys - found.keys()}
+    if missing:
+        # Вытесненная версия получает новый токен, а не «1» —
+        # иначе можно было бы прочитать устаревшую карточку
+        cache.set_many(missing, None)
+        found.update(missing)
+    return found
+
+
+def _card_key(car, versions):
+    return ':'.join((
+        PREFIX, str(car.pk),
+        versions[_version_key('car', car.pk)],
+        versions[_version_key('brand', car.brand_id)],
+        versions[_version_key('model', car.model_id)],
+    ))
+
+
+# ---------- Счётчики попаданий ----------
+def _incr(key, delta):
+    if not delta:
+        return
+    cache = _cache()
+    cache.add(key, 0, None)
+    try:
+        cache.incr(key, delta)
+    except ValueError:  # ключ успели вытеснить
+        cache.set(key, delta, None)
+
+
+def stats():
+    cache = _cache()
+    got = cache.get_many([f'{PREFIX}:stats:hits', f'{PREFIX}:stats:misses'])
+    hits = got.get(f'{PREFIX}:stats:hits', 0)
+    misses = got.get(f'{PREFIX}:stats:misses', 0)
+    total = hits + misses
+    return {'hits': hits, 'misses': misses,
+            'hit_ratio': round(hits / total, 3) if total else None}
+
+
+def reset_stats():
+    _cache().delete_many([f'{PREFIX}:stats:hits', f'{PREFIX}:stats:misses'])
+
+
+# ---------- Отрисовка ----------
+def render_cards(cars, request, favorite_ids):
+    """
+    [(car, html), ...] для страницы списка. Закешированные карточки берём
+    одним get_many, недостающие рендерим и кладём одним set_many.
+    """
+    cars = list(cars)
+    if not cars:
+        return []
+    cache = _cache()
+    versions = _versions(cars)
+    keys = {car.pk: _card_key(car, versions) for car in cars}
+    cached = cache.get_many(keys.values())
+
+    fresh = {}
+    slots = {name: mark_safe(marker) for name, marker in SLOTS.items()}
+    for car in cars:
+        if keys[car.pk] not in cached:
+            fresh[keys[car.pk]] = render_to_string(CARD_TEMPLATE, {'car': car, 'slot': slots})
+    if fresh:
+        cache.set_many(fresh, _timeout())
+        cached.update(fresh)
+    _incr(f'{PREFIX}:stats:hits', len(cars) - len(fresh))
+    _incr(f'{PREFIX}:stats:misses', len(fresh))
+
+    user = request.user
+    can_edit = user.is_staff or user.has_perm('catalog.change_car')
+    can_delete = user.is_staff or user.has_perm('catalog.delete_car')
+    result = []
+    for car in cars:
+        btn, icon = FAV_ON if car.pk in favorite_ids else FAV_OFF
+        staff = ''
+        if can_edit or can_delete:
+            staff = render_to_string(STAFF_TEMPLATE, {
+                'car': car, 'can_edit': can_edit, 'can_delete': can_delete,
+            })
+        html = (cached[keys[car.pk]]
+                .replace(SLOTS['fav_btn'], btn)
+                .replace(SLOTS['fav_icon'], icon)
+                .replace(SLOTS['staff'], staff))
+        result.append((car, mark_safe(html)))
+    return result
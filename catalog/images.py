@@ -0,0 +1,196 @@
+"""
+Уменьшенные копии фото авто (WebP/AVIF нескольких ширин) для srcset.
+
+Оригинал из Car.image не трогаем. Копии кладём рядом, в cars/variants/,
+а их список — в Car.image_variants. Генерация идёт в фоновом пуле потоков
+после коммита транзакции, чтобы загрузка фото не тормозила ответ.
+Для уже загруженных фото — команда generate_car_images.
+
+Одно фото может быть у нескольких авто (имя — хеш содержимого, см.
+catalog/storage.py): превью у них общие, а файл с превью удаляется,
+когда на него не ссылается больше ни одно авто (release()).
+
+Проверка ссылок и удаление идут внутри db.write_locked() — транзакции,
+которая сразу берёт блокировку записи SQLite (catalog/db.py). Ту же
+блокировку первым делом берёт Car.save() (AtomicSaveModel), прежде чем
+проверить, есть ли уже файл с таким хешем, и сохранить строку. Поэтому
+загрузка того же фото либо видит удаление и пишет файл заново, либо
+успевает закоммитить ссылку до проверки.
+"""
+import logging
+import posixpath
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+from threading import Lock
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import close_old_connections, transaction
+from PIL import Image, ImageOps, features
+
+from . import db, fragments, stamps
+from .models import Car
+
+logger = logging.getLogger(__name__)
+
+VARIANTS_DIR = 'cars/variants'
+DEFAULT_WIDTHS = (320, 640, 960)
+# Параметры кодировщиков: AVIF по умолчанию очень медленный, speed=8 — разумный компромисс
+SAVE_OPTIONS = {'webp': {'quality': 80, 'method': 4}, 'avif': {'quality': 55, 'speed': 8}}
+
+
+def widths():
+    return tuple(getattr(settings, 'CAR_IMAGE_WIDTHS', DEFAULT_WIDTHS))
+
+
+def formats():
+    # AVIF — только если Pillow собран с libavif
+    return ('avif', 'webp') if features.check('avif') else ('webp',)
+
+
+def variant_name(name, width, fmt):
+    # cars/1200x900.jpg -> cars/variants/1200x900_jpg_320w.webp
+    # (расширение оставляем: 1200x900.jpg и 1200x900.webp — разные фото)
+    stem = posixpath.basename(name).replace('.', '_')
+    return f'{VARIANTS_DIR}/{stem}_{width}w.{fmt}'
+
+
+def build_variants(name, storage=default_storage):
+    """
+    Нарезает копии для файла name. Возвращает словарь для Car.image_variants:
+    {'src': name, 'width': 1200, 'height': 900, 'widths': [320, 640, 960],
+     'formats': ['avif', 'webp']}
+    """
+    with storage.open(name, 'rb') as fh:
+        image = Image.open(fh)
+        image = ImageOps.exif_transpose(image)
+        image.load()
+    if image.mode not in ('RGB', 'RGBA'):
+        image = image.convert('RGBA' if 'A' in image.getbands() or image.mode == 'P' else 'RGB')
+
+    # Копии не шире оригинала; небольшое фото дополнительно — в своём размере
+    sizes = [w for w in widths() if w < image.width]
+    if image.width < max(widths()):
+        sizes.append(image.width)
+    fmts = formats()
+    for width in sizes:
+        height = round(image.height * width / image.width)
+        resized = image.resize((width, height), Image.LANCZOS)
+        for fmt in fmts:
+            buf = BytesIO()
+            resized.save(buf, fmt.upper(), **SAVE_OPTIONS[fmt])
+            target = variant_name(name, width, fmt)
+            if storage.exists(target):
+                storage.delete(target)
+            storage.save(target, ContentFile(buf.getvalue()))
+    return {'src': name, 'width': image.width, 'height': image.height,
+            'widths': sizes, 'formats': list(fmts)}
+
+
+def delete_variants(variants, storage=default_storage):
+    for width in variants.get('widths', ()):
+        for fmt in variants.get('formats', ()):
+            target = variant_name(variants['src'], width, fmt)
+            if storage.exists(target):
+                storage.delete(target)
+
+
+# ---------- Ссылки на файлы ----------
+def image_storage():
+    return Car._meta.get_field('image').storage
+
+
+def release(name, variants=None):
+    """
+    Фото name больше не у этого авто. Если на файл не ссылается ни одно авто
+    (индекс по Car.image), удаляем его и превью. True — если удалили.
+    """
+    if not name:
+        return False
+    with db.write_locked():
+        if Car.objects.filter(image=name).exists():
+            return False
+        if variants and variants.get('src') == name:
+            delete_variants(variants)
+        storage = image_storage()
+        if storage.exists(name):
+            storage.delete(name)
+    return True
+
+
+def _variant_stem(name):
+    # cars/variants/<stem>_640w.webp -> <stem>
+    stem, sep, _ = posixpath.basename(name).rpartition('_')
+    return stem if sep else None
+
+
+def collect_garbage(dry_run=False):
+    """Удалить из cars/ и cars/variants/ файлы, на которые не ссылается ни одно авто."""
+    storage = image_storage()
+    # Под блокировкой записи, как release(): загрузка не проскочит между проверкой и удалением
+    with db.write_locked():
+        referenced = set(Car.objects.exclude(image='').exclude(image__isnull=True)
+                         .values_list('image', flat=True).distinct())
+        stems = {posixpath.basename(name).replace('.', '_') for name in referenced}
+        directory = posixpath.dirname(VARIANTS_DIR)
+        _, files = storage.listdir(directory)
+        garbage = [f'{directory}/{f}' for f in files if f'{directory}/{f}' not in referenced]
+        if storage.exists(VARIANTS_DIR):
+            _, files = storage.listdir(VARIANTS_DIR)
+            garbage += [f'{VARIANTS_DIR}/{f}' for f in files if _variant_stem(f) not in stems]
+        if not dry_run:
+            for name in garbage:
+                storage.delete(name)
+    return garbage
+
+
+# ---------- Фоновая генерация ----------
+_executor = None
+_executor_lock = Lock()
+
+
+def _get_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=getattr(settings, 'CAR_IMAGE_WORKERS', 2),
+                thread_name_prefix='car-images',
+            )
+        return _executor
+
+
+def process_car(car_id, old_image=None, old_variants=None):
+    """Сгенерировать копии для текущего фото авто и освободить старое фото."""
+    try:
+        row = Car.objects.filter(pk=car_id).values('image', 'image_variants').first()
+        if old_image and (row is None or old_image != row['image']):
+            release(old_image, old_variants)
+        if row is None or not row['image']:
+            return None
+        if row['image_variants'].get('src') == row['image']:
+            return row['image_variants']
+        # То же фото уже есть у другого авто — его превью подходят как есть
+        variants = (Car.objects.filter(image=row['image'], image_variants__src=row['image'])
+                    .exclude(pk=car_id).values_list('image_variants', flat=True).first())
+        if variants is None:
+            variants = build_variants(row['image'])
+        # update() — без сигналов: в каталоге ничего, кроме превью, не поменялось
+        Car.objects.filter(pk=car_id, image=row['image']).update(image_variants=variants)
+        # в закешированной карточке и у клиентов страница ещё без srcset
+        fragments.bump_car(car_id)
+        stamps.bump_car(car_id)
+        return variants
+    except Exception:
+        logger.exception('Не удалось сделать превью для авто %s', car_id)
+        return None
+    finally:
+        close_old_connections()
+
+
+def schedule(car_id, old_image=None, old_variants=None):
+    """Поставить авто в очередь на нарезку (и освобождение старого фото) после коммита."""
+    transaction.on_commit(
+        lambda: _get_executor().submit(process_car, car_id, old_image, old_variants)
+    )
@@ -0,0 +1,216 @@
+"""
+Потоковый импорт авто из CSV / JSONL (см. команду import_cars).
+
+Строки читаются по одной и копятся в пачки. Для каждой пачки:
+  - марки и модели ищутся в словарях в памяти, недостающие создаются
+    одним bulk_create на пачку;
+  - проверка из Car.clean() (модель относится к марке) делается сразу
+    для всей пачки по словарю model_id -> brand_id;
+  - авто вставляются (или обновляются по id) одним bulk_create
+    в отдельной транзакции.
+bulk_create не шлёт сигналы, поэтому производные данные (журнал изменений,
+фасеты, поисковый индекс, версии кеша) импортёр обновляет сам.
+"""
+import csv
+import json
+import time
+from dataclasses import dataclass, field
+from decimal import Decimal, InvalidOperation
+
+from django.db import transaction
+
+from . import changes, facets, fragments, pricestats, search, stamps
+from .models import Brand, Car, CarModel
+
+ENGINES = {value for value, _ in Car.ENGINE_CHOICES}
+TRANSMISSIONS = {value for value, _ in Car.TRANSMISSION_CHOICES}
+UPDATE_FIELDS = ('brand', 'model', 'year', 'engine_type', 'transmission', 'price', 'description')
+MAX_PRICE = Decimal('99999999.99')  # max_digits=10, decimal_places=2
+
+
+def read_rows(stream, fmt):
+    """Построчно: (номер строки, dict)."""
+    if fmt == 'csv':
+        for number, row in enumerate(csv.DictReader(stream), start=2):
+            yield number, row
+        return
+    for number, line in enumerate(stream, start=1):
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            row = json.loads(line)
+        except ValueError as exc:
+            yield number, {'__error__': f'битый JSON: {exc}'}
+            continue
+        yield number, row if isinstance(row, dict) else {'__error__': 'ожидался объект'}
+
+
+@dataclass
+class ImportStats:
+    read: int = 0
+    loaded: int = 0
+    rejected: int = 0
+    brands_created: int = 0
+    models_created: int = 0
+    started: float = field(default_factory=time.monotonic)
+
+    @property
+    def elapsed(self):
+        return time.monotonic() - self.started
+
+    @property
+    def rate(self):
+        return self.read / self.elapsed if self.elapsed else 0.0
+
+
+class CarImporter:
+    def __init__(self, batch_size=1000, upsert=False, create_missing=True, on_reject=None):
+        self.batch_size = batch_size
+        self.upsert = upsert
+        self.create_missing = create_missing
+        self.on_reject = on_reject or (lambda number, row, reason: None)
+        self.stats = ImportStats()
+        # Кеш справочников: имя марки -> id, (id марки, имя модели) -> id, id модели -> id марки
+        self.brands = dict(Brand.objects.values_list('name', 'id'))
+        self.brand_ids = set(self.brands.values())
+        self.models = {}
+        self.model_brand = {}
+        for pk, brand_id, name in CarModel.objects.values_list('id', 'brand_id', 'name'):
+            self.models[(brand_id, name)] = pk
+            self.model_brand[pk] = brand_id
+
+    # ---------- Разбор строки ----------
+    def _parse(self, row):
+        """dict строки -> поля Car (марка/модель пока по имени или id) или ValueError."""
+        if '__error__' in row:
+            raise ValueError(row['__error__'])
+        data = {}
+        for name in ('brand', 'model'):
+            raw_id = str(row.get(f'{name}_id') or '').strip()
+            raw_name = str(row.get(name) or '').strip()
+            if raw_id:
+                data[f'{name}_id'] = int(raw_id)
+            elif raw_name:
+                data[f'{name}_name'] = raw_name
+            else:
+                raise ValueError(f'нет поля {name}')
+        try:
+            data['year'] = int(row.get('year'))
+        except (TypeError, ValueError):
+            raise ValueError('некорректный year')
+        if not 1886 <= data['year'] <= 2100:
+            raise ValueError('year вне диапазона')
+        data['engine_type'] = str(row.get('engine_type') or '').strip()
+        if data['engine_type'] not in ENGINES:
+            raise ValueError('некорректный engine_type')
+        data['transmission'] = str(row.get('transmission') or '').strip()
+        if data['transmission'] not in TRANSMISSIONS:
+            raise ValueError('некорректный transmission')
+        try:
+            data['price'] = Decimal(str(row.get('price')).replace(' ', '')).quantize(Decimal('0.01'))
+        except (InvalidOperation, ValueError):
+            raise ValueError('некорректный price')
+        if not 0 <= data['price'] <= MAX_PRICE:
+            raise ValueError('price вне диапазона')
+        data['description'] = str(row.get('description') or '')
+        if self.upsert and str(row.get('id') or '').strip():
+            data['id'] = int(row['id'])
+        return data
+
+    # ---------- Справочники ----------
+    def _resolve_brands(self, rows):
+        missing = {r['brand_name'] for r in rows if 'brand_name' in r} - self.brands.keys()
+        if missing and self.create_missing:
+            Brand.objects.bulk_create([Brand(name=n) for n in missing], ignore_conflicts=True)
+            created = dict(Brand.objects.filter(name__in=missing).values_list('name', 'id'))
+            changes.record_many('brand', created.values())
+            self.brands.update(created)
+            self.brand_ids.update(self.brands.values())
+            self.stats.brands_created += len(missing)
+        for r in rows:
+            if 'brand_name' in r:
+                r['brand_id'] = self.brands.get(r.pop('brand_name'))
+
+    def _resolve_models(self, rows):
+        wanted = {(r['brand_id'], r['model_name']) for r in rows
+                  if 'model_name' in r and r['brand_id'] in self.brand_ids}
+        missing = wanted - self.models.keys()
+        if missing and self.create_missing:
+            CarModel.objects.bulk_create(
+                [CarModel(brand_id=b, name=n) for b, n in missing], ignore_conflicts=True
+            )
+            brand_ids = {b for b, _ in missing}
+            created = []
+            for pk, brand_id, name in (CarModel.objects.filter(brand_id__in=brand_ids)
+                                       .values_list('id', 'brand_id', 'name')):
+                if (brand_id, name) in missing:
+                    created.append(pk)
+                self.models[(brand_id, name)] = pk
+                self.model_brand[pk] = brand_id
+            changes.record_many('model', created)
+            self.stats.models_created += len(missing)
+        for r in rows:
+            if 'model_name' in r:
+                r['model_id'] = self.models.get((r['brand_id'], r.pop('model_name')))
+
+    # ---------- Пачка ----------
+    def _flush(self, batch):
+        parsed = []
+        for number, row in batch:
+            try:
+                parsed.append((number, row, self._parse(row)))
+            except ValueError as exc:
+                self._reject(number, row, str(exc))
+        rows = [data for _, _, data in parsed]
+        with transaction.atomic():
+            self._resolve_brands(rows)
+            self._resolve_models(rows)
+            # Car.clean() для всей пачки сразу: модель должна принадлежать марке
+            cars = []
+            for number, row, data in parsed:
+                if data['brand_id'] is None or data['model_id'] is None:
+                    self._reject(number, row, 'неизвестная марка или модель')
+                elif self.model_brand.get(data['model_id']) != data['brand_id']:
+                    self._reject(number, row, 'Выбранная модель не относится к выбранной марке.')
+                else:
+                    cars.append(Car(**data))
+            new = [c for c in cars if c.pk is None]
+            existing = [c for c in cars if c.pk is not None]
+            if new:
+                Car.objects.bulk_create(new)
+            if existing:
+                Car.objects.bulk_create(existing, update_conflicts=True, unique_fields=['id'],
+                                        update_fields=UPDATE_FIELDS)
+            ids = [c.pk for c in cars if c.pk is not None]
+            changes.record_many('car', ids)
+            search.index_cars(ids)
+        self.stats.loaded += len(cars)
+        fragments.bump_cars([c.pk for c in existing])
+        stamps.bump_cars([c.pk for c in existing])
+        return len(cars)
+
+    def _reject(self, number, row, reason):
+        self.stats.rejected += 1
+        self.on_reject(number, row, reason)
+
+    def run(self, rows, progress=None):
+        batch = []
+        for number, row in rows:
+            self.stats.read += 1
+            batch.append((number, row))
+            if len(batch) >= self.batch_size:
+                self._flush(batch)
+                batch = []
+                if progress:
+                    progress(self.stats)
+        if batch:
+            self._flush(batch)
+        # Фасеты и статистику цен проще пересчитать одним GROUP BY, чем двигать по строке
+        facets.rebuild()
+        pricestats.rebuild()
+        if self.stats.brands_created or self.stats.models_created:
+            # bulk_create идёт мимо сигналов — справочник марок и моделей (lookups.py)
+            stamps.bump_names()
+        stamps.bump_catalog()
+        return self.stats
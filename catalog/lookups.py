@@ -0,0 +1,84 @@
+"""
+Справочник «марка → модели» одним ресурсом.
+
+Карта строится двумя запросами и держится в памяти процесса, пока не
+сменится штамп 'names' (catalog/stamps.py): его двигают сигналы Brand /
+CarModel и массовые операции. Из неё же:
+  - JSON по адресу с хешем содержимого (api/brand-models/<hash>.json),
+    который браузер кеширует навсегда — скрипты форм берут модели
+    марки из него, а не запросом на каждую смену марки;
+  - варианты селектов марки и модели в CarFilter и CarForm
+    (без запросов и без str(CarModel), который ходит за маркой).
+"""
+import hashlib
+import json
+import threading
+
+from django.urls import reverse
+
+from . import stamps
+from .models import Brand, CarModel
+
+EMPTY_LABEL = '---------'
+
+
+class BrandModels:
+    """Снимок справочника: марки, модели по маркам и JSON-представление."""
+
+    def __init__(self, brands, models):
+        self.brands = brands                      # [(id, name), ...] по имени
+        self.models = models                      # {brand_id: [(id, name), ...]}
+        self.brand_names = dict(brands)
+        self.payload = json.dumps(
+            {'brands': brands, 'models': {str(b): m for b, m in models.items()}},
+            ensure_ascii=False, separators=(',', ':'),
+        ).encode()
+        self.digest = hashlib.sha256(self.payload).hexdigest()[:16]
+
+    @property
+    def url(self):
+        return reverse('api_brand_models', args=[self.digest])
+
+    def brand_choices(self):
+        return [('', EMPTY_LABEL)] + self.brands
+
+    def model_choices(self, brand_id=None):
+        """Модели марки или все (тогда с названием марки, как str(CarModel))."""
+        if brand_id is not None:
+            return [('', EMPTY_LABEL)] + self.models.get(brand_id, [])
+        choices = [('', EMPTY_LABEL)]
+        for brand_id, brand_name in self.brands:
+            choices += [(pk, f'{brand_name} {name}') for pk, name in self.models.get(brand_id, [])]
+        return choices
+
+
+def build():
+    brands = list(Brand.objects.order_by('name').values_list('id', 'name'))
+    models = {}
+    for pk, brand_id, name in CarModel.objects.order_by('name').values_list('id', 'brand_id', 'name'):
+        models.setdefault(brand_id, []).append((pk, name))
+    return BrandModels(brands, models)
+
+
+_current = (None, None)  # (штамп, BrandModels)
+_lock = threading.Lock()
+
+
+def get():
+    """Актуальный справочник; пересобирается, только если сменился штамп."""
+    global _current
+    stamp = stamps.get('names')
+    cached_stamp, value = _current
+    if cached_stamp == stamp:
+        return value
+    with _lock:
+        if _current[0] != stamp:
+            _current = (stamp, build())
+        return _current[1]
+
+
+def brand_id_from(value):
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
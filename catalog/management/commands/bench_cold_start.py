@@ -0,0 +1,33 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from catalog import bench
+
+
+class Command(BaseCommand):
+    help = ('Холодный старт: новый процесс импортирует WSGI-приложение и делает первые запросы, '
+            'с прогревом и без: время старта и задержка первого/второго запроса. Результат — JSON.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--runs', type=int, default=5, help='Процессов на режим (по умолчанию 5)')
+        parser.add_argument('--urls', default='/',
+                            help='Адреса первых запросов через запятую (по умолчанию /)')
+        parser.add_argument('--output', help='Куда записать JSON (по умолчанию — stdout)')
+
+    def handle(self, *args, **options):
+        if options['runs'] < 1:
+            raise CommandError('--runs должно быть не меньше 1.')
+        urls = [u.strip() for u in options['urls'].split(',') if u.strip()]
+        if not urls:
+            raise CommandError('Нужен хотя бы один адрес.')
+        log = self.stderr if not options['output'] else self.stdout
+        result = bench.cold_start(runs=options['runs'], urls=urls,
+                                  progress=lambda message: log.write(f'  {message}'))
+        data = json.dumps(result, ensure_ascii=False, indent=2)
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as f:
+                f.write(data + '\n')
+            self.stdout.write(self.style.SUCCESS(f"Записано: {options['output']}"))
+        else:
+            self.stdout.write(data)
@@ -0,0 +1,34 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from catalog import bench
+
+
+class Command(BaseCommand):
+    help = ('Читатели (список) и писатели (избранное) одновременно в разных режимах '
+            'журнала SQLite: запросов/с, p50/p95/p99 и ошибки по ролям. Результат — JSON.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--readers', type=int, default=4, help='Потоков-читателей (по умолчанию 4)')
+        parser.add_argument('--writers', type=int, default=2, help='Потоков-писателей (по умолчанию 2)')
+        parser.add_argument('--seconds', type=float, default=5.0, help='Длительность прогона на режим')
+        parser.add_argument('--modes', default='delete,wal',
+                            help='Режимы журнала через запятую (по умолчанию delete,wal)')
+        parser.add_argument('--output', help='Куда записать JSON (по умолчанию — stdout)')
+
+    def handle(self, *args, **options):
+        if options['readers'] < 0 or options['writers'] < 0 or options['readers'] + options['writers'] == 0:
+            raise CommandError('Нужен хотя бы один читатель или писатель.')
+        modes = [m.strip().lower() for m in options['modes'].split(',') if m.strip()]
+        log = self.stderr if not options['output'] else self.stdout
+        result = bench.contention(readers=options['readers'], writers=options['writers'],
+                                  seconds=options['seconds'], modes=modes,
+                                  progress=lambda message: log.write(f'  {message}'))
+        data = json.dumps(result, ensure_ascii=False, indent=2)
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as f:
+                f.write(data + '\n')
+            self.stdout.write(self.style.SUCCESS(f"Записано: {options['output']}"))
+        else:
+            self.stdout.write(data)
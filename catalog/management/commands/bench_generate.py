@@ -0,0 +1,36 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from catalog import bench
+from catalog.models import Car
+
+
+class Command(BaseCommand):
+    help = ('Синтетический каталог для бенчмарка (детерминированный по --seed). '
+            'Лучше в отдельную БД: AUTOGUIDE_DB=bench.sqlite3.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--cars', type=int, default=10000, help='Число авто (по умолчанию 10000)')
+        parser.add_argument('--brands', type=int, default=50, help='Число марок (по умолчанию 50)')
+        parser.add_argument('--models-per-brand', type=int, default=20,
+                            help='Моделей у каждой марки (по умолчанию 20)')
+        parser.add_argument('--users', type=int, default=100, help='Пользователей с избранным')
+        parser.add_argument('--favorites-per-user', type=int, default=20,
+                            help='Избранных авто у пользователя (по умолчанию 20)')
+        parser.add_argument('--seed', type=int, default=42)
+        parser.add_argument('--append', action='store_true',
+                            help='Дописать к непустому каталогу (иначе — отказ)')
+
+    def handle(self, *args, **options):
+        if min(options['cars'], options['brands'], options['models_per_brand']) < 1:
+            raise CommandError('--cars, --brands и --models-per-brand должны быть положительными.')
+        if Car.objects.exists() and not options['append']:
+            raise CommandError('Каталог не пуст. Укажите --append или другую БД (AUTOGUIDE_DB).')
+        created = bench.generate(
+            cars=options['cars'], brands=options['brands'],
+            models_per_brand=options['models_per_brand'], users=options['users'],
+            favorites_per_user=options['favorites_per_user'], seed=options['seed'],
+            progress=lambda message: self.stdout.write(f'  {message}'),
+        )
+        self.stdout.write(self.style.SUCCESS(
+            'Готово: ' + ', '.join(f'{name} {count}' for name, count in created.items())
+        ))
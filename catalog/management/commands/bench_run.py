@@ -0,0 +1,58 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from catalog import bench
+
+
+class Command(BaseCommand):
+    help = ('Прогон сценариев каталога: задержка p50/p95/p99 и SQL-запросы на запрос. '
+            'Результат — JSON; с --baseline сравнивает с прошлым прогоном.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--repeat', type=int, default=30, help='Замеров на сценарий (по умолчанию 30)')
+        parser.add_argument('--warmup', type=int, default=3, help='Прогревочных запросов на сценарий')
+        parser.add_argument('--only', nargs='+', help='Только сценарии, в имени которых есть эти строки')
+        parser.add_argument('--cold', action='store_true', help='Очищать кеш перед каждым замером')
+        parser.add_argument('--concurrency', type=int, default=0,
+                            help='Дополнительно мерить пропускную способность (запросов/с) '
+                                 'при N параллельных клиентах')
+        parser.add_argument('--output', help='Куда записать JSON (по умолчанию — stdout)')
+        parser.add_argument('--baseline', help='JSON прошлого прогона для сравнения')
+        parser.add_argument('--tolerance', type=float, default=0.2,
+                            help='Допустимое замедление p95 относительно базы (доля, по умолчанию 0.2)')
+        parser.add_argument('--fail-on-regression', action='store_true',
+                            help='Код выхода 1, если есть регрессии')
+
+    def handle(self, *args, **options):
+        if options['repeat'] < 1:
+            raise CommandError('--repeat должен быть положительным.')
+        baseline = None
+        if options['baseline']:
+            with open(options['baseline'], encoding='utf-8') as f:
+                baseline = json.load(f)
+
+        log = self.stderr if not options['output'] else self.stdout
+        result = bench.run(repeat=options['repeat'], warmup=options['warmup'], only=options['only'],
+                           cold=options['cold'], concurrency=options['concurrency'],
+                           progress=lambda message: log.write(f'  {message}'))
+        if not result['results']:
+            raise CommandError('Каталог пуст — сначала bench_generate.')
+
+        data = json.dumps(result, ensure_ascii=False, indent=2)
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as f:
+                f.write(data + '\n')
+            self.stdout.write(self.style.SUCCESS(f"Записано: {options['output']}"))
+        else:
+            self.stdout.write(data)
+
+        if baseline is None:
+            return
+        regressions = bench.compare(result, baseline, tolerance=options['tolerance'])
+        for name, metric, before, now in regressions:
+            log.write(self.style.WARNING(f'  регрессия {name}: {metric} {before} -> {now}'))
+        if not regressions:
+            log.write(self.style.SUCCESS('Регрессий относительно базы нет.'))
+        elif options['fail_on_regression']:
+            raise CommandError(f'Регрессий: {len(regressions)}')
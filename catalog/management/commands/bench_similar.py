@@ -0,0 +1,33 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from catalog import bench, similar
+
+
+class Command(BaseCommand):
+    help = ('Бенчмарк индекса похожих авто на синтетических данных (по умолчанию 1 млн авто): '
+            'построение, mmap-снимок, задержка top-k с фильтрами и без. Результат — JSON.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--cars', type=int, default=1_000_000, help='Авто в индексе (по умолчанию 1 000 000)')
+        parser.add_argument('--queries', type=int, default=200, help='Запросов top-k на замер')
+        parser.add_argument('--k', type=int, default=6, help='Сколько похожих искать')
+        parser.add_argument('--seed', type=int, default=42)
+        parser.add_argument('--output', help='Куда записать JSON (по умолчанию — stdout)')
+
+    def handle(self, *args, **options):
+        if not similar.available():
+            raise CommandError('Нужен NumPy: pip install numpy')
+        if options['cars'] < 1 or options['queries'] < 1:
+            raise CommandError('--cars и --queries должны быть положительными.')
+        log = self.stderr if not options['output'] else self.stdout
+        result = bench.similar_benchmark(cars=options['cars'], queries=options['queries'], k=options['k'],
+                                         seed=options['seed'], progress=lambda message: log.write(f'  {message}'))
+        data = json.dumps(result, ensure_ascii=False, indent=2)
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as f:
+                f.write(data + '\n')
+            self.stdout.write(self.style.SUCCESS(f"Записано: {options['output']}"))
+        else:
+            self.stdout.write(data)
@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from catalog import similar
+
+
+class Command(BaseCommand):
+    help = ('Построить индекс похожих авто по таблице Car и записать снимок на диск '
+            '(SIMILAR_INDEX_DIR) — воркеры откроют его через mmap, не читая всю таблицу.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--path', help='Каталог снимка (по умолчанию SIMILAR_INDEX_DIR)')
+
+    def handle(self, *args, **options):
+        if not similar.available():
+            raise CommandError('Нужен NumPy: pip install numpy')
+        cars, seconds = similar.build_snapshot(options['path'])
+        path = options['path'] or similar.index_dir()
+        self.stdout.write(self.style.SUCCESS(f'Готово: {cars} авто за {seconds:.1f} с -> {path}'))
@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+
+from catalog import fragments
+
+
+class Command(BaseCommand):
+    help = 'Попадания/промахи кеша карточек авто (имеет смысл для общего кеша, напр. файлового)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--reset', action='store_true', help='Обнулить счётчики')
+
+    def handle(self, *args, **options):
+        data = fragments.stats()
+        self.stdout.write(f"Попаданий: {data['hits']}, промахов: {data['misses']}, "
+                          f"доля попаданий: {data['hit_ratio'] if data['hit_ratio'] is not None else '—'}")
+        if options['reset']:
+            fragments.reset_stats()
+            self.stdout.write(self.style.SUCCESS('Счётчики обнулены.'))
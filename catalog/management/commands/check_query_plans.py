@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from catalog import queryplan
+from catalog.models import Car
+
+
+class Command(BaseCommand):
+    help = ('EXPLAIN QUERY PLAN для всех сочетаний фильтров и сортировок списка авто; '
+            'ошибка, если какой-то запрос идёт полным проходом таблицы или сортирует во временном B-tree')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--car', type=int, help='id авто-образца для значений фильтров (по умолчанию — первое)')
+
+    def handle(self, *args, **options):
+        cars = Car.objects.order_by('id')
+        car = cars.filter(pk=options['car']).first() if options['car'] else cars.first()
+        if car is None:
+            raise CommandError('Нужно хотя бы одно авто в базе: значения фильтров берутся с образца.')
+        checked, problems = queryplan.check(car)
+        for problem in problems:
+            self.stdout.write(queryplan.format_problem(problem))
+        if problems:
+            raise CommandError(f'{len(problems)} из {checked} запросов без подходящего индекса.')
+        self.stdout.write(self.style.SUCCESS(f'Готово: {checked} запросов, все по индексам.'))
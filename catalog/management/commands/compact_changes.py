@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+
+from catalog import changes
+from catalog.models import CatalogChange
+
+
+class Command(BaseCommand):
+    help = ('Сжать журнал изменений каталога: оставить по одной, последней записи на объект '
+            '(токены потребителей остаются верными)')
+
+    def handle(self, *args, **options):
+        before = CatalogChange.objects.count()
+        removed = changes.compact()
+        self.stdout.write(self.style.SUCCESS(
+            f'Готово: удалено записей — {removed}, осталось — {before - removed}.'
+        ))
@@ -0,0 +1,32 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.management.base import BaseCommand
+
+from catalog import images
+from catalog.models import Car
+
+
+class Command(BaseCommand):
+    help = 'Нарезать WebP/AVIF-превью для уже загруженных фото авто'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--force', action='store_true',
+                            help='Пересоздать превью, даже если они уже есть')
+        parser.add_argument('--workers', type=int, default=4,
+                            help='Число потоков (по умолчанию 4)')
+
+    def handle(self, *args, **options):
+        qs = Car.objects.exclude(image='').exclude(image__isnull=True)
+        if options['force']:
+            qs.update(image_variants={})
+        ids = list(qs.values_list('id', flat=True))
+        started = time.monotonic()
+        done = 0
+        with ThreadPoolExecutor(max_workers=options['workers']) as pool:
+            for result in pool.map(images.process_car, ids):
+                done += result is not None
+        elapsed = time.monotonic() - started
+        self.stdout.write(self.style.SUCCESS(
+            f'Готово: {done} из {len(ids)} фото за {elapsed:.1f} с.'
+        ))
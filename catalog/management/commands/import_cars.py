@@ -0,0 +1,64 @@
+import csv
+import json
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+
+from catalog.importer import CarImporter, read_rows
+
+
+class Command(BaseCommand):
+    help = ('Потоковый импорт авто из CSV/JSONL. Колонки: brand (или brand_id), '
+            'model (или model_id), year, engine_type, transmission, price, '
+            'description, id (для --upsert).')
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help="Файл .csv / .jsonl или '-' для stdin")
+        parser.add_argument('--format', choices=('csv', 'jsonl'),
+                            help='Формат (по умолчанию — по расширению файла)')
+        parser.add_argument('--batch-size', type=int, default=1000,
+                            help='Строк в одной пачке/транзакции (по умолчанию 1000)')
+        parser.add_argument('--upsert', action='store_true',
+                            help='Строки с id обновляют существующие авто')
+        parser.add_argument('--no-create', action='store_true',
+                            help='Не создавать отсутствующие марки и модели (отклонять строку)')
+        parser.add_argument('--rejects', help='Куда записать отклонённые строки (JSONL)')
+
+    def handle(self, *args, **options):
+        path = options['path']
+        fmt = options['format'] or ('csv' if path.endswith('.csv') else 'jsonl' if path != '-' else None)
+        if fmt is None:
+            raise CommandError('Для stdin укажите --format.')
+        if options['batch_size'] < 1:
+            raise CommandError('--batch-size должен быть положительным.')
+
+        rejects = open(options['rejects'], 'w', encoding='utf-8') if options['rejects'] else None
+
+        def on_reject(number, row, reason):
+            if rejects:
+                rejects.write(json.dumps({'line': number, 'reason': reason, 'row': row},
+                                         ensure_ascii=False, default=str) + '\n')
+
+        def progress(stats):
+            self.stdout.write(f'  {stats.read} строк, {stats.rate:,.0f} строк/с, '
+                              f'отклонено {stats.rejected}')
+
+        importer = CarImporter(batch_size=options['batch_size'], upsert=options['upsert'],
+                               create_missing=not options['no_create'], on_reject=on_reject)
+        stream = sys.stdin if path == '-' else open(path, encoding='utf-8', newline='')
+        try:
+            stats = importer.run(read_rows(stream, fmt), progress=progress)
+        except csv.Error as exc:
+            raise CommandError(f'Ошибка CSV: {exc}')
+        finally:
+            if stream is not sys.stdin:
+                stream.close()
+            if rejects:
+                rejects.close()
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Готово: прочитано {stats.read}, загружено {stats.loaded}, '
+            f'отклонено {stats.rejected} за {stats.elapsed:.1f} с '
+            f'({stats.rate:,.0f} строк/с). Новых марок: {stats.brands_created}, '
+            f'моделей: {stats.models_created}.'
+        ))
@@ -0,0 +1,65 @@
+from django.core.files import File
+from django.core.management.base import BaseCommand
+from catalog import changes, db, fragments, images, stamps
+from catalog.models import Car
+from catalog.storage import hashed_name
+
+
+class Command(BaseCommand):
+    help = ('Перенести уже загруженные фото авто на имена по содержимому (cars/<sha256>.jpg): '
+            'одинаковые файлы сливаются в один, превью пересоздаются; --gc — удалить файлы без ссылок')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--gc', action='store_true',
+                            help='После переноса удалить файлы в cars/, на которые не ссылается ни одно авто')
+        parser.add_argument('--dry-run', action='store_true', help='Только показать, что будет сделано')
+
+    def handle(self, *args, **options):
+        dry_run = options['dry_run']
+        storage = images.image_storage()
+        names = (Car.objects.exclude(image='').exclude(image__isnull=True)
+                 .values_list('image', flat=True).distinct())
+        moved, targets = 0, set()
+        for name in list(names):
+            if not storage.exists(name):
+                self.stderr.write(f'Нет файла: {name}')
+                continue
+            if dry_run:
+                with storage.open(name, 'rb') as fh:
+                    new = hashed_name(name, File(fh, name))
+                if new != name:
+                    targets.add(new)
+                    moved += 1
+                    self.stdout.write(f'{name} -> {new}')
+                continue
+            cars = Car.objects.filter(image=name)
+            # Файл и ссылка на него — под одной блокировкой записи, чтобы
+            # images.release() не удалил файл между ними (см. catalog/images.py)
+            with db.write_locked():
+                with storage.open(name, 'rb') as fh:
+                    new = storage.save(name, File(fh, name))
+                if new == name:
+                    continue
+                old_variants = cars.values_list('image_variants', flat=True).first()
+                ids = list(cars.values_list('id', flat=True))
+                # update() в обход сигналов: фото то же, поменялось только имя файла
+                cars.update(image=new, image_variants={})
+                changes.record_many('car', ids)
+            targets.add(new)
+            moved += 1
+            self.stdout.write(f'{name} -> {new}')
+            images.release(name, old_variants)
+            for pk in ids:
+                images.process_car(pk)
+            fragments.bump_cars(ids)
+            stamps.bump_cars(ids)
+        self.stdout.write(self.style.SUCCESS(
+            f'Перенесено файлов: {moved}, уникальных после переноса: {len(targets)}.'
+        ))
+        if options['gc']:
+            garbage = images.collect_garbage(dry_run=dry_run)
+            for name in garbage:
+                self.stdout.write(f'без ссылок: {name}')
+            self.stdout.write(self.style.SUCCESS(
+                f'{"Будет удалено" if dry_run else "Удалено"} файлов без ссылок: {len(garbage)}.'
+            ))
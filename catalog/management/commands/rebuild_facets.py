@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from catalog import facets
+
+
+class Command(BaseCommand):
+    help = 'Пересчитать счётчики фасетов фильтра (CarFacet) по таблице Car'
+
+    def handle(self, *args, **options):
+        cells = facets.rebuild()
+        self.stdout.write(self.style.SUCCESS(f'Готово: {cells} ячеек фасетов.'))
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from catalog import pricestats
+
+
+class Command(BaseCommand):
+    help = 'Пересчитать статистику цен и годов (CarPriceStat) по таблице Car'
+
+    def handle(self, *args, **options):
+        cells = pricestats.rebuild()
+        self.stdout.write(self.style.SUCCESS(f'Готово: {cells} ячеек статистики цен.'))
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from catalog import search
+
+
+class Command(BaseCommand):
+    help = 'Перезалить полнотекстовый индекс (FTS5) по марке, модели и описанию'
+
+    def handle(self, *args, **options):
+        if not search.fts_available():
+            self.stdout.write(self.style.WARNING('FTS5 доступен только на SQLite — пропускаем.'))
+            return
+        rows = search.rebuild()
+        self.stdout.write(self.style.SUCCESS(f'Готово: {rows} записей в индексе.'))
@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+
+from catalog import favorites
+
+
+class Command(BaseCommand):
+    help = 'Пересчитать счётчики избранного (FavoriteCount) по таблице Favorite'
+
+    def add_arguments(self, parser):
+        parser.add_argument('user_ids', nargs='*', type=int,
+                            help='id пользователей (по умолчанию — все)')
+
+    def handle(self, *args, **options):
+        fixed = favorites.repair(options['user_ids'] or None)
+        self.stdout.write(self.style.SUCCESS(f'Готово: исправлено счётчиков — {fixed}.'))
@@ -0,0 +1,283 @@
+"""
+Замеры на каждый запрос: SQL, шаблоны, контекст-процессоры.
+
+RequestMetricsMiddleware (catalog/middleware.py) заводит на запрос объект
+RequestStats в contextvar — он виден и в потоках sync_to_async, — а обёртка
+execute на каждом соединении с БД (см. install()) считает запросы и их время.
+Итог уходит в заголовок Server-Timing (кроме потоковых ответов — их тело
+ещё не сформировано) и в гистограммы по представлениям, которые отдаёт
+metrics_view (персоналу или по токену METRICS_TOKEN). Контекст-процессоры
+проекта замеряет timed_context_processors(), подключённый в settings.
+
+Запросы (в рамках HTTP-запроса) дольше SLOW_QUERY_MS пишутся в лог 'catalog.slow_sql' одной строкой
+JSON: нормализованный SQL (без литералов), время, представление и место
+вызова в нашем коде. Стек разбирается только для медленных запросов,
+поэтому на обычный запрос накладные расходы — пара вызовов perf_counter.
+"""
+import hmac
+import json
+import logging
+import re
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import lru_cache
+from pathlib import Path
+
+from django.conf import settings
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.http import Http404, JsonResponse
+from django.utils.module_loading import import_string
+
+from . import warmup
+
+logger = logging.getLogger('catalog.slow_sql')
+
+_current = ContextVar('catalog_request_stats', default=None)
+
+# Границы корзин гистограмм (последняя — всё, что больше)
+MS_BOUNDS = (5, 10, 25, 50, 100, 250, 500, 1000, 2500)
+QUERY_BOUNDS = (0, 1, 2, 5, 10, 20, 50, 100)
+
+
+class RequestStats:
+    __slots__ = ('started', 'queries', 'db', 'tpl', 'ctx', 'view')
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.queries = 0
+        self.db = 0.0
+        self.tpl = 0.0
+        self.ctx = 0.0
+        self.view = ''
+
+    @property
+    def total(self):
+        return time.perf_counter() - self.started
+
+    def server_timing(self, total):
+        parts = [
+            f'total;dur={total * 1000:.1f}',
+            f'db;dur={self.db * 1000:.1f};desc="SQL x{self.queries}"',
+        ]
+        if self.tpl:
+            # Время шаблона включает и запросы, сделанные при отрисовке
+            parts.append(f'tpl;dur={self.tpl * 1000:.1f}')
+        if self.ctx:
+            parts.append(f'ctx;dur={self.ctx * 1000:.1f};desc="context processors"')
+        if self.view:
+            parts.append(f'view;desc="{self.view}"')
+        return ', '.join(parts)
+
+
+def begin():
+    stats = RequestStats()
+    return stats, _current.set(stats)
+
+
+def end(token):
+    _current.reset(token)
+
+
+def current():
+    return _current.get()
+
+
+@contextmanager
+def timed(field):
+    """Добавить время блока к полю текущего запроса ('tpl', 'ctx')."""
+    stats = _current.get()
+    if stats is None:
+        yield
+        return
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        setattr(stats, field, getattr(stats, field) + time.perf_counter() - started)
+
+
+# ---------- SQL ----------
+_SPACES = re.compile(r'\s+')
+_IN_LIST = re.compile(r'\bIN \((?:\?, )*\?\)', re.IGNORECASE)
+_LITERALS = re.compile(r"'(?:[^']|'')*'|\b\d+(?:\.\d+)?\b")
+
+
+def normalize_sql(sql):
+    """SQL без литералов и длины IN-списков — чтобы одинаковые запросы группировались."""
+    sql = _LITERALS.sub('?', _SPACES.sub(' ', sql).strip()).replace('%s', '?')
+    return _IN_LIST.sub('IN (...)', sql)
+
+
+# Наши обёртки и точка входа — не место вызова
+_SKIP_FILES = (str(Path(__file__)), str(Path(__file__).with_name('middleware.py')),
+               str(Path(settings.BASE_DIR) / 'manage.py'))
+
+
+def _call_site():
+    """
+    Первый кадр стека в коде проекта (не Django, не обёртки замеров).
+    У async-представлений запрос к БД идёт в отдельном потоке — там
+    кадров проекта может не быть, тогда None.
+    """
+    root = str(Path(settings.BASE_DIR))
+    frame = sys._getframe(1)
+    while frame is not None:
+        filename = frame.f_code.co_filename
+        if (filename.startswith(root) and filename not in _SKIP_FILES
+                and 'site-packages' not in filename):
+            return f'{Path(filename).relative_to(root)}:{frame.f_lineno} in {frame.f_code.co_name}'
+        frame = frame.f_back
+    return None
+
+
+def _execute_wrapper(execute, sql, params, many, context):
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        elapsed = time.perf_counter() - started
+        stats = _current.get()
+        # Вне запроса (команды, shell) ничего не считаем и не пишем
+        if stats is not None:
+            stats.queries += 1
+            stats.db += elapsed
+        if stats is not None and elapsed * 1000 >= getattr(settings, 'SLOW_QUERY_MS', 100):
+            logger.warning(json.dumps({
+                'ms': round(elapsed * 1000, 2),
+                'sql': normalize_sql(sql),
+                'many': many,
+                'view': stats.view,
+                'where': _call_site(),
+                'db': context['connection'].alias,
+            }, ensure_ascii=False))
+
+
+def _install_wrapper(connection, **kwargs):
+    if _execute_wrapper not in connection.execute_wrappers:
+        connection.execute_wrappers.append(_execute_wrapper)
+
+
+def install():
+    """
+    Обёртка execute на всех соединениях (и новых, и уже открытых).
+    Вызывается из CatalogConfig.ready().
+    """
+    connection_created.connect(_install_wrapper, dispatch_uid='catalog.metrics')
+    for connection in connections.all(initialized_only=True):
+        _install_wrapper(connection)
+
+
+# ---------- Контекст-процессоры ----------
+@lru_cache(maxsize=None)
+def _processors(paths):
+    return tuple(import_string(path) for path in paths)
+
+
+def timed_context_processors(request):
+    """
+    Контекст-процессор, который вызывает процессоры из
+    settings.METRICS_CONTEXT_PROCESSORS и записывает их время в 'ctx'.
+    Ставится в TEMPLATES[...]['OPTIONS']['context_processors'] вместо них.
+    """
+    context = {}
+    with timed('ctx'):
+        for processor in _processors(tuple(getattr(settings, 'METRICS_CONTEXT_PROCESSORS', ()))):
+            context.update(processor(request))
+    return context
+
+
+# ---------- Гистограммы ----------
+class _Histogram:
+    __slots__ = ('bounds', 'counts', 'sum')
+
+    def __init__(self, bounds):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)
+        self.sum = 0.0
+
+    def observe(self, value):
+        for n, bound in enumerate(self.bounds):
+            if value <= bound:
+                self.counts[n] += 1
+                break
+        else:
+            self.counts[-1] += 1
+        self.sum += value
+
+    def as_dict(self):
+        labels = [str(b) for b in self.bounds] + ['+Inf']
+        return {'buckets': dict(zip(labels, self.counts)), 'sum': round(self.sum, 3)}
+
+
+class _ViewMetrics:
+    __slots__ = ('count', 'errors', 'total_ms', 'db_ms', 'tpl_ms', 'ctx_ms', 'queries')
+
+    def __init__(self):
+        self.count = 0
+        self.errors = 0
+        self.total_ms = _Histogram(MS_BOUNDS)
+        self.db_ms = _Histogram(MS_BOUNDS)
+        self.tpl_ms = _Histogram(MS_BOUNDS)
+        self.ctx_ms = _Histogram(MS_BOUNDS)
+        self.queries = _Histogram(QUERY_BOUNDS)
+
+
+_registry = {}
+_lock = threading.Lock()
+
+
+def record(stats, total, status):
+    """Учесть запрос в гистограммах его представления (в памяти процесса)."""
+    with _lock:
+        view = _registry.get(stats.view)
+        if view is None:
+            view = _registry[stats.view] = _ViewMetrics()
+        view.count += 1
+        view.errors += status >= 500
+        view.total_ms.observe(total * 1000)
+        view.db_ms.observe(stats.db * 1000)
+        view.tpl_ms.observe(stats.tpl * 1000)
+        view.ctx_ms.observe(stats.ctx * 1000)
+        view.queries.observe(stats.queries)
+
+
+def snapshot():
+    with _lock:
+        return {
+            name or '-': {
+                'count': view.count,
+                'errors': view.errors,
+                'total_ms': view.total_ms.as_dict(),
+                'db_ms': view.db_ms.as_dict(),
+                'tpl_ms': view.tpl_ms.as_dict(),
+                'ctx_ms': view.ctx_ms.as_dict(),
+                'queries': view.queries.as_dict(),
+            }
+            for name, view in sorted(_registry.items())
+        }
+
+
+def reset():
+    with _lock:
+        _registry.clear()
+
+
+def _allowed(request):
+    # Не по адресу клиента: за локальным прокси все запросы приходят с 127.0.0.1
+    token = getattr(settings, 'METRICS_TOKEN', '')
+    header = request.headers.get('Authorization', '')
+    if token and header.startswith('Bearer ') and hmac.compare_digest(header[7:].encode(), token.encode()):
+        return True
+    return request.user.is_authenticated and request.user.is_staff
+
+
+def metrics_view(request):
+    """Гистограммы этого процесса; только персоналу или с заголовком Authorization: Bearer <METRICS_TOKEN>."""
+    if not _allowed(request):
+        raise Http404
+    return JsonResponse({'views': snapshot(), 'boot': warmup.report()},
+                        json_dumps_params={'ensure_ascii': False})
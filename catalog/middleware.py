@@ -0,0 +1,99 @@
+"""
+Middleware проекта.
+"""
+import time
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from whitenoise.middleware import WhiteNoiseMiddleware
+
+from . import metrics
+
+
+class StaticFilesMiddleware(WhiteNoiseMiddleware):
+    """
+    WhiteNoise, который умеет работать и в async-цепочке.
+
+    Обычный WhiteNoiseMiddleware только синхронный: под ASGI Django из-за него
+    переводит в поток каждый запрос, и async-представления теряют смысл.
+    Здесь запрос к статике ищется в словаре файлов прямо в event loop,
+    а в поток уходит только отдача найденного файла.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response=None, *args, **kwargs):
+        super().__init__(get_response, *args, **kwargs)
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        return super().__call__(request)
+
+    async def __acall__(self, request):
+        if self.autorefresh:
+            static_file = await sync_to_async(self.find_file)(request.path_info)
+        else:
+            static_file = self.files.get(request.path_info)
+        if static_file is not None:
+            return await sync_to_async(self.serve)(static_file, request)
+        return await self.get_response(request)
+
+
+class RequestMetricsMiddleware:
+    """
+    Замеры запроса (catalog/metrics.py): число и время SQL, шаблон,
+    контекст-процессоры, имя представления — в заголовок Server-Timing
+    и в гистограммы для metrics/.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        stats, token = metrics.begin()
+        try:
+            response = self.get_response(request)
+        finally:
+            metrics.end(token)
+        return self._finish(response, stats)
+
+    async def __acall__(self, request):
+        stats, token = metrics.begin()
+        try:
+            response = await self.get_response(request)
+        finally:
+            metrics.end(token)
+        return self._finish(response, stats)
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        match = request.resolver_match
+        metrics.current().view = match.view_name if match else ''
+
+    def process_template_response(self, request, response):
+        # Шаблон отрисуется сразу после этого метода; конец — в post-render колбэке
+        stats = metrics.current()
+        if stats is not None:
+            started = time.perf_counter()
+
+            def rendered(response):
+                stats.tpl += time.perf_counter() - started
+            response.add_post_render_callback(rendered)
+        return response
+
+    @staticmethod
+    def _finish(response, stats):
+        total = stats.total
+        # Тело потокового ответа ещё не сформировано — его SQL и время в заголовок
+        # не попадут, а значит, и заголовка не нужно (в гистограмме — время до тела)
+        if not response.streaming:
+            response.headers['Server-Timing'] = stats.server_timing(total)
+        metrics.record(stats, total, response.status_code)
+        return response
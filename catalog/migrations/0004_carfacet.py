@@ -0,0 +1,41 @@
+# Generated by Django 4.2.26 on 2026-10-18 06:30
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def fill_facets(apps, schema_editor):
+    Car = apps.get_model('catalog', 'Car')
+    CarFacet = apps.get_model('catalog', 'CarFacet')
+    rows = (Car.objects.order_by()
+            .values('brand_id', 'model_id', 'engine_type', 'transmission', 'year')
+            .annotate(n=models.Count('id')))
+    CarFacet.objects.bulk_create(
+        [CarFacet(count=r.pop('n'), **r) for r in rows], batch_size=1000
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('catalog', '0003_car_sort_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CarFacet',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('engine_type', models.CharField(max_length=20)),
+                ('transmission', models.CharField(max_length=20)),
+                ('year', models.PositiveIntegerField()),
+                ('count', models.PositiveIntegerField(default=0)),
+                ('brand', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='catalog.brand')),
+                ('model', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='catalog.carmodel')),
+            ],
+            options={
+                'unique_together': {('brand', 'model', 'engine_type', 'transmission', 'year')},
+            },
+        ),
+        migrations.RunPython(fill_facets, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,38 @@
+from django.db import migrations
+
+FTS_TABLE = 'catalog_car_fts'
+
+
+def create_fts(apps, schema_editor):
+    # FTS5 есть только у SQLite; на других СУБД поиск работает через icontains.
+    # Синхронизация — сигналами (catalog/signals.py), а не триггерами:
+    # триггеры на catalog_car теряются, когда SQLite пересоздаёт таблицу в миграциях.
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    schema_editor.execute(
+        f"CREATE VIRTUAL TABLE {FTS_TABLE} USING fts5("
+        f"brand, model, description, tokenize='unicode61 remove_diacritics 2')"
+    )
+    schema_editor.execute(
+        f'INSERT INTO {FTS_TABLE}(rowid, brand, model, description) '
+        f'SELECT c.id, b.name, m.name, c.description FROM catalog_car c '
+        f'JOIN catalog_brand b ON b.id = c.brand_id '
+        f'JOIN catalog_carmodel m ON m.id = c.model_id'
+    )
+
+
+def drop_fts(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    schema_editor.execute(f'DROP TABLE IF EXISTS {FTS_TABLE}')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('catalog', '0004_carfacet'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_fts, drop_fts),
+    ]
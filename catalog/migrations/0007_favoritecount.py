@@ -0,0 +1,35 @@
+# Generated by Django 4.2.26 on 2026-10-18 06:39
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def fill_counts(apps, schema_editor):
+    Favorite = apps.get_model('catalog', 'Favorite')
+    FavoriteCount = apps.get_model('catalog', 'FavoriteCount')
+    rows = (Favorite.objects.order_by()
+            .values('user_id')
+            .annotate(n=models.Count('id')))
+    FavoriteCount.objects.bulk_create(
+        [FavoriteCount(user_id=r['user_id'], count=r['n']) for r in rows], batch_size=1000
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('catalog', '0006_car_image_variants'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='FavoriteCount',
+            fields=[
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='favorite_count', serialize=False, to=settings.AUTH_USER_MODEL)),
+                ('count', models.PositiveIntegerField(default=0)),
+            ],
+        ),
+        migrations.RunPython(fill_counts, migrations.RunPython.noop),
+    ]
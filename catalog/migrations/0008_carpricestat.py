@@ -0,0 +1,51 @@
+# Generated by Django 4.2.26 on 2026-10-18 06:59
+
+from django.db import migrations, models
+import django.db.models.deletion
+from django.db.models.functions import Cast
+
+# catalog.pricestats.PRICE_BUCKET на момент миграции
+PRICE_BUCKET = 250_000
+
+
+def fill_stats(apps, schema_editor):
+    Car = apps.get_model('catalog', 'Car')
+    CarPriceStat = apps.get_model('catalog', 'CarPriceStat')
+    rows = (Car.objects.order_by()
+            .annotate(price_bucket=Cast(models.F('price') / PRICE_BUCKET, models.IntegerField()))
+            .values('brand_id', 'model_id', 'engine_type', 'transmission', 'year', 'price_bucket')
+            .annotate(count=models.Count('id'), price_sum=models.Sum('price'),
+                      price_min=models.Min('price'), price_max=models.Max('price')))
+    CarPriceStat.objects.bulk_create(
+        [CarPriceStat(**r) for r in rows], batch_size=1000
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('catalog', '0007_favoritecount'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CarPriceStat',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('engine_type', models.CharField(max_length=20)),
+                ('transmission', models.CharField(max_length=20)),
+                ('year', models.PositiveIntegerField()),
+                ('price_bucket', models.PositiveIntegerField()),
+                ('count', models.PositiveIntegerField(default=0)),
+                ('price_sum', models.DecimalField(decimal_places=2, default=0, max_digits=16)),
+                ('price_min', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('price_max', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('brand', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='catalog.brand')),
+                ('model', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='catalog.carmodel')),
+            ],
+            options={
+                'unique_together': {('brand', 'model', 'engine_type', 'transmission', 'year', 'price_bucket')},
+            },
+        ),
+        migrations.RunPython(fill_stats, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 4.2.26 on 2026-10-18 07:15
+
+import catalog.storage
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('catalog', '0009_car_filter_sort_indexes'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='car',
+            name='image',
+            field=models.ImageField(blank=True, db_index=True, null=True, storage=catalog.storage.car_image_storage, upload_to='cars/', verbose_name='Фото'),
+        ),
+    ]
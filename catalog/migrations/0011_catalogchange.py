@@ -0,0 +1,41 @@
+# Generated by Django 4.2.26 on 2026-10-18 07:18
+
+from django.db import migrations, models
+from django.utils import timezone
+
+
+def seed_changes(apps, schema_editor):
+    # Всё, что уже есть в каталоге, — первые записи журнала: ?since=0 даёт полную копию
+    table = apps.get_model('catalog', 'CatalogChange')._meta.db_table
+    now = timezone.now()
+    for kind, model in (('brand', 'Brand'), ('model', 'CarModel'), ('car', 'Car')):
+        source = apps.get_model('catalog', model)._meta.db_table
+        schema_editor.execute(
+            f'INSERT INTO {table} (kind, object_id, deleted, created_at) '
+            f'SELECT %s, id, %s, %s FROM {source} ORDER BY id',
+            [kind, False, now],
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('catalog', '0010_car_image_content_hash'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CatalogChange',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('brand', 'Марка'), ('model', 'Модель'), ('car', 'Автомобиль')], max_length=10)),
+                ('object_id', models.BigIntegerField()),
+                ('deleted', models.BooleanField(default=False)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['kind', 'object_id', 'id'], name='change_object_idx')],
+            },
+        ),
+        migrations.RunPython(seed_changes, migrations.RunPython.noop),
+    ]
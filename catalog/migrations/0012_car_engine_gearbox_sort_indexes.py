@@ -0,0 +1,37 @@
+# Generated by Django 4.2.26 on 2026-10-18 07:56
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('catalog', '0011_catalogchange'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='car',
+            index=models.Index(fields=['engine_type', 'price', 'id'], name='car_engine_price_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='car',
+            index=models.Index(fields=['engine_type', 'year', 'id'], name='car_engine_year_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='car',
+            index=models.Index(fields=['engine_type', 'created_at', 'id'], name='car_engine_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='car',
+            index=models.Index(fields=['transmission', 'price', 'id'], name='car_gearbox_price_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='car',
+            index=models.Index(fields=['transmission', 'year', 'id'], name='car_gearbox_year_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='car',
+            index=models.Index(fields=['transmission', 'created_at', 'id'], name='car_gearbox_created_idx'),
+        ),
+    ]
@@ -1,8 +1,30 @@
-from django.db import models
+from django.db import models, router, transaction
 from django.core.exceptions import ValidationError
 from django.conf import settings
 
-class Brand(models.Model):
+from . import db
+from .storage import car_image_storage
+
+
+class AtomicSaveModel(models.Model):
+    """
+    save() в транзакции вместе с сигналами pre_save/post_save: запись в журнал
+    изменений (catalog/changes.py) фиксируется только вместе с самой строкой.
+    delete() и так атомарен вместе с post_delete.
+    Блокировка записи берётся в начале, до чтения в pre_save и до проверки
+    файла фото в хранилище (catalog/db.py, catalog/images.py).
+    """
+    class Meta:
+        abstract = True
+
+    def save(self, *args, **kwargs):
+        using = kwargs.get('using') or router.db_for_write(type(self), instance=self)
+        with transaction.atomic(using=using, savepoint=False):
+            db.lock(using)
+            super().save(*args, **kwargs)
+
+
+class Brand(AtomicSaveModel):
     name = models.CharField('Марка', max_length=100, unique=True)
     class Meta:
         verbose_name = 'Марка'
@@ -11,7 +33,7 @@ class Brand(models.Model):
     def __str__(self):
         return self.name
 
-class CarModel(models.Model):
+class CarModel(AtomicSaveModel):
     brand = models.ForeignKey(Brand, on_delete=models.CASCADE, related_name='models', verbose_name='Марка')
     name = models.CharField('Модель', max_length=100)
     class Meta:
@@ -22,7 +44,7 @@ class CarModel(models.Model):
     def __str__(self):
         return f'{self.brand} {self.name}'
 
-class Car(models.Model):
+class Car(AtomicSaveModel):
     ENGINE_CHOICES = [
         ('petrol', 'Бензин'),
         ('diesel', 'Дизель'),
@@ -41,13 +63,41 @@ class Car(models.Model):
     engine_type = models.CharField('Двигатель', max_length=20, choices=ENGINE_CHOICES)
     transmission = models.CharField('Коробка', max_length=20, choices=TRANSMISSION_CHOICES)
     price = models.DecimalField('Цена', max_digits=10, decimal_places=2)
-    image = models.ImageField('Фото', upload_to='cars/', blank=True, null=True)
+    # Имя файла — хеш содержимого, один файл на одинаковые фото (catalog/storage.py);
+    # индекс — для проверки, ссылается ли ещё кто-то на файл
+    image = models.ImageField('Фото', upload_to='cars/', storage=car_image_storage,
+                              blank=True, null=True, db_index=True)
+    # Уменьшенные копии фото для srcset (см. catalog/images.py)
+    image_variants = models.JSONField('Превью фото', default=dict, blank=True, editable=False)
     description = models.TextField('Описание', blank=True)
     created_at = models.DateTimeField('Создано', auto_now_add=True)
     class Meta:
         verbose_name = 'Автомобиль'
         verbose_name_plural = 'Автомобили'
         ordering = ['-created_at']
+        # Составные индексы под keyset-пагинацию: (ключ сортировки, id).
+        # SQLite читает индекс и в обратную сторону, так что '-price' тоже покрыт.
+        indexes = [
+            models.Index(fields=['price', 'id'], name='car_price_id_idx'),
+            models.Index(fields=['year', 'id'], name='car_year_id_idx'),
+            models.Index(fields=['created_at', 'id'], name='car_created_id_idx'),
+            # Те же сортировки внутри марки/модели: фильтр по FK — префикс индекса,
+            # без временной сортировки (проверка — check_query_plans)
+            models.Index(fields=['brand', 'price', 'id'], name='car_brand_price_idx'),
+            models.Index(fields=['brand', 'year', 'id'], name='car_brand_year_idx'),
+            models.Index(fields=['brand', 'created_at', 'id'], name='car_brand_created_idx'),
+            models.Index(fields=['model', 'price', 'id'], name='car_model_price_idx'),
+            models.Index(fields=['model', 'year', 'id'], name='car_model_year_idx'),
+            models.Index(fields=['model', 'created_at', 'id'], name='car_model_created_idx'),
+            # И внутри двигателя/коробки: редкое значение (электро) иначе ищется
+            # проходом всего индекса сортировки
+            models.Index(fields=['engine_type', 'price', 'id'], name='car_engine_price_idx'),
+            models.Index(fields=['engine_type', 'year', 'id'], name='car_engine_year_idx'),
+            models.Index(fields=['engine_type', 'created_at', 'id'], name='car_engine_created_idx'),
+            models.Index(fields=['transmission', 'price', 'id'], name='car_gearbox_price_idx'),
+            models.Index(fields=['transmission', 'year', 'id'], name='car_gearbox_year_idx'),
+            models.Index(fields=['transmission', 'created_at', 'id'], name='car_gearbox_created_idx'),
+        ]
     def __str__(self):
         return f'{self.brand} {self.model.name} ({self.year})'
     def clean(self):
@@ -72,3 +122,86 @@ class Favorite(models.Model):
         ordering = ['-created_at']
     def __str__(self):
         return f'{self.user} → {self.car}'
+
+
+class FavoriteCount(models.Model):
+    """
+    Сколько авто в избранном у пользователя — чтобы бейдж в шапке не делал
+    COUNT(*) на каждой странице. Поддерживается сигналами Favorite в той же
+    транзакции (см. catalog/favorites.py), пересчёт — repair_favorite_counts.
+    """
+    user = models.OneToOneField(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='favorite_count'
+    )
+    count = models.PositiveIntegerField(default=0)
+    def __str__(self):
+        return f'{self.user_id}: {self.count}'
+
+
+class CarFacet(models.Model):
+    """
+    Предрасчитанные счётчики для фасетов фильтра: сколько авто
+    в каждой комбинации (марка, модель, двигатель, коробка, год).
+    Поддерживается сигналами Car (см. catalog/signals.py), пересчёт — rebuild_facets.
+    """
+    brand = models.ForeignKey(Brand, on_delete=models.CASCADE, related_name='+')
+    model = models.ForeignKey(CarModel, on_delete=models.CASCADE, related_name='+')
+    engine_type = models.CharField(max_length=20)
+    transmission = models.CharField(max_length=20)
+    year = models.PositiveIntegerField()
+    count = models.PositiveIntegerField(default=0)
+    class Meta:
+        unique_together = ('brand', 'model', 'engine_type', 'transmission', 'year')
+    def __str__(self):
+        return f'{self.brand_id}/{self.model_id}/{self.engine_type}/{self.transmission}/{self.year}: {self.count}'
+
+
+class CarPriceStat(models.Model):
+    """
+    Предрасчитанная статистика цен: на каждую ячейку фасетов (марка, модель,
+    двигатель, коробка, год) и интервал цены — число авто, сумма, минимум
+    и максимум цены. Из неё собираются гистограммы цены/года и мин./ср./макс.
+    без прохода по Car (catalog/pricestats.py). Поддерживается сигналами Car,
+    пересчёт — rebuild_price_stats.
+    """
+    brand = models.ForeignKey(Brand, on_delete=models.CASCADE, related_name='+')
+    model = models.ForeignKey(CarModel, on_delete=models.CASCADE, related_name='+')
+    engine_type = models.CharField(max_length=20)
+    transmission = models.CharField(max_length=20)
+    year = models.PositiveIntegerField()
+    price_bucket = models.PositiveIntegerField()  # floor(price / PRICE_BUCKET)
+    count = models.PositiveIntegerField(default=0)
+    price_sum = models.DecimalField(max_digits=16, decimal_places=2, default=0)
+    price_min = models.DecimalField(max_digits=10, decimal_places=2)
+    price_max = models.DecimalField(max_digits=10, decimal_places=2)
+    class Meta:
+        unique_together = ('brand', 'model', 'engine_type', 'transmission', 'year', 'price_bucket')
+    def __str__(self):
+        return (f'{self.brand_id}/{self.model_id}/{self.engine_type}/{self.transmission}/'
+                f'{self.year}/{self.price_bucket}: {self.count}')
+
+
+class CatalogChange(models.Model):
+    """
+    Журнал изменений каталога (только добавление): какая марка, модель или авто
+    изменились или удалены. id — позиция в журнале и токен ?since= для
+    api/changes/. Пишется в той же транзакции, что и само изменение
+    (catalog/changes.py), сжатие — compact_changes.
+    """
+    KIND_CHOICES = [
+        ('brand', 'Марка'),
+        ('model', 'Модель'),
+        ('car', 'Автомобиль'),
+    ]
+    kind = models.CharField(max_length=10, choices=KIND_CHOICES)
+    object_id = models.BigIntegerField()
+    deleted = models.BooleanField(default=False)
+    created_at = models.DateTimeField(auto_now_add=True)
+    class Meta:
+        # Сжатие ищет более позднюю запись того же объекта
+        indexes = [models.Index(fields=['kind', 'object_id', 'id'], name='change_object_idx')]
+    def __str__(self):
+        return f'{self.pk}: {self.kind} {self.object_id}{" удалено" if self.deleted else ""}'
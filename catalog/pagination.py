@@ -0,0 +1,204 @@
+"""
+Keyset (cursor) пагинация для каталога.
+
+Вместо OFFSET запоминаем последнюю показанную пару (ключ сортировки, id)
+и просим у БД «следующие N строк после неё». Такой запрос идёт по
+составному индексу (см. Car.Meta.indexes) и стоит одинаково для первой
+и для сотой страницы, без COUNT(*).
+"""
+import base64
+import json
+
+from django.core.exceptions import ValidationError
+from django.core.paginator import EmptyPage, PageNotAnInteger, Paginator
+from django.db.models import Q
+
+from .models import Car
+
+# Допустимые сортировки списка и сортировка по умолчанию
+ALLOWED_SORTS = ('price', '-price', 'year', '-year', '-created_at')
+DEFAULT_SORT = '-created_at'
+
+
+def normalize_sort(value):
+    return value if value in ALLOWED_SORTS else DEFAULT_SORT
+
+
+def ordering_for(sort):
+    """'-price' -> ('-price', '-id'): id нужен для однозначного порядка."""
+    return (sort, '-id') if sort.startswith('-') else (sort, 'id')
+
+
+def _sort_value(obj, field):
+    # obj — экземпляр Car или строка .values() (API)
+    value = obj[field] if isinstance(obj, dict) else getattr(obj, field)
+    if hasattr(value, 'isoformat'):
+        return value.isoformat()
+    if not isinstance(value, int):
+        return str(value)  # Decimal -> '1500000.00'
+    return value
+
+
+def encode_cursor(sort, obj, direction='next'):
+    field = sort.lstrip('-')
+    pk = obj['id'] if isinstance(obj, dict) else obj.pk
+    raw = json.dumps([sort, direction, _sort_value(obj, field), pk],
+                     separators=(',', ':'))
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+
+def decode_cursor(token, sort):
+    """
+    Возвращает (direction, value, pk) или None, если токен битый
+    или выписан для другой сортировки. value приводится к типу поля
+    сортировки: подделанное значение не должно дойти до ORM.
+    """
+    try:
+        padded = token + '=' * (-len(token) % 4)
+        token_sort, direction, value, pk = json.loads(base64.urlsafe_b64decode(padded))
+    except (ValueError, TypeError):
+        return None
+    if token_sort != sort or direction not in ('next', 'prev') or not isinstance(pk, int):
+        return None
+    if isinstance(value, bool):
+        return None
+    try:
+        value = Car._meta.get_field(sort.lstrip('-')).to_python(value)
+    except (ValidationError, ValueError, TypeError):
+        return None
+    if value is None:
+        return None
+    return direction, value, pk
+
+
+class CursorPage:
+    """Страница keyset-пагинации (аналог django.core.paginator.Page без номеров)."""
+    paginator = None
+    number = None
+
+    def __init__(self, object_list, sort, has_next, has_previous):
+        self.object_list = object_list
+        self.sort = sort
+        self._has_next = has_next
+        self._has_previous = has_previous
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def has_next(self):
+        return self._has_next
+
+    def has_previous(self):
+        return self._has_previous
+
+    def has_other_pages(self):
+        return self._has_next or self._has_previous
+
+    @property
+    def next_cursor(self):
+        if self._has_next and self.object_list:
+            return encode_cursor(self.sort, self.object_list[-1], 'next')
+        return ''
+
+    @property
+    def previous_cursor(self):
+        if self._has_previous and self.object_list:
+            return encode_cursor(self.sort, self.object_list[0], 'prev')
+        return ''
+
+
+def seek(queryset, sort, direction, value, pk):
+    """
+    queryset после (или до) позиции (value, pk) в порядке обхода:
+    для 'prev' — в обратном, список потом надо развернуть.
+
+    Одного OR (field > v OR field = v AND id > pk) SQLite не может
+    сузить по индексу и читает его с начала; нестрогая граница
+    field >= v перед ним даёт SEARCH ... USING INDEX (field>?).
+    """
+    field = sort.lstrip('-')
+    descending = sort.startswith('-')
+    forward = descending if direction == 'next' else not descending
+    op = 'lt' if forward else 'gt'
+    queryset = queryset.filter(
+        Q(**{f'{field}__{op}e': value}),
+        Q(**{f'{field}__{op}': value}) | Q(**{field: value, f'pk__{op}': pk}),
+    )
+    ordering = ordering_for(sort)
+    if direction == 'prev':
+        ordering = tuple(o[1:] if o.startswith('-') else f'-{o}' for o in ordering)
+    return queryset.order_by(*ordering)
+
+
+def keyset_page(queryset, sort, token, per_page):
+    """
+    Страница после (или до) позиции из курсора.
+    queryset уже отфильтрован; порядок задаём здесь сами.
+    Возвращает None, если курсор не подходит — тогда работает обычная пагинация.
+    """
+    decoded = decode_cursor(token, sort)
+    if decoded is None:
+        return None
+    direction = decoded[0]
+    rows = list(seek(queryset, sort, *decoded)[:per_page + 1])
+    has_more = len(rows) > per_page
+    rows = rows[:per_page]
+    if direction == 'prev':
+        rows.reverse()
+        return CursorPage(rows, sort, has_next=True, has_previous=has_more)
+    return CursorPage(rows, sort, has_next=has_more, has_previous=True)
+
+
+# ---------- Ограниченный COUNT ----------
+class AtLeast(int):
+    """Нижняя граница вместо точного числа; в шаблоне выводится как «10000+»."""
+    def __str__(self):
+        return f'{int(self)}+'
+
+
+def capped_count(queryset, cap):
+    """
+    COUNT(*) не дальше cap + 1 строки: SELECT COUNT(*) FROM (... LIMIT cap + 1).
+    На больших выборках SQLite не обходит всю таблицу; сверх cap — AtLeast(cap).
+    """
+    n = queryset.order_by()[:cap + 1].count()
+    return AtLeast(cap) if n > cap else n
+
+
+class KnownCountPaginator(Paginator):
+    """
+    Число строк — из денормализованного счётчика, без COUNT(*). Страница
+    читается с одной лишней строкой, и если счётчик разошёлся с таблицей,
+    число строк поправляется по выборке — список не обрезается; on_mismatch()
+    зовётся, чтобы починить сам счётчик.
+    """
+    def __init__(self, object_list, per_page, count, on_mismatch=None, **kwargs):
+        super().__init__(object_list, per_page, **kwargs)
+        self.__dict__['count'] = count  # перекрывает cached_property Paginator.count
+        self.on_mismatch = on_mismatch
+
+    def page(self, number):
+        try:
+            number = int(number)
+        except (TypeError, ValueError):
+            raise PageNotAnInteger('Номер страницы должен быть числом')
+        if number < 1:
+            raise EmptyPage('Номер страницы меньше 1')
+        bottom = (number - 1) * self.per_page
+        rows = list(self.object_list[bottom:bottom + self.per_page + 1])
+        if not rows and number > 1:
+            raise EmptyPage('На этой странице нет результатов')
+        if len(rows) > self.per_page:
+            # Дальше есть строки: счётчик не может быть меньше
+            count = max(self.count, bottom + len(rows))
+        else:
+            count = bottom + len(rows)  # последняя страница — число точное
+        if count != self.count:
+            self.__dict__['count'] = count
+            self.__dict__.pop('num_pages', None)
+            if self.on_mismatch:
+                self.on_mismatch()
+        return self._get_page(rows[:self.per_page], number, self)
@@ -0,0 +1,264 @@
+"""
+Статистика цен и годов для слайдеров сайдбара и страницы авто.
+
+Считаем не по таблице Car, а по предрасчитанной CarPriceStat: одна строка на
+ячейку фасетов (марка, модель, двигатель, коробка, год) и интервал цены
+шириной PRICE_BUCKET, в строке — число авто, сумма, минимум и максимум цены.
+Строки правятся инкрементально при сохранении/удалении Car (как CarFacet,
+см. catalog/facets.py), а гистограммы и мин./ср./макс. для любого набора
+фильтров CarFilter — GROUP BY по маленькой таблице.
+
+С фильтром по цене интервалы внутри него берутся из CarPriceStat, а авто
+двух крайних интервалов, разрезанных границами, — из Car (price_sources(),
+так же считает и catalog/facets.py), поэтому ответ точный. Для ?q=
+полнотекстового индекса в CarPriceStat нет — тогда честно считаем по Car.
+PRICE_BUCKET меняется только вместе с rebuild_price_stats.
+"""
+from contextlib import contextmanager
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import Count, F, IntegerField, Max, Min, Q, Sum
+from django.db.models.functions import Cast, Greatest, Least
+
+from . import search
+from .facets import KEY_FIELDS
+from .models import Car, CarPriceStat
+
+PRICE_BUCKET = 250_000
+CENT = Decimal('0.01')
+
+
+def bucket_of(price):
+    return int(price // PRICE_BUCKET)
+
+
+def stat_key(car):
+    """(ячейка фасетов..., цена) — что нужно, чтобы убрать авто из статистики."""
+    return tuple(getattr(car, f) for f in KEY_FIELDS) + (car.price,)
+
+
+# ---------- Инкрементальное обновление ----------
+def _group(keys):
+    """{(ячейка фасетов..., интервал): [n, сумма, мин., макс.]} по ключам stat_key()."""
+    cells = {}
+    for *facet, price in keys:
+        cell = cells.setdefault((*facet, bucket_of(price)), [0, Decimal(0), price, price])
+        cell[0] += 1
+        cell[1] += price
+        cell[2] = min(cell[2], price)
+        cell[3] = max(cell[3], price)
+    return cells
+
+
+def _lookup(cell):
+    *facet, bucket = cell
+    return dict(zip(KEY_FIELDS, facet), price_bucket=bucket)
+
+
+def _add(cells):
+    for cell, (n, total, lo, hi) in cells.items():
+        lookup = _lookup(cell)
+        updated = CarPriceStat.objects.filter(**lookup).update(
+            count=F('count') + n,
+            price_sum=F('price_sum') + total,
+            price_min=Least('price_min', lo),
+            price_max=Greatest('price_max', hi),
+        )
+        if not updated:
+            CarPriceStat.objects.create(count=n, price_sum=total, price_min=lo,
+                                        price_max=hi, **lookup)
+
+
+def _remove(cells):
+    """Вычесть авто из ячеек. Возвращает ячейки, из которых ушёл минимум или максимум."""
+    stale = []
+    for cell, (n, total, lo, hi) in cells.items():
+        stat = CarPriceStat.objects.filter(**_lookup(cell))
+        stat.update(count=F('count') - n, price_sum=F('price_sum') - total)
+        stat.filter(count__lte=0).delete()
+        bounds = stat.values('price_min', 'price_max').first()
+        if bounds and (lo <= bounds['price_min'] or hi >= bounds['price_max']):
+            stale.append(cell)
+    return stale
+
+
+def _refresh_bounds(cells):
+    # Минимум/максимум ячейки берём заново по её авто в Car
+    for cell in cells:
+        lookup = _lookup(cell)
+        bucket = lookup['price_bucket']
+        cars = Car.objects.filter(
+            **{f: lookup[f] for f in KEY_FIELDS},
+            price__gte=bucket * PRICE_BUCKET, price__lt=(bucket + 1) * PRICE_BUCKET,
+        ).aggregate(lo=Min('price'), hi=Max('price'))
+        if cars['lo'] is not None:
+            CarPriceStat.objects.filter(**lookup).update(price_min=cars['lo'], price_max=cars['hi'])
+
+
+def apply_change(old_key=None, new_key=None):
+    """Перенести авто из одной ячейки в другую (None — нет ячейки)."""
+    if old_key == new_key:
+        return
+    with transaction.atomic():
+        if old_key is not None:
+            _refresh_bounds(_remove(_group([old_key])))
+        if new_key is not None:
+            _add(_group([new_key]))
+
+
+def _keys(pks):
+    return Car.objects.filter(pk__in=pks).values_list(*KEY_FIELDS, 'price')
+
+
+@contextmanager
+def updating(pks):
+    """
+    Для UPDATE авто pks в обход save() (массовые действия админки): до него
+    их ячейки вычитаются, после — прибавляются заново, одной транзакцией
+    и по запросу-двум на ячейку, без rebuild().
+    """
+    with transaction.atomic():
+        stale = _remove(_group(_keys(pks)))
+        yield
+        _add(_group(_keys(pks)))
+        _refresh_bounds(stale)
+
+
+def rebuild():
+    """Полный пересчёт CarPriceStat по таблице Car. Возвращает число ячеек."""
+    rows = (Car.objects.order_by()
+            .annotate(price_bucket=Cast(F('price') / PRICE_BUCKET, IntegerField()))
+            .values(*KEY_FIELDS, 'price_bucket')
+            .annotate(count=Count('id'), price_sum=Sum('price'),
+                      price_min=Min('price'), price_max=Max('price')))
+    with transaction.atomic():
+        CarPriceStat.objects.all().delete()
+        CarPriceStat.objects.bulk_create(
+            [CarPriceStat(**r) for r in rows], batch_size=1000
+        )
+    return CarPriceStat.objects.count()
+
+
+# ---------- Чтение ----------
+STAT_AGGREGATES = {'n': Sum('count'), 'total': Sum('price_sum'), 'lo': Min('price_min'), 'hi': Max('price_max')}
+CAR_AGGREGATES = {'n': Count('id'), 'total': Sum('price'), 'lo': Min('price'), 'hi': Max('price')}
+
+
+def _lookups(cd, exclude=()):
+    """Фильтры из cleaned_data CarFilter, кроме exclude ('price', 'year'); цена — точная."""
+    q = {}
+    for name in ('brand', 'model', 'engine_type', 'transmission'):
+        if cd.get(name):
+            q[name] = cd[name]
+    for name in ('year', 'price'):
+        if name in exclude:
+            continue
+        if cd.get(f'{name}_min') is not None:
+            q[f'{name}__gte'] = cd[f'{name}_min']
+        if cd.get(f'{name}_max') is not None:
+            q[f'{name}__lte'] = cd[f'{name}_max']
+    return q
+
+
+def _summary(n, total, lo, hi):
+    n = n or 0
+    return {'count': n, 'min': lo, 'avg': round(total / n, 2) if n else None, 'max': hi}
+
+
+def _sources(cd):
+    """
+    [(queryset, агрегаты)] — откуда считать с учётом фильтра по цене: для ?q=
+    — Car через поисковый индекс; с ценой — ячейки внутри фильтра и авто
+    крайних интервалов (price_sources()); иначе — CarPriceStat целиком.
+    Цена уже применена — дальше фильтровать только по остальному.
+    """
+    if cd.get('q'):
+        price = {'price_min': cd.get('price_min'), 'price_max': cd.get('price_max')}
+        return [(search.apply(Car.objects.order_by(), cd['q']).filter(**_lookups(price, ('year',))),
+                 CAR_AGGREGATES)]
+    if cd.get('price_min') is None and cd.get('price_max') is None:
+        return [(CarPriceStat.objects.order_by(), STAT_AGGREGATES)]
+    stats, edge_cars = price_sources(cd)
+    sources = [(stats, STAT_AGGREGATES)]
+    if edge_cars is not None:
+        sources.append((edge_cars, CAR_AGGREGATES))
+    return sources
+
+
+def histograms(filterset):
+    """
+    {'count', 'min', 'avg', 'max', 'approximate', 'bucket',
+     'price': [(начало интервала, n), ...], 'year': [(год, n), ...]}.
+    Гистограмма цены учитывает все фильтры, кроме цены, гистограмма года —
+    все, кроме года (чтобы слайдер показывал, что будет при его сдвиге).
+    Число и мин./ср./макс. — точные и при фильтре по цене: интервалы,
+    разрезанные его границами, считаются по Car ('approximate' всегда False,
+    ключ оставлен для клиентов API).
+    """
+    cd = filterset.form.cleaned_data if filterset.is_valid() else {}
+    sources = _sources(cd)
+    n, total, lo, hi = 0, Decimal(0), None, None
+    years = {}
+    for source, aggregates in sources:
+        part = source.filter(**_lookups(cd, ('price',))).aggregate(**aggregates)
+        if part['n']:
+            n += part['n']
+            total += part['total']
+            lo = part['lo'] if lo is None else min(lo, part['lo'])
+            hi = part['hi'] if hi is None else max(hi, part['hi'])
+        for year, count in (source.filter(**_lookups(cd, ('price', 'year')))
+                            .values_list('year').annotate(n=aggregates['n']).order_by()):
+            years[year] = years.get(year, 0) + count
+    result = _summary(n, total, lo, hi)
+    result['approximate'] = False
+    result['bucket'] = PRICE_BUCKET
+
+    # Гистограмма цены — без фильтра по цене: из CarPriceStat или, для ?q=, из Car
+    if cd.get('q'):
+        source = search.apply(Car.objects.order_by(), cd['q']).annotate(
+            price_bucket=Cast(F('price') / PRICE_BUCKET, IntegerField()))
+        count = Count('id')
+    else:
+        source, count = CarPriceStat.objects.order_by(), Sum('count')
+    result['price'] = [
+        (bucket * PRICE_BUCKET, n) for bucket, n in
+        source.filter(**_lookups(cd, ('price',)))
+        .values_list('price_bucket').annotate(n=count).order_by('price_bucket')
+    ]
+    result['year'] = sorted(years.items())
+    return result
+
+
+def price_sources(cd):
+    """
+    Для счётчиков фасетов при фильтре по цене (catalog/facets.py): ячейки
+    CarPriceStat, чьи интервалы целиком внутри [price_min, price_max], и авто
+    Car только из крайних интервалов, разрезанных границами фильтра (None —
+    границы кратны PRICE_BUCKET). Вместе — точный ответ без прохода по всей Car.
+    """
+    lo, hi = cd.get('price_min'), cd.get('price_max')
+    stats = CarPriceStat.objects.order_by()
+    cars = Car.objects.order_by()
+    edges = Q()
+    if lo is not None:
+        cars = cars.filter(price__gte=lo)
+        if lo % PRICE_BUCKET:
+            stats = stats.filter(price_bucket__gt=bucket_of(lo))
+            edges |= Q(price__lt=(bucket_of(lo) + 1) * PRICE_BUCKET)
+        else:
+            stats = stats.filter(price_bucket__gte=bucket_of(lo))
+    if hi is not None:
+        cars = cars.filter(price__lte=hi)
+        if (hi + CENT) % PRICE_BUCKET:
+            stats = stats.filter(price_bucket__lt=bucket_of(hi))
+            edges |= Q(price__gte=bucket_of(hi) * PRICE_BUCKET)
+        else:
+            stats = stats.filter(price_bucket__lte=bucket_of(hi))
+    return stats, (cars.filter(edges) if edges else None)
+
+
+def summary(**lookup):
+    """Мин./ср./макс. цены и число авто, например summary(model=5) или summary(brand=2)."""
+    return _summary(**CarPriceStat.objects.filter(**lookup).aggregate(
+        n=Sum('count'), total=Sum('price_sum'), lo=Min('price_min'), hi=Max('price_max')))
@@ -0,0 +1,138 @@
+"""
+Проверка планов запросов списка каталога.
+
+Перебираем все сочетания фильтров CarFilter (марка, модель, диапазоны года
+и цены, двигатель, коробка) со всеми сортировками, строим тот же queryset,
+что и CarListView, — первую страницу и keyset-страницу по курсору — и
+смотрим EXPLAIN QUERY PLAN. Плохим считается план, в котором есть:
+  - SCAN catalog_car без индекса — проход всей таблицы;
+  - USE TEMP B-TREE — сортировка во временном дереве: прежде чем отдать
+    первые 9 строк, SQLite читает и сортирует все подходящие;
+  - SCAN catalog_car USING [COVERING] INDEX у запроса с условием: проход
+    индекса сортировки с проверкой строк — при редком значении фильтра это
+    почти весь индекс. Такое допустимо только без фильтров (с LIMIT проход
+    останавливается на первой странице);
+  - для страницы по курсору — любой шаг по catalog_car, кроме SEARCH: у
+    seek() есть граница по полю сортировки, и поиск должен начинаться с неё.
+Исключение — диапазон по полю, отличному от поля сортировки (год при
+сортировке по цене): он проверяется построчно (+year, см. CarFilter), потому
+что индекса, который и сужал бы диапазон, и давал бы порядок, нет, а сортировка
+всего диапазона хуже. Первая страница с одними такими условиями идёт проходом
+индекса сортировки; с любым другим фильтром — SEARCH по составному индексу.
+
+Поиск (?q=) сюда не входит: его план определяет FTS5 (catalog/search.py).
+Используется командой check_query_plans и в тестах (QueryPlanAssertions).
+"""
+import itertools
+import re
+
+from django.db import connections
+from django.test import RequestFactory
+
+from .filters import RANGE_FIELDS
+from .models import Car
+from .pagination import ALLOWED_SORTS, seek
+
+TABLE = Car._meta.db_table
+BAD_PLAN = (
+    re.compile(rf'^SCAN {TABLE}$'),
+    re.compile(r'TEMP B-TREE'),
+)
+# Проход индекса в порядке сортировки — плохой, если у запроса есть WHERE
+FILTERED_SCAN = re.compile(rf'^SCAN {TABLE} USING (COVERING )?INDEX')
+SEARCH = re.compile(rf'^SEARCH {TABLE} USING (COVERING )?INDEX')
+
+
+def filter_values(car):
+    """Значения каждого фильтра по образцу car (валидные для формы CarFilter)."""
+    price = int(car.price)
+    return {
+        'brand': {'brand': car.brand_id},
+        'model': {'model': car.model_id},
+        'year': {'year_min': car.year - 2, 'year_max': car.year + 2},
+        'price': {'price_min': price // 2, 'price_max': price * 2},
+        'engine_type': {'engine_type': car.engine_type},
+        'transmission': {'transmission': car.transmission},
+    }
+
+
+def combinations(car):
+    """(имена фильтров, сортировка, GET-параметры) — все сочетания."""
+    values = filter_values(car)
+    for size in range(len(values) + 1):
+        for names in itertools.combinations(values, size):
+            for sort in ALLOWED_SORTS:
+                data = {'sort': sort}
+                for name in names:
+                    data.update(values[name])
+                yield names, sort, data
+
+
+def listing_queryset(data):
+    """Queryset списка авто, как его строит CarListView для GET-параметров data."""
+    from .views import CarListView
+
+    view = CarListView()
+    view.setup(RequestFactory().get('/', data))
+    filterset = view.get_filterset(view.get_filterset_class())
+    if not filterset.is_valid():
+        raise ValueError(f'Фильтры не прошли валидацию: {dict(filterset.errors)}')
+    return filterset.qs
+
+
+def explain(queryset):
+    """Строки detail из EXPLAIN QUERY PLAN."""
+    sql, params = queryset.query.sql_with_params()
+    with connections[queryset.db].cursor() as cursor:
+        cursor.execute('EXPLAIN QUERY PLAN ' + sql, params)
+        return [row[-1] for row in cursor.fetchall()]
+
+
+def bad_steps(plan, filtered=False, cursor=False):
+    """
+    Плохие шаги плана. filtered — у запроса есть условие, которое мог бы
+    взять индекс; cursor — страница по курсору: catalog_car только через SEARCH.
+    """
+    bad = [step for step in plan if any(p.search(step) for p in BAD_PLAN)
+           or (filtered or cursor) and FILTERED_SCAN.search(step)]
+    if cursor and not any(SEARCH.search(step) for step in plan):
+        bad += [step for step in plan if re.match(rf'^\w+ {TABLE}\b', step) and step not in bad]
+    return bad
+
+
+def check(car, per_page=9):
+    """
+    Проверить все сочетания. Возвращает (число проверенных запросов, проблемы);
+    проблема — dict(filters, sort, page, plan).
+    """
+    checked, problems = 0, []
+    for names, sort, data in combinations(car):
+        qs = listing_queryset(data)
+        field = sort.lstrip('-')
+        # Диапазоны по другим полям проверяются построчно — для индекса это не условие
+        filtered = any(name not in RANGE_FIELDS or name == field for name in names)
+        pages = {
+            'first': qs[:per_page],
+            'cursor': seek(qs, sort, 'next', getattr(car, field), car.pk)[:per_page],
+        }
+        for page, queryset in pages.items():
+            checked += 1
+            plan = explain(queryset)
+            if bad_steps(plan, filtered=filtered, cursor=page == 'cursor'):
+                problems.append({'filters': names, 'sort': sort, 'page': page, 'plan': plan})
+    return checked, problems
+
+
+def format_problem(problem):
+    filters = ', '.join(problem['filters']) or 'без фильтров'
+    return f"[{filters}] sort={problem['sort']} ({problem['page']}): " + '; '.join(problem['plan'])
+
+
+class QueryPlanAssertions:
+    """Примесь к TestCase: assertListingPlansIndexed(car) падает на первом же плохом плане."""
+
+    def assertListingPlansIndexed(self, car):
+        checked, problems = check(car)
+        if problems:
+            self.fail(f'{len(problems)} из {checked} запросов без индекса:\n'
+                      + '\n'.join(format_problem(p) for p in problems))
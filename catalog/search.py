@@ -0,0 +1,112 @@
+"""
+Полнотекстовый поиск по марке, модели и описанию авто.
+
+На SQLite используется виртуальная таблица FTS5 catalog_car_fts
+(rowid = catalog_car.id). Её содержимое поддерживают сигналы Car, Brand
+и CarModel (catalog/signals.py); массовые операции в обход save()
+вызывают index_cars() сами. На других СУБД — запасной icontains.
+"""
+import re
+
+from django.db import connection
+from django.db.models import Q
+from django.db.models.expressions import RawSQL
+
+FTS_TABLE = 'catalog_car_fts'
+# Веса колонок для bm25: совпадение в марке/модели важнее, чем в описании
+BM25_WEIGHTS = (10.0, 10.0, 1.0)
+
+_WORD_RE = re.compile(r'\w+', re.UNICODE)
+
+POPULATE_SQL = f'''
+INSERT INTO {FTS_TABLE}(rowid, brand, model, description)
+SELECT c.id, b.name, m.name, c.description
+FROM catalog_car c
+JOIN catalog_brand b ON b.id = c.brand_id
+JOIN catalog_carmodel m ON m.id = c.model_id
+'''
+# Сколько id подставлять в один IN (...) — лимит переменных SQLite
+CHUNK = 500
+
+
+def fts_available():
+    return connection.vendor == 'sqlite'
+
+
+def to_match_query(text):
+    """
+    'Тойота  кам' -> '"Тойота"* "кам"*'
+    Пользовательский ввод не попадает в синтаксис MATCH напрямую:
+    берём только слова, каждое — префиксный поиск, все слова обязательны.
+    """
+    words = _WORD_RE.findall(text or '')
+    return ' '.join(f'"{w}"*' for w in words)
+
+
+def apply(queryset, text):
+    """
+    Оставляет в queryset только найденные авто и добавляет аннотацию
+    search_rank (меньше — релевантнее). Порядок не меняет.
+    """
+    match = to_match_query(text)
+    if not match:
+        return queryset
+    if not fts_available():
+        cond = Q()
+        for word in _WORD_RE.findall(text):
+            cond &= (Q(brand__name__icontains=word) | Q(model__name__icontains=word)
+                     | Q(description__icontains=word))
+        return queryset.filter(cond)
+    table = queryset.model._meta.db_table
+    weights = ', '.join(str(w) for w in BM25_WEIGHTS)
+    return (queryset
+            .filter(id__in=RawSQL(
+                f'SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s', [match]))
+            .annotate(search_rank=RawSQL(
+                f'SELECT bm25({FTS_TABLE}, {weights}) FROM {FTS_TABLE} '
+                f'WHERE {FTS_TABLE} MATCH %s AND rowid = "{table}"."id"', [match])))
+
+
+# ---------- Поддержка индекса ----------
+def index_cars(ids):
+    """(Пере)индексировать авто с данными id."""
+    if not fts_available():
+        return
+    ids = list(ids)
+    with connection.cursor() as cursor:
+        for i in range(0, len(ids), CHUNK):
+            chunk = ids[i:i + CHUNK]
+            marks = ', '.join(['%s'] * len(chunk))
+            cursor.execute(f'DELETE FROM {FTS_TABLE} WHERE rowid IN ({marks})', chunk)
+            cursor.execute(f'{POPULATE_SQL} WHERE c.id IN ({marks})', chunk)
+
+
+def unindex_car(car_id):
+    if not fts_available():
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(f'DELETE FROM {FTS_TABLE} WHERE rowid = %s', [car_id])
+
+
+def rename(column, fk_column, obj_id, name):
+    """Марку/модель переименовали — правим её текст у всех её авто."""
+    if not fts_available():
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'UPDATE {FTS_TABLE} SET {column} = %s '
+            f'WHERE rowid IN (SELECT id FROM catalog_car WHERE {fk_column} = %s)',
+            [name, obj_id],
+        )
+
+
+def rebuild():
+    """Перезаливка индекса из таблиц каталога (если индекс рассинхронизирован)."""
+    if not fts_available():
+        return 0
+    with connection.cursor() as cursor:
+        cursor.execute(f'DELETE FROM {FTS_TABLE}')
+        cursor.execute(POPULATE_SQL)
+        cursor.execute(f'SELECT count(*) FROM {FTS_TABLE}')
+        return cursor.fetchone()[0]
+
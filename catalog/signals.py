@@ -0,0 +1,88 @@
+"""
+Обработчики сигналов моделей каталога: поддерживают в актуальном
+состоянии производные данные (журнал изменений, счётчики фасетов,
+статистику цен, поисковый индекс, индекс похожих авто, превью фото, версии кеша карточек, штампы
+для ETag, счётчики избранного и т.п.).
+Подключаются в CatalogConfig.ready().
+"""
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from . import changes, facets, favorites, fragments, images, pricestats, search, stamps
+from .models import Brand, Car, CarModel, Favorite
+
+
+@receiver(pre_save, sender=Car)
+def remember_car_state(sender, instance, **kwargs):
+    # Старые значения: перенести авто между ячейками фасетов, убрать старые превью
+    instance._old_state = None
+    if instance.pk:
+        instance._old_state = (Car.objects.filter(pk=instance.pk)
+                               .values(*facets.KEY_FIELDS, 'price', 'image', 'image_variants')
+                               .first())
+
+
+@receiver(post_save, sender=Car)
+def car_saved(sender, instance, created, **kwargs):
+    old = None if created else getattr(instance, '_old_state', None)
+    old_key = tuple(old[f] for f in facets.KEY_FIELDS) if old else None
+    facets.apply_change(old_key, facets.facet_key(instance))
+    pricestats.apply_change(old_key and old_key + (old['price'],), pricestats.stat_key(instance))
+    changes.record('car', instance.pk)
+    search.index_cars([instance.pk])
+    fragments.bump_car(instance.pk)
+    stamps.bump_car(instance.pk)
+
+    old_image = old['image'] if old else ''
+    if (instance.image.name or '') != (old_image or ''):
+        images.schedule(instance.pk, old_image, old['image_variants'] if old else None)
+
+
+@receiver(post_delete, sender=Car)
+def car_deleted(sender, instance, **kwargs):
+    facets.apply_change(facets.facet_key(instance), None)
+    pricestats.apply_change(pricestats.stat_key(instance), None)
+    changes.record('car', instance.pk, deleted=True)
+    search.unindex_car(instance.pk)
+    fragments.bump_car(instance.pk)
+    stamps.bump_car(instance.pk)
+    if instance.image:
+        images.schedule(instance.pk, instance.image.name, instance.image_variants)
+
+
+@receiver(post_save, sender=Brand)
+def brand_saved(sender, instance, created, **kwargs):
+    if not created:
+        search.rename('brand', 'brand_id', instance.pk, instance.name)
+    changes.record('brand', instance.pk)
+    fragments.bump('brand', instance.pk)
+    stamps.bump_names()
+
+
+@receiver(post_save, sender=CarModel)
+def car_model_saved(sender, instance, created, **kwargs):
+    if not created:
+        search.rename('model', 'model_id', instance.pk, instance.name)
+    changes.record('model', instance.pk)
+    fragments.bump('model', instance.pk)
+    stamps.bump_names()
+
+
+@receiver(post_delete, sender=Brand)
+@receiver(post_delete, sender=CarModel)
+def name_deleted(sender, instance, **kwargs):
+    changes.record('brand' if sender is Brand else 'model', instance.pk, deleted=True)
+    stamps.bump_names()
+
+
+@receiver(post_save, sender=Favorite)
+def favorite_saved(sender, instance, created, **kwargs):
+    if created:
+        favorites.adjust(instance.user_id, +1)
+    stamps.bump_user(instance.user_id)
+
+
+@receiver(post_delete, sender=Favorite)
+def favorite_deleted(sender, instance, **kwargs):
+    favorites.adjust(instance.user_id, -1)
+    stamps.bump_user(instance.user_id)
@@ -0,0 +1,323 @@
+"""
+«Похожие авто»: индекс ближайших соседей в памяти на NumPy.
+
+Все авто лежат в колонках NumPy (id, цена, год, признаки, коды двигателя,
+коробки, марки и модели). Расстояние до авто — взвешенная сумма квадратов
+разниц нормированных log(цены) и года плюс штрафы за другой двигатель,
+коробку, марку и модель (WEIGHTS); top-k — argpartition по всему массиву,
+без запросов к БД. Фильтры CarFilter превращаются в булеву маску.
+
+Индекс грузится лениво, при первом запросе: из снимка на диске
+(settings.SIMILAR_INDEX_DIR, команда build_similar_index) через
+np.load(mmap_mode='c') — воркер стартует без чтения всей таблицы, — или,
+если снимка нет, из БД. Источник изменений — журнал каталога в БД
+(CatalogChange, catalog/changes.py): индекс помнит id последней учтённой
+записи, и каждый процесс при запросе дочитывает более поздние записи и
+правит строки изменённых авто. Так же проверяется и снимок при загрузке:
+всё, что изменилось после build_similar_index, доприменяется. Отставание
+больше MAX_PENDING записей (массовый импорт, старый снимок) — индекс
+перечитывается из БД целиком.
+
+NumPy — необязательная зависимость: без него блок «Похожие» просто
+не показывается.
+"""
+import json
+import logging
+import threading
+import time
+from pathlib import Path
+
+from django.conf import settings
+from django.db.models import Max
+
+from . import search
+from .models import Car, CatalogChange
+
+try:
+    import numpy as np
+except ImportError:  # необязательная зависимость
+    np = None
+
+WEIGHTS = {'price': 4.0, 'year': 1.0, 'engine_type': 0.5, 'transmission': 0.3,
+           'brand': 1.0, 'model': 1.5}
+ENGINES = [value for value, _ in Car.ENGINE_CHOICES]
+TRANSMISSIONS = [value for value, _ in Car.TRANSMISSION_CHOICES]
+# Колонки хранятся строками матриц (features — 2×N, codes — 4×N): каждый
+# признак лежит в памяти подряд, и векторные операции идут по нему без шага.
+# Строки codes: двигатель, коробка, марка, модель
+CODE_WEIGHTS = (WEIGHTS['engine_type'], WEIGHTS['transmission'], WEIGHTS['brand'], WEIGHTS['model'])
+ARRAYS = ('ids', 'price', 'year', 'features', 'codes', 'alive')
+
+logger = logging.getLogger(__name__)
+
+# Больше отставание (записей журнала) — проще перечитать индекс целиком
+MAX_PENDING = 1000
+VALUES = ('id', 'price', 'year', 'engine_type', 'transmission', 'brand_id', 'model_id')
+
+
+def available():
+    return np is not None
+
+
+def _code(choices, value):
+    try:
+        return choices.index(value)
+    except ValueError:
+        return -1
+
+
+class Index:
+    """Колонки всех авто, отсортированные по id; alive=False — удалённые."""
+
+    def __init__(self, ids, price, year, features, codes, alive, stats):
+        self.ids = ids
+        self.price = price
+        self.year = year
+        self.features = features
+        self.codes = codes
+        self.alive = alive
+        self.stats = stats          # {'price_mean', 'price_std', 'year_mean', 'year_std'}
+
+    def __len__(self):
+        return int(self.alive.sum())
+
+    # ---------- Построение ----------
+    @staticmethod
+    def _columns(rows):
+        rows = list(rows)
+        ids = np.fromiter((r[0] for r in rows), dtype=np.int64, count=len(rows))
+        price = np.fromiter((float(r[1]) for r in rows), dtype=np.float64, count=len(rows))
+        year = np.fromiter((r[2] for r in rows), dtype=np.int16, count=len(rows))
+        codes = np.array([(_code(ENGINES, r[3]), _code(TRANSMISSIONS, r[4]), r[5], r[6])
+                          for r in rows], dtype=np.int32).reshape(len(rows), 4).T.copy()
+        return ids, price, year, codes
+
+    @classmethod
+    def from_arrays(cls, ids, price, year, codes):
+        """ids, price, year — по авто; codes — 4×N (двигатель, коробка, марка, модель)."""
+        order = np.argsort(ids, kind='stable')
+        ids, price, year, codes = ids[order], price[order], year[order], codes[:, order]
+        stats = {'price_mean': 0.0, 'price_std': 1.0, 'year_mean': 0.0, 'year_std': 1.0}
+        if len(ids):
+            log_price = np.log(np.maximum(price, 1.0))
+            stats = {
+                'price_mean': float(log_price.mean()), 'price_std': float(log_price.std()) or 1.0,
+                'year_mean': float(year.mean()), 'year_std': float(year.std()) or 1.0,
+            }
+        index = cls(ids, price, year, None, codes, np.ones(len(ids), dtype=bool), stats)
+        index.features = index._features(price, year)
+        return index
+
+    @classmethod
+    def from_rows(cls, rows):
+        """rows — кортежи в порядке VALUES."""
+        return cls.from_arrays(*cls._columns(rows))
+
+    @classmethod
+    def from_db(cls):
+        return cls.from_rows(Car.objects.order_by('id').values_list(*VALUES)
+                             .iterator(chunk_size=10000))
+
+    def _features(self, price, year):
+        s = self.stats
+        features = np.empty((2, len(price)), dtype=np.float32)
+        features[0] = (np.log(np.maximum(price, 1.0)) - s['price_mean']) / s['price_std']
+        features[1] = (year - s['year_mean']) / s['year_std']
+        return features
+
+    # ---------- Снимок на диске ----------
+    def save(self, path, meta):
+        path = Path(path)
+        path.mkdir(parents=True, exist_ok=True)
+        for name in ARRAYS:
+            np.save(path / f'{name}.npy', getattr(self, name))
+        # meta.json последним: неполный снимок без него не читается
+        (path / 'meta.json').write_text(json.dumps(dict(meta, stats=self.stats)), encoding='utf-8')
+
+    @classmethod
+    def load(cls, path, mmap=True):
+        """(Index, meta) или None. mmap: страницы читаются с диска по мере надобности."""
+        path = Path(path)
+        try:
+            meta = json.loads((path / 'meta.json').read_text(encoding='utf-8'))
+            # 'c' — copy-on-write: правки остаются в памяти процесса, файл не меняется
+            arrays = {name: np.load(path / f'{name}.npy', mmap_mode='c' if mmap else None)
+                      for name in ARRAYS}
+        except (OSError, ValueError):
+            return None
+        return cls(stats=meta['stats'], **arrays), meta
+
+    # ---------- Инкрементальные правки ----------
+    def _find(self, ids):
+        """(позиции, маска «id есть в индексе») для массива ids."""
+        pos = np.searchsorted(self.ids, ids)
+        if not len(self.ids):
+            return pos, np.zeros(len(ids), dtype=bool)
+        return pos, (pos < len(self.ids)) & (self.ids[np.minimum(pos, len(self.ids) - 1)] == ids)
+
+    def patch(self, pks, rows):
+        """Строки rows (VALUES) заменяют/добавляют авто; pks без строки — удалены."""
+        present = {r[0] for r in rows}
+        gone = np.array([pk for pk in pks if pk not in present], dtype=np.int64)
+        pos, known = self._find(gone)
+        self.alive[pos[known]] = False
+        if not rows:
+            return
+        ids, price, year, codes = self._columns(rows)
+        pos, known = self._find(ids)
+        at = pos[known]
+        self.price[at] = price[known]
+        self.year[at] = year[known]
+        self.codes[:, at] = codes[:, known]
+        self.features[:, at] = self._features(price[known], year[known])
+        self.alive[at] = True
+        new = ~known
+        if new.any():
+            # Новые авто: склеиваем и пересортировываем (обычно id больше всех — порядок не меняется)
+            ids = np.concatenate([self.ids, ids[new]])
+            order = np.argsort(ids, kind='stable')
+            self.ids = ids[order]
+            self.price = np.concatenate([self.price, price[new]])[order]
+            self.year = np.concatenate([self.year, year[new]])[order]
+            self.codes = np.concatenate([self.codes, codes[:, new]], axis=1)[:, order]
+            self.features = np.concatenate(
+                [self.features, self._features(price[new], year[new])], axis=1)[:, order]
+            self.alive = np.concatenate([self.alive, np.ones(int(new.sum()), dtype=bool)])[order]
+
+    # ---------- Запросы ----------
+    def position(self, pk):
+        pos = int(np.searchsorted(self.ids, pk))
+        if pos < len(self.ids) and self.ids[pos] == pk and self.alive[pos]:
+            return pos
+        return None
+
+    def mask(self, cd, search_ids=None):
+        """Булева маска по cleaned_data CarFilter (None — без ограничений)."""
+        mask = self.alive.copy()
+        if cd.get('brand'):
+            mask &= self.codes[2] == cd['brand'].pk
+        if cd.get('model'):
+            mask &= self.codes[3] == cd['model'].pk
+        if cd.get('engine_type'):
+            mask &= self.codes[0] == _code(ENGINES, cd['engine_type'])
+        if cd.get('transmission'):
+            mask &= self.codes[1] == _code(TRANSMISSIONS, cd['transmission'])
+        if cd.get('year_min') is not None:
+            mask &= self.year >= cd['year_min']
+        if cd.get('year_max') is not None:
+            mask &= self.year <= cd['year_max']
+        if cd.get('price_min') is not None:
+            mask &= self.price >= float(cd['price_min'])
+        if cd.get('price_max') is not None:
+            mask &= self.price <= float(cd['price_max'])
+        if search_ids is not None:
+            mask &= np.isin(self.ids, search_ids)
+        return mask
+
+    def nearest(self, pk, k=6, mask=None):
+        """[(id, расстояние), ...] — k ближайших к авто pk, без него самого."""
+        pos = self.position(pk)
+        if pos is None:
+            return []
+        dist = np.zeros(len(self.ids), dtype=np.float32)
+        for row, weight in zip(self.features, (WEIGHTS['price'], WEIGHTS['year'])):
+            diff = row - row[pos]
+            diff *= diff
+            diff *= weight
+            dist += diff
+        for row, weight in zip(self.codes, CODE_WEIGHTS):
+            dist += (row != row[pos]) * np.float32(weight)
+        allowed = self.alive if mask is None else mask
+        dist[~allowed] = np.inf
+        dist[pos] = np.inf
+        k = min(k, int(allowed.sum()))
+        if k <= 0:
+            return []
+        top = np.argpartition(dist, k - 1)[:k]
+        top = top[np.argsort(dist[top], kind='stable')]
+        return [(int(self.ids[i]), float(dist[i])) for i in top if np.isfinite(dist[i])]
+
+
+# ---------- Индекс процесса и журнал изменений ----------
+def index_dir():
+    return Path(getattr(settings, 'SIMILAR_INDEX_DIR', Path(settings.BASE_DIR) / 'var' / 'similar'))
+
+
+_state = {'index': None, 'change_id': 0}
+_lock = threading.Lock()
+
+
+def _last_change():
+    """id последней записи журнала изменений (0 — журнал пуст)."""
+    return CatalogChange.objects.aggregate(last=Max('id'))['last'] or 0
+
+
+def _apply_pending():
+    """Дочитать журнал после позиции индекса; False — отставание больше MAX_PENDING."""
+    rows = list(CatalogChange.objects.filter(id__gt=_state['change_id']).order_by('id')
+                .values_list('id', 'kind', 'object_id')[:MAX_PENDING + 1])
+    if len(rows) > MAX_PENDING:
+        return False
+    if not rows:
+        return True
+    pks = {object_id for _, kind, object_id in rows if kind == 'car'}
+    if pks:
+        _state['index'].patch(pks, list(Car.objects.filter(pk__in=pks).values_list(*VALUES)))
+    _state['change_id'] = rows[-1][0]
+    return True
+
+
+def _full_load(snapshot=True):
+    if snapshot:
+        loaded = Index.load(index_dir())
+        if loaded:
+            index, meta = loaded
+            change_id = meta.get('change_id')
+            if change_id is not None and change_id <= _last_change():
+                _state.update(index=index, change_id=change_id)
+                if _apply_pending():
+                    return
+                logger.warning('Снимок похожих авто отстал от каталога больше чем на %s изменений — '
+                               'индекс читается из БД; пересоберите его: build_similar_index', MAX_PENDING)
+            else:
+                logger.warning('Снимок похожих авто не от этой БД — индекс читается из БД')
+    # Позиция журнала — до чтения таблицы: изменения во время чтения доприменятся
+    change_id = _last_change()
+    _state.update(index=Index.from_db(), change_id=change_id)
+
+
+def get_index():
+    """Индекс этого процесса, актуальный на момент вызова (или None без NumPy)."""
+    if not available():
+        return None
+    with _lock:
+        if _state['index'] is None:
+            _full_load()
+        elif not _apply_pending():
+            _full_load(snapshot=False)
+        return _state['index']
+
+
+def build_snapshot(path=None):
+    """Построить индекс из БД и записать снимок. Возвращает (число авто, секунд)."""
+    started = time.perf_counter()
+    change_id = _last_change()
+    index = Index.from_db()
+    index.save(path or index_dir(), {'change_id': change_id, 'created': time.time()})
+    return len(index), time.perf_counter() - started
+
+
+def similar_ids(pk, k=6, filterset=None):
+    """[(id, расстояние), ...] для блока «Похожие»; [] без NumPy или для неизвестного id."""
+    index = get_index()
+    if index is None:
+        return []
+    mask = None
+    if filterset is not None and filterset.is_valid():
+        cd = filterset.form.cleaned_data
+        search_ids = None
+        if cd.get('q'):
+            search_ids = np.fromiter(search.apply(Car.objects.order_by(), cd['q'])
+                                     .values_list('id', flat=True), dtype=np.int64)
+        mask = index.mask(cd, search_ids)
+    return index.nearest(pk, k, mask)
@@ -0,0 +1,219 @@
+"""
+Штампы версий каталога и условные GET-запросы (ETag / Last-Modified).
+
+Штамп — целое число секунд (время последнего изменения), лежит в общем
+для всех процессов кеше (settings.SHARED_CACHE_ALIAS):
+  - catalog:stamp            — любое изменение Car / Brand / CarModel;
+  - catalog:stamp:car:<id>   — изменение конкретного авто;
+  - catalog:stamp:names      — переименование/удаление марок и моделей
+                               (их названия видны на странице авто);
+  - catalog:stamp:user:<id>  — избранное пользователя.
+Обновляются сигналами (catalog/signals.py). По ним страницы отвечают 304
+на If-None-Match / If-Modified-Since, не трогая ORM и шаблоны.
+Для async-представлений штампы читаются одним переходом в поток: общий
+кеш (файловый, Memcached, Redis) — это ввод-вывод, которому не место в event loop.
+
+Штамп заводится add() и двигается incr() — атомарно между воркерами
+(Memcached/Redis, на одной машине — catalog/cache.py), и только после
+коммита: иначе страницу со старыми данными успели бы отдать с новым ETag.
+В ETag входит и версия выкладки (release()): после деплоя с новыми
+шаблонами закешированные у клиентов 304 больше не подходят.
+"""
+import hashlib
+import os
+import time
+from datetime import datetime, timezone
+from functools import lru_cache, wraps
+
+from asgiref.sync import iscoroutinefunction, sync_to_async
+from django.conf import settings
+from django.contrib import messages
+from django.core.cache import caches
+from django.db import transaction
+from django.utils.cache import get_conditional_response, patch_cache_control, patch_vary_headers
+from django.utils.http import http_date, quote_etag
+from django.views.decorators.http import condition
+
+from . import compare
+
+PREFIX = 'catalog:stamp'
+
+
+def shared_cache():
+    """Кеш, общий для всех воркеров: штампы и версии, которые должны видеть все."""
+    return caches[getattr(settings, 'SHARED_CACHE_ALIAS', 'default')]
+
+
+def _key(*parts):
+    return ':'.join((PREFIX,) + tuple(str(p) for p in parts))
+
+
+def _advance(key):
+    cache = shared_cache()
+    now = int(time.time())
+    cache.add(key, now, None)
+    # Шаг — до текущего времени, но не меньше 1: incr() у каждого воркера свой
+    delta = max(1, now - (cache.get(key) or now))
+    try:
+        return cache.incr(key, delta)
+    except ValueError:  # штамп успели вытеснить
+        cache.add(key, now, None)
+        return cache.incr(key)
+
+
+def bump(*parts):
+    """Новый штамп после коммита: строго больше прежнего, даже если изменения в одну секунду."""
+    key = _key(*parts)
+    transaction.on_commit(lambda: _advance(key))
+
+
+def get(*parts):
+    """Текущий штамп; если его нет (холодный кеш) — заводим «сейчас»."""
+    cache = shared_cache()
+    key = _key(*parts)
+    value = cache.get(key)
+    if value is None:
+        cache.add(key, int(time.time()), None)
+        value = cache.get(key)
+    return value
+
+
+def bump_catalog():
+    bump()
+
+
+def bump_car(pk):
+    bump('car', pk)
+    bump()
+
+
+def bump_cars(pks):
+    """Массовые операции в обход save(): штамп каждого авто и общий."""
+    for pk in pks:
+        bump('car', pk)
+    if pks:
+        bump()
+
+
+def bump_names():
+    bump('names')
+    bump()
+
+
+def bump_user(user_id):
+    bump('user', user_id)
+
+
+# ---------- ETag / Last-Modified ----------
+@lru_cache(maxsize=None)
+def release():
+    """
+    Версия выкладки: settings.CATALOG_RELEASE или отпечаток (имя, размер,
+    mtime) шаблонов и кода каталога. На нескольких машинах mtime разные —
+    там CATALOG_RELEASE лучше задать явно.
+    """
+    if getattr(settings, 'CATALOG_RELEASE', ''):
+        return settings.CATALOG_RELEASE
+    roots = [str(d) for d in settings.TEMPLATES[0].get('DIRS', ())]
+    roots.append(os.path.dirname(os.path.abspath(__file__)))
+    digest = hashlib.md5()
+    for root in roots:
+        for directory, dirs, files in os.walk(root):
+            dirs[:] = sorted(d for d in dirs if d != '__pycache__')
+            for name in sorted(files):
+                if name.endswith(('.py', '.html', '.txt')):
+                    stat = os.stat(os.path.join(directory, name))
+                    digest.update(f'{directory}/{name}:{stat.st_size}:{stat.st_mtime_ns}'.encode())
+    return digest.hexdigest()[:12]
+
+
+def is_shared(request):
+    """Гость без сессии видит ту же страницу, что и все — её можно кешировать на прокси."""
+    return settings.SESSION_COOKIE_NAME not in request.COOKIES
+
+
+def _resource_stamps(scope, pk):
+    if scope == 'detail':
+        return [get('car', pk), get('names')]
+    return [get()]
+
+
+def _etag(request, scope, pk=None):
+    # Есть непоказанные сообщения — страницу надо отрисовать заново
+    if len(messages.get_messages(request)):
+        return None
+    parts = [scope, release()] + [str(s) for s in _resource_stamps(scope, pk)]
+    if not is_shared(request):
+        user = request.user
+        if user.is_authenticated:
+            parts += [f'u{user.pk}', str(get('user', user.pk)),
+                      str(int(user.is_staff)), str(int(user.is_superuser))]
+    # Список сравнения (кука, см. catalog/compare.py) виден в шапке каждой страницы
+    parts.append(','.join(str(i) for i in compare.get_ids(request)))
+    return hashlib.md5('|'.join(parts).encode()).hexdigest()
+
+
+def _last_modified(request, scope, pk=None):
+    if not is_shared(request):
+        return None
+    return datetime.fromtimestamp(max(_resource_stamps(scope, pk)), tz=timezone.utc)
+
+
+def _patch_caching(request, response):
+    if request.method not in ('GET', 'HEAD'):
+        return response
+    if is_shared(request) and not response.cookies:
+        patch_cache_control(response, public=True, max_age=0,
+                            s_maxage=getattr(settings, 'CATALOG_PROXY_MAX_AGE', 60))
+    else:
+        patch_cache_control(response, private=True, no_cache=True)
+    patch_vary_headers(response, ('Cookie',))
+    return response
+
+
+def _validators(request, scope, pk):
+    etag = _etag(request, scope, pk)
+    last_modified = _last_modified(request, scope, pk)
+    return (quote_etag(etag) if etag else None,
+            int(last_modified.timestamp()) if last_modified else None)
+
+
+def _async_conditional(view, scope):
+    """То же, что condition(), но для async-представлений."""
+    @wraps(view)
+    async def inner(request, *args, **kwargs):
+        # Штампы — в общем кеше (у файлового это чтение с диска), а сессия,
+        # пользователь и сообщения — в БД: всё это одним переходом в поток
+        etag, last_modified = await sync_to_async(_validators)(request, scope, kwargs.get('pk'))
+        response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+        if response is None:
+            response = await view(request, *args, **kwargs)
+        if request.method in ('GET', 'HEAD'):
+            if last_modified and not response.has_header('Last-Modified'):
+                response.headers['Last-Modified'] = http_date(last_modified)
+            if etag:
+                response.headers.setdefault('ETag', etag)
+        return _patch_caching(request, response)
+    return inner
+
+
+def conditional_page(scope):
+    """
+    Декоратор страниц каталога ('list', 'detail', 'compare'): ETag/Last-Modified
+    по штампам, 304 без обращения к представлению, Cache-Control для прокси.
+    Подходит и для обычных, и для async-представлений.
+    """
+    def decorator(view):
+        if iscoroutinefunction(view):
+            return _async_conditional(view, scope)
+        conditional = condition(
+            etag_func=lambda request, *args, **kwargs: _etag(request, scope, kwargs.get('pk')),
+            last_modified_func=lambda request, *args, **kwargs: _last_modified(
+                request, scope, kwargs.get('pk')),
+        )(view)
+
+        @wraps(view)
+        def inner(request, *args, **kwargs):
+            return _patch_caching(request, conditional(request, *args, **kwargs))
+        return inner
+    return decorator
@@ -0,0 +1,78 @@
+"""
+Хранилище фото авто с именами по содержимому.
+
+Файл называется sha256 своего содержимого: cars/<64 hex>.jpg. Одинаковые
+загрузки (в том числе для разных авто) — один файл на диске: если такой
+уже есть, второй раз он не пишется. Раз содержимое по имени никогда не
+меняется, такие файлы и их превью (cars/variants/<hash>_jpg_640w.webp)
+можно кешировать навсегда — serve() отдаёт их с Cache-Control: immutable.
+
+Когда фото перестаёт быть нужным (авто удалили или фото заменили), файл
+удаляется, только если на него больше не ссылается ни одно авто
+(images.release()). Старые файлы переносит команда migrate_car_images.
+
+В проде, если /media/ раздаёт прокси, — те же заголовки для хешированных имён:
+    location ~ ^/media/cars/(variants/)?[0-9a-f]{64}[._] {
+        add_header Cache-Control "public, max-age=31536000, immutable";
+    }
+"""
+import hashlib
+import posixpath
+import re
+
+from django.conf import settings
+from django.core.files import File
+from django.core.files.storage import FileSystemStorage
+from django.views.static import serve as static_serve
+
+HASHED_NAME = re.compile(r'^cars/(variants/)?[0-9a-f]{64}[._]')
+IMMUTABLE = 'public, max-age=31536000, immutable'
+
+
+def content_hash(content):
+    digest = hashlib.sha256()
+    for chunk in content.chunks():
+        digest.update(chunk)
+    content.seek(0)
+    return digest.hexdigest()
+
+
+def hashed_name(name, content):
+    """'cars/IMG_01.JPG' -> 'cars/<sha256>.jpg' (каталог из upload_to, расширение — в нижнем регистре)."""
+    directory, base = posixpath.split(name)
+    return posixpath.join(directory, content_hash(content) + posixpath.splitext(base)[1].lower())
+
+
+def is_immutable(name):
+    return bool(HASHED_NAME.match(name))
+
+
+class ContentHashStorage(FileSystemStorage):
+    # Car.save() зовёт save() внутри своей транзакции, уже взяв блокировку записи
+    # (db.lock()): проверка exists() и запись ссылки идут под ней, как и удаление
+    # в images.release()
+    def save(self, name, content, max_length=None):
+        if name is None:
+            name = content.name
+        if not hasattr(content, 'chunks'):
+            content = File(content, name)
+        name = hashed_name(name, content)
+        if self.exists(name):
+            return name
+        return super().save(name, content, max_length=max_length)
+
+
+_car_images = ContentHashStorage()
+
+
+def car_image_storage():
+    """Хранилище для Car.image (вызываемое — чтобы в миграциях была ссылка, а не настройки)."""
+    return _car_images
+
+
+def serve(request, path):
+    """Отдача /media/ (settings.SERVE_MEDIA); хешированные имена — immutable."""
+    response = static_serve(request, path, document_root=settings.MEDIA_ROOT)
+    if is_immutable(path):
+        response.headers['Cache-Control'] = IMMUTABLE
+    return response
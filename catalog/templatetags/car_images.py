@@ -0,0 +1,38 @@
+from django import template
+from django.core.files.storage import default_storage
+from django.utils.html import format_html, format_html_join
+
+from catalog.images import variant_name
+
+register = template.Library()
+
+MIME = {'avif': 'image/avif', 'webp': 'image/webp'}
+
+
+@register.simple_tag
+def car_picture(car, sizes='100vw', css_class='', alt='', loading='lazy', style=''):
+    """
+    <picture> с AVIF/WebP-копиями фото (srcset/sizes) и ленивой загрузкой.
+    Пока копии не готовы — обычный <img> с оригиналом.
+    {% car_picture car sizes="(min-width: 768px) 33vw, 100vw" css_class="card-img-top" alt=car %}
+    """
+    image = car.image
+    variants = car.image_variants or {}
+    img = format_html(
+        '<img src="{}" class="{}" alt="{}" loading="{}" decoding="async"{}{}>',
+        image.url, css_class, alt, loading,
+        format_html(' style="{}"', style) if style else '',
+        format_html(' width="{}" height="{}"', variants['width'], variants['height'])
+        if variants.get('src') == image.name else '',
+    )
+    if variants.get('src') != image.name:
+        return img
+    sources = format_html_join(
+        '', '<source type="{}" srcset="{}" sizes="{}">',
+        ((MIME[fmt],
+          ', '.join(f'{default_storage.url(variant_name(image.name, w, fmt))} {w}w'
+                    for w in variants['widths']),
+          sizes)
+         for fmt in variants['formats']),
+    )
+    return format_html('<picture>{}{}</picture>', sources, img)
@@ -0,0 +1,11 @@
+from django import template
+
+from catalog import lookups
+
+register = template.Library()
+
+
+@register.simple_tag
+def brand_models_url():
+    """Адрес JSON-справочника марка → модели с хешем содержимого (catalog/lookups.py)."""
+    return lookups.get().url
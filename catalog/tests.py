@@ -1,3 +1,966 @@
-from django.test import TestCase
+import asyncio
+import base64
+import csv
+import json
+import posixpath
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from decimal import Decimal
+from io import BytesIO
+from unittest import mock, skipIf
 
-# Create your tests here.
+from asgiref.sync import sync_to_async
+from django.contrib.auth import get_user_model
+from django.contrib.auth.models import AnonymousUser
+from django.contrib.sessions.models import Session
+from django.core import signing
+from django.core.cache import caches
+from django.core.files.base import ContentFile
+from django.core.files.storage import FileSystemStorage
+from django.db import OperationalError, connection, connections, transaction
+from django.test import RequestFactory, SimpleTestCase, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from PIL import Image
+
+from . import (api, bench, changes, compare, counts, db, export, facets, favorites, fragments, images,
+               lookups, metrics, pricestats, search, similar, stamps, warmup)
+from .cache import LockingFileBasedCache
+from .compare import COOKIE_NAME as COMPARE_COOKIE, cookie_value
+from .importer import CarImporter
+from .filters import CarFilter
+from .models import Brand, Car, CarFacet, CarModel, CarPriceStat, CatalogChange, Favorite, FavoriteCount
+from .pagination import AtLeast, capped_count, decode_cursor, encode_cursor, keyset_page, ordering_for, seek
+from .queryplan import QueryPlanAssertions, bad_steps, explain, listing_queryset
+from .similar import np
+
+# Кеши процесса — в памяти: тесты не трогают общий файловый кеш и не видят его
+TEST_CACHES = {
+    'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'tests-default'},
+    'shared': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'tests-shared'},
+}
+
+
+@override_settings(CACHES=TEST_CACHES)
+class CatalogTestCase(TestCase):
+    def setUp(self):
+        for alias in TEST_CACHES:
+            caches[alias].clear()
+        # Справочник в памяти процесса — по штампу, а штампы только что сброшены
+        lookups._current = (None, None)
+        self.brand = Brand.objects.create(name='Lada')
+        self.model = CarModel.objects.create(brand=self.brand, name='Vesta')
+
+    def car(self, **kwargs):
+        fields = dict(brand=self.brand, model=self.model, year=2020, engine_type='petrol',
+                      transmission='mt', price=Decimal('1500000'))
+        fields.update(kwargs)
+        return Car.objects.create(**fields)
+
+
+@override_settings(CACHES=TEST_CACHES)
+class ListingQueryPlanTests(QueryPlanAssertions, TestCase):
+    def test_every_filter_and_sort_uses_an_index(self):
+        brand = Brand.objects.create(name='Lada')
+        model = CarModel.objects.create(brand=brand, name='Vesta')
+        car = Car.objects.create(brand=brand, model=model, year=2020, engine_type='petrol',
+                                 transmission='mt', price=1_500_000)
+        self.assertListingPlansIndexed(car)
+
+    def test_index_scan_is_bad_once_there_is_a_condition(self):
+        scan = ['SCAN catalog_car USING COVERING INDEX car_price_id_idx']
+        self.assertEqual(bad_steps(scan), [])
+        self.assertEqual(bad_steps(scan, filtered=True), scan)
+        self.assertEqual(bad_steps(scan, cursor=True), scan)
+        by_pk = ['SEARCH catalog_car USING INTEGER PRIMARY KEY (rowid>?)']
+        self.assertEqual(bad_steps(by_pk, cursor=True), by_pk)
+        seek_plan = ['SEARCH catalog_brand USING INTEGER PRIMARY KEY (rowid=?)',
+                     'SEARCH catalog_car USING INDEX car_brand_price_idx (brand_id=? AND price>?)']
+        self.assertEqual(bad_steps(seek_plan, filtered=True, cursor=True), [])
+
+
+class BenchTests(CatalogTestCase):
+    def test_generator_is_seeded_and_fills_derived_tables(self):
+        sizes = dict(cars=40, brands=3, models_per_brand=2, users=2, favorites_per_user=3)
+        created = bench.generate(seed=7, **sizes)
+        self.assertEqual((created['brands'], created['models'], created['cars'], created['users']),
+                         (3, 6, 40, 2))
+        cars = list(Car.objects.filter(brand__name__startswith='Bench ')
+                    .order_by('id').values_list('model__name', 'year', 'price'))
+        self.assertEqual(sum(CarFacet.objects.values_list('count', flat=True)), 40)
+        self.assertEqual(sum(CarPriceStat.objects.values_list('count', flat=True)), 40)
+        for counter in FavoriteCount.objects.all():
+            self.assertEqual(counter.count, Favorite.objects.filter(user_id=counter.user_id).count())
+
+        # Тот же seed — тот же каталог
+        Car.objects.all().delete()
+        bench.generate(seed=7, **sizes)
+        self.assertEqual(cars, list(Car.objects.order_by('id').values_list('model__name', 'year', 'price')))
+
+    def test_compare_reports_slower_and_chattier_scenarios(self):
+        def result(p95, queries):
+            return {'p95_ms': p95, 'queries_max': queries}
+        baseline = {'results': {'list': result(10.0, 5), 'detail': result(4.0, 2), 'gone': result(1.0, 1)}}
+        current = {'results': {'list': result(11.0, 6), 'detail': result(5.0, 2), 'new': result(9.0, 9)}}
+        self.assertEqual(bench.compare(current, baseline), [
+            ('list', 'queries_max', 5, 6),
+            ('detail', 'p95_ms', 4.0, 5.0),
+        ])
+
+
+class KeysetPaginationTests(CatalogTestCase):
+    def test_cursor_walk_matches_ordering_with_ties(self):
+        for price in (300, 100, 200, 200, 100, 400, 200):
+            self.car(price=Decimal(price))
+        sort = 'price'
+        expected = list(Car.objects.order_by(*ordering_for(sort)).values_list('id', flat=True))
+
+        first = list(Car.objects.order_by(*ordering_for(sort))[:3])
+        seen = [car.pk for car in first]
+        token = encode_cursor(sort, first[-1], 'next')
+        pages = []
+        while token:
+            page = keyset_page(Car.objects.all(), sort, token, 3)
+            pages.append(page)
+            seen += [car.pk for car in page]
+            token = page.next_cursor
+        self.assertEqual(seen, expected)
+
+        back = keyset_page(Car.objects.all(), sort, pages[0].previous_cursor, 3)
+        self.assertEqual([car.pk for car in back], expected[:3])
+        self.assertFalse(back.has_previous())
+
+    def test_foreign_cursor_falls_back(self):
+        car = self.car()
+        self.assertIsNone(keyset_page(Car.objects.all(), 'price', encode_cursor('year', car), 3))
+        self.assertIsNone(keyset_page(Car.objects.all(), 'price', 'not-a-cursor', 3))
+
+    def test_forged_cursor_value_is_rejected(self):
+        self.car()
+        for sort, value in (('price', 'abc'), ('price', [1]), ('year', 'zzz'), ('-created_at', 'zzz')):
+            raw = json.dumps([sort, 'next', value, 1]).encode()
+            token = base64.urlsafe_b64encode(raw).decode()
+            self.assertIsNone(decode_cursor(token, sort))
+            # Список откатывается на первую страницу, API отвечает 400
+            response = self.client.get('/', {'sort': sort, 'cursor': token})
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(len(response.context['cars']), 1)
+            response = self.client.get('/api/cars/', {'sort': sort, 'cursor': token})
+            self.assertEqual(response.status_code, 400)
+
+    def test_deep_cursor_seeks_the_index(self):
+        car = self.car()
+        for sort in ('price', '-price', 'year', '-created_at'):
+            for direction in ('next', 'prev'):
+                plan = explain(seek(Car.objects.all(), sort, direction, getattr(car, sort.lstrip('-')), car.pk)[:9])
+                self.assertTrue(plan[0].startswith(f'SEARCH {Car._meta.db_table} USING INDEX'), plan)
+
+
+class FacetCountTests(CatalogTestCase):
+    def cells(self):
+        return set(CarFacet.objects.values_list(*facets.KEY_FIELDS, 'count'))
+
+    def test_signals_keep_cells_equal_to_rebuild(self):
+        a = self.car()
+        self.car()
+        b = self.car(year=2015, engine_type='diesel')
+        a.year = 2015
+        a.engine_type = 'diesel'
+        a.save()
+        b.delete()
+        incremental = self.cells()
+        facets.rebuild()
+        self.assertEqual(incremental, self.cells())
+        self.assertIn((self.brand.pk, self.model.pk, 'diesel', 'mt', 2015, 1), incremental)
+        self.assertIn((self.brand.pk, self.model.pk, 'petrol', 'mt', 2020, 1), incremental)
+
+    def test_price_filter_counts_match_the_car_table(self):
+        other = CarModel.objects.create(brand=self.brand, name='Granta')
+        for n, price in enumerate((600_000, 740_000, 999_999, 1_000_000, 1_260_000, 1_400_000, 2_000_000)):
+            self.car(price=Decimal(price), model=other if n % 2 else self.model, year=2015 + n)
+        for data in ({'price_min': 700000, 'price_max': 1300000}, {'price_min': 1000000},
+                     {'price_max': 1249999.99}, {'price_min': 700000, 'brand': self.brand.pk}):
+            counts = facets.facet_counts(CarFilter(data, queryset=Car.objects.all()))
+            cars = Car.objects.filter(price__gte=data.get('price_min', 0),
+                                      price__lte=data.get('price_max', 10 ** 9))
+            self.assertEqual(sum(counts['engine_type'].values()), cars.count(), data)
+            self.assertEqual(counts['model'], {m: cars.filter(model_id=m).count()
+                                               for m in set(cars.values_list('model_id', flat=True))}, data)
+
+
+
+class SearchTests(CatalogTestCase):
+    def found(self, text):
+        return set(search.apply(Car.objects.all(), text).values_list('pk', flat=True))
+
+    def test_prefix_search_follows_saves_renames_and_deletes(self):
+        self.assertEqual(search.to_match_query('Лада  "ves OR'), '"Лада"* "ves"* "OR"*')
+        vesta = self.car(description='один владелец')
+        rio = CarModel.objects.create(brand=Brand.objects.create(name='Kia'), name='Rio')
+        kia = self.car(brand=rio.brand, model=rio, description='торг')
+        self.assertEqual(self.found('ves'), {vesta.pk})
+        self.assertEqual(self.found('lada влад'), {vesta.pk})
+        self.assertEqual(self.found('торг'), {kia.pk})
+
+        self.model.name = 'Granta'
+        self.model.save()
+        self.assertEqual(self.found('vesta'), set())
+        self.assertEqual(self.found('gran'), {vesta.pk})
+        vesta.delete()
+        self.assertEqual(self.found('gran'), set())
+        # Ранжирование: совпадение в марке весит больше, чем в описании
+        mention = self.car(description='дешевле, чем Kia')
+        ranked = search.apply(Car.objects.all(), 'kia').order_by('search_rank')
+        self.assertEqual([car.pk for car in ranked], [kia.pk, mention.pk])
+
+
+class ImageVariantTests(SimpleTestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.storage = FileSystemStorage(location=directory.name)
+
+    def photo(self, name, size):
+        buf = BytesIO()
+        Image.new('RGB', size, 'red').save(buf, 'JPEG')
+        return self.storage.save(name, ContentFile(buf.getvalue()))
+
+    @override_settings(CAR_IMAGE_WIDTHS=(320, 640, 960))
+    def test_variants_are_never_wider_than_the_original(self):
+        name = self.photo('cars/photo.jpg', (800, 600))
+        variants = images.build_variants(name, storage=self.storage)
+        self.assertEqual((variants['src'], variants['width'], variants['height']), (name, 800, 600))
+        self.assertEqual(variants['widths'], [320, 640, 800])
+        self.assertIn('webp', variants['formats'])
+        for width in variants['widths']:
+            for fmt in variants['formats']:
+                target = images.variant_name(name, width, fmt)
+                with self.storage.open(target, 'rb') as fh:
+                    self.assertEqual(Image.open(fh).size, (width, width * 3 // 4))
+        self.assertEqual(images.variant_name('cars/a.jpg', 320, 'webp'), 'cars/variants/a_jpg_320w.webp')
+
+        images.delete_variants(variants, storage=self.storage)
+        self.assertEqual(self.storage.listdir(images.VARIANTS_DIR), ([], []))
+        self.assertTrue(self.storage.exists(name))
+
+
+class PhotoReferenceTests(CatalogTestCase):
+    def setUp(self):
+        super().setUp()
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        media = override_settings(MEDIA_ROOT=directory.name)
+        media.enable()
+        self.addCleanup(media.disable)
+
+    def photo(self, color='red'):
+        buf = BytesIO()
+        Image.new('RGB', (40, 30), color).save(buf, 'JPEG')
+        return ContentFile(buf.getvalue(), name='IMG_01.JPG')
+
+    def test_write_lock_is_taken_only_where_asked(self):
+        with CaptureQueriesContext(connection) as queries:
+            with transaction.atomic():
+                Car.objects.exists()
+            with db.write_locked():
+                Car.objects.exists()
+        # SAVEPOINT — это вложенность atomic() в транзакцию теста
+        statements = [query['sql'] for query in queries if 'SAVEPOINT' not in query['sql']]
+        self.assertEqual(len(statements), 3)
+        self.assertNotIn('WHERE 0', statements[0])
+        self.assertIn('WHERE 0', statements[1])
+
+        with CaptureQueriesContext(connection) as queries:
+            self.car()
+        statements = [query['sql'] for query in queries if 'SAVEPOINT' not in query['sql']]
+        self.assertIn('WHERE 0', statements[0])
+
+    def test_shared_photo_is_deleted_with_its_last_car(self):
+        first = self.car(image=self.photo())
+        second = self.car(image=self.photo())
+        name = first.image.name
+        self.assertEqual(second.image.name, name)
+        storage = images.image_storage()
+
+        first.delete()
+        self.assertFalse(images.release(name))
+        self.assertTrue(storage.exists(name))
+        second.delete()
+        self.assertTrue(images.release(name))
+        self.assertFalse(storage.exists(name))
+
+    def test_garbage_collection_keeps_referenced_photos(self):
+        kept = self.car(image=self.photo()).image.name
+        orphan = self.car(image=self.photo('blue'))
+        Car.objects.filter(pk=orphan.pk).update(image='')
+        self.assertEqual(images.collect_garbage(dry_run=True), [orphan.image.name])
+        self.assertEqual(images.collect_garbage(), [orphan.image.name])
+        self.assertEqual(images.image_storage().listdir('cars'), ([], [posixpath.basename(kept)]))
+
+
+class CardCacheTests(CatalogTestCase):
+    def render(self, cars, favorite_ids=()):
+        request = RequestFactory().get('/')
+        request.user = AnonymousUser()
+        return dict((car.pk, html) for car, html in fragments.render_cards(cars, request, set(favorite_ids)))
+
+    def test_cards_are_cached_until_car_or_name_changes(self):
+        a, b = self.car(), self.car(price=Decimal('990000'))
+        cars = lambda: list(Car.objects.select_related('brand', 'model').order_by('pk'))
+        first = self.render(cars(), favorite_ids=[a.pk])
+        self.assertIn('bi-star-fill', first[a.pk])
+        self.assertNotIn('bi-star-fill', first[b.pk])
+        self.assertNotIn('%%card:', first[a.pk])
+        self.assertEqual(fragments.stats()['misses'], 2)
+
+        self.render(cars())
+        self.assertEqual(fragments.stats()['hits'], 2)
+        with self.captureOnCommitCallbacks(execute=True):
+            b.price = Decimal('1100000')
+            b.save()
+            self.brand.name = 'ВАЗ'
+            self.brand.save()
+        again = self.render(cars())
+        self.assertEqual(fragments.stats()['misses'], 4)
+        self.assertIn('ВАЗ', again[a.pk])
+        self.assertIn('1 100 000', again[b.pk])
+
+    def test_listing_cards_render_without_extra_queries(self):
+        for _ in range(3):
+            self.car()
+        cars = list(listing_queryset({'sort': '-created_at'})[:9])
+        # Марка и модель пришли JOIN-ом списка: холодные карточки БД не трогают
+        with self.assertNumQueries(0):
+            self.render(cars)
+
+
+
+class ConditionalGetTests(CatalogTestCase):
+    def tearDown(self):
+        stamps.release.cache_clear()
+
+    def test_list_and_detail_answer_304_until_the_car_changes(self):
+        car = self.car()
+        for url in ('/', f'/cars/{car.pk}/'):
+            response = self.client.get(url)
+            etag = response['ETag']
+            self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+            with self.captureOnCommitCallbacks(execute=True):
+                car.price += 1
+                car.save()
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+            self.assertEqual(response.status_code, 200)
+            self.assertNotEqual(response['ETag'], etag)
+
+    def test_stamp_moves_only_after_commit(self):
+        before = stamps.get()
+        with self.captureOnCommitCallbacks() as callbacks:
+            stamps.bump()
+            self.assertEqual(stamps.get(), before)
+        callbacks[0]()
+        self.assertGreater(stamps.get(), before)
+
+    def test_release_changes_the_etag(self):
+        etag = self.client.get('/')['ETag']
+        with self.settings(CATALOG_RELEASE='r2'):
+            stamps.release.cache_clear()
+            self.assertNotEqual(self.client.get('/', HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+
+class LockingFileBasedCacheTests(SimpleTestCase):
+    def test_concurrent_increments_are_not_lost(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        cache = LockingFileBasedCache(directory.name, {})
+        self.assertTrue(cache.add('stamp', 1000, None))
+        self.assertFalse(cache.add('stamp', 1, None))
+
+        def work(_):
+            return [cache.incr('stamp') for _ in range(25)]
+        with ThreadPoolExecutor(8) as pool:
+            values = [v for chunk in pool.map(work, range(8)) for v in chunk]
+        self.assertEqual(len(set(values)), 200)
+        self.assertEqual(cache.get('stamp'), 1200)
+
+
+class ImporterTests(CatalogTestCase):
+    def test_bad_rows_are_rejected_with_reason(self):
+        other = CarModel.objects.create(brand=Brand.objects.create(name='Kia'), name='Rio')
+        good = {'brand': 'Lada', 'model': 'Vesta', 'year': '2019', 'engine_type': 'petrol',
+                'transmission': 'at', 'price': '1 250 000'}
+        rows = [
+            good,
+            dict(good, brand='Haval', model='Jolion'),
+            dict(good, year='1700'),
+            dict(good, engine_type='steam'),
+            dict(good, price='дорого'),
+            {'brand_id': self.brand.pk, 'model_id': other.pk, **{k: good[k] for k in
+             ('year', 'engine_type', 'transmission', 'price')}},
+            {'__error__': 'битый JSON'},
+        ]
+        rejected = {}
+        importer = CarImporter(on_reject=lambda number, row, reason: rejected.setdefault(number, reason))
+        stats = importer.run(enumerate(rows, start=1))
+
+        self.assertEqual((stats.read, stats.loaded, stats.rejected), (7, 2, 5))
+        self.assertEqual(rejected, {
+            3: 'year вне диапазона',
+            4: 'некорректный engine_type',
+            5: 'некорректный price',
+            6: 'Выбранная модель не относится к выбранной марке.',
+            7: 'битый JSON',
+        })
+        self.assertEqual(stats.brands_created, 1)
+        self.assertEqual(Car.objects.get(model__name='Vesta').price, Decimal('1250000'))
+        self.assertEqual(CarFacet.objects.get(model__name='Jolion').count, 1)
+
+
+class ExportTests(CatalogTestCase):
+    def setUp(self):
+        super().setUp()
+        self.cheap = self.car(price=Decimal('500000'), description='торг, "как новая"')
+        self.dear = self.car(price=Decimal('2500000'), year=2023)
+
+    def test_csv_follows_filters_and_sort(self):
+        response = self.client.get('/cars/export/', {'format': 'csv', 'sort': '-price'})
+        self.assertTrue(response.streaming)
+        self.assertEqual(response['Content-Disposition'], 'attachment; filename="cars.csv"')
+        rows = list(csv.reader(b''.join(response.streaming_content).decode('utf-8-sig').splitlines()))
+        self.assertEqual(rows[0], list(export.COLUMNS))
+        self.assertEqual([row[0] for row in rows[1:]], [str(self.dear.pk), str(self.cheap.pk)])
+        self.assertEqual(rows[2][7], 'торг, "как новая"')
+
+        response = self.client.get('/cars/export/', {'format': 'csv', 'price_max': 1000000})
+        self.assertEqual(len(b''.join(response.streaming_content).splitlines()), 2)
+        self.assertEqual(self.client.get('/cars/export/', {'format': 'xml'}).status_code, 400)
+        self.assertEqual(self.client.get('/cars/export/', {'year_min': 'abc'}).status_code, 400)
+
+    async def test_jsonl_streams_asynchronously_under_asgi(self):
+        response = await self.async_client.get('/cars/export/', {'format': 'jsonl', 'sort': 'price'})
+        self.assertTrue(response.is_async)
+        body = b''.join([chunk async for chunk in response.streaming_content])
+        rows = [json.loads(line) for line in body.decode().splitlines()]
+        self.assertEqual([row['id'] for row in rows], [self.cheap.pk, self.dear.pk])
+        self.assertEqual(rows[1], {**rows[1], 'brand': 'Lada', 'model': 'Vesta', 'year': 2023,
+                                   'price': '2500000.00'})
+
+
+class FavoriteTests(CatalogTestCase):
+    def setUp(self):
+        super().setUp()
+        self.user = get_user_model().objects.create_user('fan', password='x')
+        self.cars = [self.car() for _ in range(4)]
+
+    def assertCounterMatches(self, expected):
+        self.assertEqual(Favorite.objects.filter(user=self.user).count(), expected)
+        self.assertEqual(favorites.get_count(self.user.pk), expected)
+        self.assertEqual(FavoriteCount.objects.get(user=self.user).count, expected)
+
+    def test_toggle_and_signals_share_the_counter(self):
+        self.assertEqual(favorites.get_count(self.user.pk), 0)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertTrue(favorites.toggle(self.user.pk, self.cars[0].pk))
+            Favorite.objects.create(user=self.user, car=self.cars[1])
+        self.assertCounterMatches(2)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertFalse(favorites.toggle(self.user.pk, self.cars[0].pk))
+        self.assertCounterMatches(1)
+
+    def test_batch_skips_missing_and_duplicates(self):
+        ids = [car.pk for car in self.cars]
+        self.assertEqual(favorites.get_count(self.user.pk), 0)
+        # Кеш счётчика сбрасывается после коммита
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(favorites.update(self.user.pk, add=ids + ids[:1] + [10 ** 9]), (4, 0))
+            self.assertEqual(favorites.update(self.user.pk, add=ids[:2], remove=ids[2:]), (0, 2))
+        self.assertCounterMatches(2)
+        self.assertEqual(favorites.member_ids(self.user.pk, ids), set(ids[:2]))
+        with self.assertRaises(ValueError):
+            favorites.update(self.user.pk, add=range(favorites.MAX_BATCH + 1))
+
+    def test_batch_endpoint(self):
+        ids = [car.pk for car in self.cars]
+        url = '/favorites/batch/'
+        self.assertEqual(self.client.post(url, {'add': ids}).status_code, 401)
+        self.client.force_login(self.user)
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(url, {'add': ids[:3], 'remove': ids[3:]},
+                                        content_type='application/json')
+        self.assertEqual(response.json(), {'added': 3, 'removed': 0, 'count': 3})
+        self.assertEqual(self.client.post(url, {'add': 'x'}, content_type='application/json').status_code, 400)
+        self.assertEqual(self.client.get(url).status_code, 405)
+
+    def test_list_page_reads_rows_once_and_fixes_a_drifted_counter(self):
+        Favorite.objects.bulk_create([Favorite(user=self.user, car=car) for car in self.cars])
+        FavoriteCount.objects.filter(user=self.user).update(count=1)
+        self.client.force_login(self.user)
+        with CaptureQueriesContext(connection) as queries, \
+                self.captureOnCommitCallbacks(execute=True):
+            response = self.client.get('/favorites/')
+        self.assertEqual(len(response.context['cars']), 4)
+        self.assertEqual(response.context['paginator'].count, 4)
+        self.assertEqual(sum('FROM "catalog_car"' in q['sql'] for q in queries), 1)
+        self.assertCounterMatches(4)
+
+    def test_count_read_before_commit_is_not_served_after_it(self):
+        self.assertEqual(favorites.get_count(self.user.pk), 0)
+        stale_key = favorites._key(self.user.pk, favorites._generation(self.user.pk))
+        with self.captureOnCommitCallbacks(execute=True):
+            favorites.toggle(self.user.pk, self.cars[0].pk)
+        # Читатель, посчитавший 0 до коммита, записывает его уже после
+        stamps.shared_cache().set(stale_key, 0)
+        self.assertEqual(favorites.get_count(self.user.pk), 1)
+
+    def test_repair_fixes_a_drifted_counter(self):
+        Favorite.objects.bulk_create([Favorite(user=self.user, car=car) for car in self.cars[:3]])
+        self.assertEqual(favorites.get_count(self.user.pk), 3)
+        FavoriteCount.objects.filter(user=self.user).update(count=7)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(favorites.repair([self.user.pk]), 1)
+        self.assertCounterMatches(3)
+
+
+class ApiTests(CatalogTestCase):
+    def get(self, url, **params):
+        response = self.client.get(url, params)
+        self.assertEqual(response.status_code, 200, response.content)
+        return json.loads(response.content)
+
+    def test_list_projects_fields_and_walks_the_cursor(self):
+        cars = [self.car(price=Decimal(price)) for price in (300, 100, 200)]
+        page = self.get('/api/cars/', sort='price', limit=2, fields='id,price,brand')
+        self.assertEqual(page['results'], [{'id': cars[1].pk, 'price': '100.00', 'brand': 'Lada'},
+                                           {'id': cars[2].pk, 'price': '200.00', 'brand': 'Lada'}])
+        page = self.get('/api/cars/', sort='price', limit=2, fields='id', cursor=page['next'])
+        self.assertEqual(page, {'results': [{'id': cars[0].pk}], 'next': None})
+        self.assertEqual(self.client.get('/api/cars/', {'fields': 'id,secret'}).status_code, 400)
+        self.assertEqual(self.client.get('/api/cars/', {'limit': 0}).status_code, 400)
+
+        response = self.client.get(f'/api/cars/{cars[0].pk}/')
+        self.assertEqual(self.client.get(f'/api/cars/{cars[0].pk}/',
+                                         HTTP_IF_NONE_MATCH=response['ETag']).status_code, 304)
+        self.assertEqual(self.client.get('/api/cars/0/').status_code, 404)
+
+    def test_models_filter_by_brand(self):
+        kia = Brand.objects.create(name='Kia')
+        rio = CarModel.objects.create(brand=kia, name='Rio')
+        self.assertEqual(self.get('/api/models/', brand=kia.pk), [{'id': rio.pk, 'brand_id': kia.pk, 'name': 'Rio'}])
+        self.assertEqual(len(self.get('/api/models/')), 2)
+        self.assertEqual(self.client.get('/api/models/', {'brand': 'x'}).status_code, 400)
+
+
+@skipIf(api.brotli is None, 'пакет brotli не установлен')
+class ApiCompressionTests(CatalogTestCase):
+    def setUp(self):
+        super().setUp()
+        Car.objects.bulk_create([Car(brand=self.brand, model=self.model, year=2020, engine_type='petrol',
+                                     transmission='mt', price=Decimal(100_000 + n))
+                                 for n in range(api.STREAM_FROM + 1)])
+
+    def results(self, response, body):
+        self.assertEqual(response['Content-Encoding'], 'br')
+        self.assertIn('Accept-Encoding', response['Vary'])
+        return json.loads(api.brotli.decompress(body))['results']
+
+    def test_brotli_plain_and_streamed(self):
+        response = self.client.get('/api/cars/', {'limit': 10}, HTTP_ACCEPT_ENCODING='gzip, br')
+        self.assertFalse(response.streaming)
+        self.assertEqual(len(self.results(response, response.content)), 10)
+        response = self.client.get('/api/cars/', {'limit': api.STREAM_FROM}, HTTP_ACCEPT_ENCODING='br')
+        self.assertTrue(response.streaming)
+        self.assertEqual(len(self.results(response, b''.join(response.streaming_content))), api.STREAM_FROM)
+        response = self.client.get('/api/cars/', {'limit': 10}, HTTP_ACCEPT_ENCODING='gzip')
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+
+    async def test_brotli_streams_asynchronously_under_asgi(self):
+        response = await self.async_client.get('/api/cars/', {'limit': api.STREAM_FROM},
+                                               headers={'Accept-Encoding': 'br'})
+        self.assertTrue(response.is_async)
+        body = b''.join([chunk async for chunk in response.streaming_content])
+        self.assertEqual(len(self.results(response, body)), api.STREAM_FROM)
+
+
+class AsyncViewTests(CatalogTestCase):
+    def setUp(self):
+        super().setUp()
+        self.cars = [self.car(), self.car(year=2018)]
+        self.user = get_user_model().objects.create_user('fan', password='x')
+
+    def guarded_cache(self):
+        # Общий кеш — файловый: читать его из event loop значит блокировать loop
+        shared = stamps.shared_cache()
+
+        def check():
+            try:
+                asyncio.get_running_loop()
+            except RuntimeError:
+                return shared
+            self.fail('общий кеш читается из event loop')
+        return mock.patch.object(stamps, 'shared_cache', check)
+
+    async def test_pages_do_not_touch_the_shared_cache_on_the_event_loop(self):
+        value = cookie_value([car.pk for car in self.cars])
+        self.async_client.cookies[COMPARE_COOKIE] = value
+        with self.guarded_cache():
+            for url in ('/', f'/cars/{self.cars[0].pk}/', '/compare/'):
+                response = await self.async_client.get(url)
+                self.assertEqual(response.status_code, 200, url)
+            response = await self.async_client.get('/compare/', headers={'If-None-Match': response['ETag']})
+            self.assertEqual(response.status_code, 304)
+        self.assertEqual((await self.async_client.get('/cars/0/')).status_code, 404)
+
+    async def test_favorite_toggle_and_models(self):
+        response = await self.async_client.get(f'/favorites/toggle/{self.cars[0].pk}/')
+        self.assertEqual(response.status_code, 302)
+        self.assertIn('/login/', response['Location'])
+        await sync_to_async(self.async_client.force_login)(self.user)
+        response = await self.async_client.get(f'/favorites/toggle/{self.cars[0].pk}/',
+                                               headers={'X-Requested-With': 'XMLHttpRequest'})
+        self.assertEqual(json.loads(response.content), {'status': 'added', 'count': 1})
+        response = await self.async_client.get('/ajax/models/', {'brand_id': self.brand.pk})
+        self.assertEqual(json.loads(response.content), [{'id': self.model.pk, 'name': 'Vesta'}])
+
+
+class MetricsTests(CatalogTestCase):
+    def setUp(self):
+        super().setUp()
+        metrics.reset()
+        self.car()
+
+    def test_server_timing_and_histograms(self):
+        response = self.client.get('/')
+        timing = response['Server-Timing']
+        self.assertRegex(timing, r'^total;dur=[\d.]+, db;dur=[\d.]+;desc="SQL x\d+"')
+        self.assertIn('ctx;dur=', timing)
+        self.assertIn('view;desc="car_list"', timing)
+        self.assertIn('favorites_count', response.context)
+        self.assertIn('compare_ids', response.context)
+        # Тело потокового ответа ещё не прочитано — заголовка нет
+        self.assertNotIn('Server-Timing', self.client.get('/cars/export/'))
+        self.assertEqual(metrics.snapshot()['car_list']['count'], 1)
+
+    @override_settings(SLOW_QUERY_MS=0)
+    def test_slow_queries_are_logged_without_literals(self):
+        with self.assertLogs('catalog.slow_sql', 'WARNING') as logs:
+            self.client.get('/', {'year_min': 2019})
+        entry = json.loads(logs.records[0].getMessage())
+        self.assertEqual(entry['view'], 'car_list')
+        self.assertNotIn('2019', ''.join(json.loads(r.getMessage())['sql'] for r in logs.records))
+
+    @override_settings(METRICS_TOKEN='s3cret')
+    def test_metrics_need_staff_or_token(self):
+        self.assertEqual(self.client.get('/metrics/').status_code, 404)
+        self.assertEqual(self.client.get('/metrics/', HTTP_AUTHORIZATION='Bearer wrong').status_code, 404)
+        self.assertEqual(self.client.get('/metrics/', HTTP_AUTHORIZATION='Bearer s3cret').status_code, 200)
+        staff = get_user_model().objects.create_user('boss', password='x', is_staff=True)
+        self.client.force_login(staff)
+        self.assertIn('views', json.loads(self.client.get('/metrics/').content))
+
+
+class BrandModelsLookupTests(CatalogTestCase):
+    def test_lookup_is_rebuilt_only_when_names_change(self):
+        kia = Brand.objects.create(name='Kia')
+        CarModel.objects.create(brand=kia, name='Rio')
+        lookup = lookups.get()
+        self.assertEqual(lookup.model_choices(kia.pk)[1:], [(kia.models.get().pk, 'Rio')])
+        self.assertEqual([label for _, label in lookup.model_choices()[1:]], ['Kia Rio', 'Lada Vesta'])
+        with self.assertNumQueries(0):
+            self.assertIs(lookups.get(), lookup)
+
+        response = self.client.get(lookup.url)
+        self.assertIn('immutable', response['Cache-Control'])
+        self.assertEqual(json.loads(response.content)['brands'], [[kia.pk, 'Kia'], [self.brand.pk, 'Lada']])
+        with self.captureOnCommitCallbacks(execute=True):
+            kia.name = 'KIA'
+            kia.save()
+        fresh = lookups.get()
+        self.assertNotEqual(fresh.digest, lookup.digest)
+        # Старый адрес ведёт на новый
+        self.assertRedirects(self.client.get(lookup.url), fresh.url, fetch_redirect_response=False)
+
+
+class PriceStatTests(CatalogTestCase):
+    def cell(self):
+        return CarPriceStat.objects.get()
+
+    def test_removing_extreme_price_recomputes_min_max(self):
+        low = self.car(price=Decimal('1000000'))
+        self.car(price=Decimal('1100000'))
+        high = self.car(price=Decimal('1200000'))
+        high.delete()
+        cell = self.cell()
+        self.assertEqual((cell.count, cell.price_min, cell.price_max, cell.price_sum),
+                         (2, Decimal('1000000'), Decimal('1100000'), Decimal('2100000')))
+        low.price = Decimal('1050000')
+        low.save()
+        cell = self.cell()
+        self.assertEqual((cell.price_min, cell.price_max), (Decimal('1050000'), Decimal('1100000')))
+
+    def test_summary_under_a_price_filter_is_exact(self):
+        kia = CarModel.objects.create(brand=Brand.objects.create(name='Kia'), name='Rio')
+        for n, price in enumerate((600_000, 740_000, 760_000, 999_999, 1_000_000, 1_260_000, 1_299_000, 1_400_000)):
+            self.car(price=Decimal(price), year=2015 + n % 3, **({'brand': kia.brand, 'model': kia} if n % 2 else {}))
+        for data in ({'price_min': 700000, 'price_max': 1300000}, {'price_min': 700000, 'brand': self.brand.pk},
+                     {'price_max': 1000000, 'year_min': 2016}):
+            stats = pricestats.histograms(CarFilter(data, queryset=Car.objects.all()))
+            cars = CarFilter(data, queryset=Car.objects.all()).qs
+            prices = sorted(cars.values_list('price', flat=True))
+            self.assertEqual((stats['count'], stats['min'], stats['max'], stats['avg']),
+                             (len(prices), prices[0], prices[-1], round(sum(prices) / len(prices), 2)), data)
+            years = CarFilter({k: v for k, v in data.items() if k != 'year_min'}, queryset=Car.objects.all()).qs
+            self.assertEqual(dict(stats['year']), {y: years.filter(year=y).count()
+                                                   for y in set(years.values_list('year', flat=True))}, data)
+
+
+
+class DatabaseRoutingTests(SimpleTestCase):
+    def test_only_the_read_alias_is_query_only(self):
+        self.assertEqual(db.read_alias(), 'replica')
+        self.assertNotIn('query_only', db.pragmas('default'))
+        replica = db.pragmas('replica')
+        self.assertEqual(replica['journal_mode'], 'wal')
+        self.assertEqual(list(replica)[-1], 'query_only')
+        with override_settings(CATALOG_READ_DB='missing'):
+            self.assertEqual(db.read_alias(), 'default')
+            self.assertNotIn('query_only', db.pragmas('replica'))
+
+    def test_reads_inside_a_transaction_stay_on_the_primary(self):
+        router = db.ReadWriteRouter()
+        self.assertEqual(router.db_for_read(Car), 'replica')
+        self.assertIsNone(router.db_for_read(get_user_model()))
+        self.assertEqual(router.db_for_write(Car), 'default')
+        self.assertFalse(router.allow_migrate('replica', 'catalog'))
+        with mock.patch.object(connection, 'in_atomic_block', True):
+            self.assertEqual(router.db_for_read(Car), 'default')
+
+
+
+class ReplicaConnectionTests(TestCase):
+    databases = {'default', 'replica'}
+
+    def test_replica_connection_refuses_writes(self):
+        replica = connections['replica']
+        with replica.cursor() as cursor:
+            cursor.execute('PRAGMA query_only')
+            self.assertEqual(cursor.fetchone(), (1,))
+            with self.assertRaisesMessage(OperationalError, 'readonly'):
+                cursor.execute('DELETE FROM catalog_brand')
+
+
+class CompareTests(CatalogTestCase):
+    def ids(self, response):
+        return compare._parse(signing.get_cookie_signer(salt=COMPARE_COOKIE + compare.COOKIE_SALT)
+                              .unsign(response.cookies[COMPARE_COOKIE].value))
+
+    def test_list_lives_in_a_signed_cookie_in_click_order(self):
+        cars = [self.car(year=2010 + n) for n in range(5)]
+        for car in (cars[2], cars[0], cars[2], cars[1], cars[3]):
+            response = self.client.get(f'/compare/add/{car.pk}/')
+        self.assertEqual(self.ids(response), [cars[2].pk, cars[0].pk, cars[1].pk, cars[3].pk])
+
+        response = self.client.get(f'/compare/add/{cars[4].pk}/')
+        self.assertNotIn(COMPARE_COOKIE, response.cookies)  # список полон — кука та же
+        response = self.client.get(f'/compare/remove/{cars[0].pk}/')
+        self.assertEqual(self.ids(response), [cars[2].pk, cars[1].pk, cars[3].pk])
+        self.assertFalse(Session.objects.exists())
+
+    def test_tampered_cookie_is_an_empty_list(self):
+        car = self.car()
+        self.client.cookies[COMPARE_COOKIE] = cookie_value([car.pk]) + 'x'
+        response = self.client.get('/compare/')
+        self.assertEqual(response.context['matrix'], '')
+        self.client.cookies[COMPARE_COOKIE] = f'{car.pk}.{car.pk}'  # без подписи
+        self.assertEqual(self.client.get('/compare/').context['matrix'], '')
+
+    def test_matrix_is_one_query_then_cached(self):
+        old = self.car(year=2011)
+        new = self.car(year=2022)
+        with self.assertNumQueries(1):
+            html = compare.matrix([new.pk, old.pk])
+        self.assertLess(html.index('2022'), html.index('2011'))
+        with self.assertNumQueries(0):
+            self.assertEqual(compare.matrix([new.pk, old.pk]), html)
+
+
+@skipIf(not similar.available(), 'нужен NumPy')
+class SimilarCarsTests(CatalogTestCase):
+    def setUp(self):
+        super().setUp()
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        snapshots = override_settings(SIMILAR_INDEX_DIR=directory.name)
+        snapshots.enable()
+        self.addCleanup(snapshots.disable)
+        similar._state.update(index=None, change_id=0)
+        self.addCleanup(similar._state.update, index=None, change_id=0)
+        self.base = self.car()
+        self.twin = self.car(price=Decimal('1550000'))
+        self.older = self.car(year=2008, price=Decimal('400000'))
+        self.diesel = self.car(engine_type='diesel')
+
+    def ranked(self, **kwargs):
+        return [pk for pk, _ in similar.similar_ids(self.base.pk, **kwargs)]
+
+    def test_nearest_by_price_year_and_codes(self):
+        self.assertEqual(self.ranked(), [self.twin.pk, self.diesel.pk, self.older.pk])
+        self.assertEqual(self.ranked(k=1), [self.twin.pk])
+        filterset = CarFilter({'year_max': 2010}, queryset=Car.objects.all())
+        self.assertEqual(self.ranked(filterset=filterset), [self.older.pk])
+        self.assertEqual(similar.similar_ids(0), [])
+
+    def test_changes_are_patched_from_the_journal(self):
+        self.ranked()
+        loaded = similar._state['index']
+        self.twin.delete()
+        self.diesel.engine_type = 'petrol'
+        self.diesel.save()
+        newcomer = self.car(price=Decimal('1490000'))
+        self.assertEqual(self.ranked(), [self.diesel.pk, newcomer.pk, self.older.pk])
+        self.assertIs(similar._state['index'], loaded)
+
+    def test_snapshot_is_mapped_and_caught_up(self):
+        count, _ = similar.build_snapshot()
+        self.assertEqual(count, 4)
+        self.twin.delete()
+        similar._state.update(index=None, change_id=0)
+        self.assertEqual(self.ranked(), [self.diesel.pk, self.older.pk])
+        self.assertIsInstance(similar._state['index'].ids, np.memmap)
+
+
+class AdminTests(CatalogTestCase):
+    def setUp(self):
+        super().setUp()
+        self.admin = get_user_model().objects.create_superuser('admin', 'admin@example.com', 'pw')
+        self.client.force_login(self.admin)
+
+    def stats(self):
+        return set(CarPriceStat.objects.values_list(*facets.KEY_FIELDS, 'price_bucket', 'count',
+                                                    'price_sum', 'price_min', 'price_max'))
+
+    def test_changelist_queries_do_not_grow_with_rows(self):
+        other = Brand.objects.create(name='Kia')
+        self.car(model=CarModel.objects.create(brand=other, name='Rio'), brand=other)
+        with CaptureQueriesContext(connection) as one:
+            self.client.get('/admin/catalog/car/')
+        for _ in range(5):
+            self.car()
+        with CaptureQueriesContext(connection) as six:
+            response = self.client.get('/admin/catalog/car/', {'brand__id__exact': self.brand.pk})
+        self.assertEqual(len(six), len(one))
+        self.assertEqual(response.context['cl'].result_count, 5)
+        self.assertNotContains(self.client.get('/admin/catalog/car/add/'), '>Kia</option>')
+
+    def test_price_action_moves_stat_cells_without_rebuild(self):
+        edge = self.car(price=Decimal('245000'))   # +5% — уже следующий интервал
+        top = self.car(price=Decimal('1740000'))   # максимум ячейки уходит
+        self.car(price=Decimal('1500000'))
+        self.car(price=Decimal('1600000'), year=2015)
+        with mock.patch.object(pricestats, 'rebuild') as rebuild:
+            self.client.post('/admin/catalog/car/', {
+                'action': 'price_up_5', '_selected_action': [edge.pk, top.pk],
+            })
+        rebuild.assert_not_called()
+        self.assertEqual(Car.objects.get(pk=top.pk).price, Decimal('1827000'))
+        incremental = self.stats()
+        pricestats.rebuild()
+        self.assertEqual(incremental, self.stats())
+
+
+class ResultCountTests(CatalogTestCase):
+    def filterset(self, data):
+        return CarFilter(data, queryset=Car.objects.all())
+
+    def test_count_stops_at_the_cap(self):
+        for _ in range(3):
+            self.car()
+        self.assertEqual(capped_count(Car.objects.all(), 3), 3)
+        capped = capped_count(Car.objects.all(), 2)
+        self.assertIsInstance(capped, AtLeast)
+        self.assertEqual((int(capped), str(capped)), (2, '2+'))
+
+    def test_signature_ignores_sort_and_empty_values(self):
+        a = counts.signature(self.filterset({'year_min': '2010', 'brand': self.brand.pk, 'sort': 'price'}))
+        b = counts.signature(self.filterset({'brand': str(self.brand.pk), 'year_min': '2010',
+                                             'model': '', 'page': '3'}))
+        self.assertEqual(a, b)
+        self.assertEqual(counts.signature(CarFilter(None, queryset=Car.objects.all())), '{}')
+        self.assertIsNone(counts.signature(self.filterset({'year_min': 'abc'})))
+
+    @override_settings(CAR_LIST_COUNT_LIMIT=2)
+    def test_cached_count_follows_the_catalog_stamp(self):
+        self.car()
+        paginator = counts.CachedCountPaginator(Car.objects.all(), 1, signature='{}')
+        self.assertEqual((paginator.count, paginator.num_pages), (1, 1))
+        with self.assertNumQueries(0):
+            self.assertEqual(counts.get(Car.objects.all(), '{}'), 1)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.car()
+            self.car()
+        paginator = counts.CachedCountPaginator(Car.objects.all(), 1, signature='{}')
+        self.assertIsInstance(paginator.count, AtLeast)
+        self.assertEqual(str(paginator.num_pages), '2+')
+
+
+class ChangeFeedTests(CatalogTestCase):
+    def test_tokens_resume_and_survive_compaction(self):
+        start = CatalogChange.objects.order_by('-id').values_list('id', flat=True).first()
+        car = self.car()
+        car.price = Decimal('1600000')
+        car.save()
+        other = self.car()
+        other_pk = other.pk
+        other.delete()
+
+        changed, token, more = changes.batch(start, limit=2)
+        self.assertTrue(more)
+        self.assertEqual(changed['car'], {car.pk: False})
+        changed, token, more = changes.batch(token)
+        self.assertFalse(more)
+        self.assertEqual(changed['car'], {other_pk: True})
+        self.assertEqual(changes.batch(token), ({kind: {} for kind in changes.KINDS}, token, False))
+
+        self.assertEqual(changes.compact(), 2)
+        changed, _, _ = changes.batch(start)
+        self.assertEqual(changed['car'], {car.pk: False, other_pk: True})
+
+    def test_parse_token(self):
+        self.assertEqual(changes.parse_token(''), 0)
+        self.assertEqual(changes.parse_token('42'), 42)
+        for bad in ('-1', 'abc'):
+            with self.assertRaises(ValueError):
+                changes.parse_token(bad)
+
+    def test_api_returns_rows_and_deleted_ids(self):
+        start = str(CatalogChange.objects.order_by('-id').values_list('id', flat=True).first() or 0)
+        car = self.car()
+        gone = self.car()
+        gone_pk = gone.pk
+        gone.delete()
+        data = self.client.get('/api/changes/', {'since': start, 'fields': 'price'}).json()
+        self.assertEqual(data['changes']['car']['changed'], [{'id': car.pk, 'price': '1500000.00'}])
+        self.assertEqual(data['changes']['car']['deleted'], [gone_pk])
+        self.assertFalse(data['more'])
+        self.assertEqual(self.client.get('/api/changes/', {'since': data['next']}).json()['changes'], {})
+        self.assertEqual(self.client.get('/api/changes/', {'since': '-1'}).status_code, 400)
+
+
+
+class WarmupTests(SimpleTestCase):
+    def test_steps_run_and_connections_are_closed_last(self):
+        calls = []
+        steps = [(name, lambda name=name: calls.append(name)) for name, _ in warmup.STEPS]
+        steps[1] = ('urls', mock.Mock(side_effect=RuntimeError))
+        with mock.patch.object(warmup, 'STEPS', steps), \
+                mock.patch.object(warmup.connections, 'close_all', lambda: calls.append('close_all')), \
+                self.assertLogs('catalog.warmup', 'ERROR'):
+            timings = warmup.warm()
+        self.assertEqual(list(timings), [name for name, _ in warmup.STEPS])
+        self.assertEqual(calls, ['connections', 'templates', 'lookups', 'similar', 'requests', 'close_all'])
+
+    def test_every_project_template_is_precompiled(self):
+        names = warmup.template_names()
+        self.assertIn('catalog/car_list.html', names)
+        self.assertIn('catalog/includes/compare_matrix.html', names)
+        with mock.patch.object(warmup, 'get_template') as get_template:
+            warmup._templates()
+        self.assertEqual([c.args[0] for c in get_template.call_args_list], names)
@@ -1,5 +1,5 @@
 from django.urls import path
-from . import views
+from . import api, metrics, views
 
 urlpatterns = [
     path('', views.CarListView.as_view(), name='car_list'),
@@ -7,6 +7,7 @@ urlpatterns = [
     path('cars/add/', views.CarCreateView.as_view(), name='car_add'),
     path('cars/<int:pk>/edit/', views.CarUpdateView.as_view(), name='car_edit'),
     path('cars/<int:pk>/delete/', views.CarDeleteView.as_view(), name='car_delete'),
+    path('cars/export/', views.export_cars, name='car_export'),
 
     path('compare/', views.compare_view, name='compare'),
     path('compare/add/<int:pk>/', views.add_to_compare, name='add_to_compare'),
@@ -14,9 +15,25 @@ urlpatterns = [
 
     path('ajax/models/', views.load_models, name='ajax_load_models'),
 
+    # JSON API (только чтение)
+    path('api/cars/', api.car_list, name='api_car_list'),
+    path('api/cars/<int:pk>/', api.car_detail, name='api_car_detail'),
+    path('api/cars/<int:car_id>/similar/', api.car_similar, name='api_car_similar'),
+    path('api/changes/', api.change_list, name='api_changes'),
+    path('api/facets/', api.facet_list, name='api_facets'),
+    path('api/price-stats/', api.price_stats, name='api_price_stats'),
+    path('api/brands/', api.brand_list, name='api_brands'),
+    path('api/models/', api.model_list, name='api_models'),
+    path('api/brand-models/<slug:digest>.json', api.brand_models, name='api_brand_models'),
+
+    # Гистограммы времени ответа (персоналу или по токену, см. catalog/metrics.py)
+    path('metrics/', metrics.metrics_view, name='metrics'),
+
     # Избранное
     path('favorites/', views.FavoriteListView.as_view(), name='favorite_list'),
     path('favorites/toggle/<int:pk>/', views.favorite_toggle, name='favorite_toggle'),
+    # Пакетно: {"add": [...], "remove": [...]} — один INSERT и один DELETE
+    path('favorites/batch/', views.favorite_batch, name='favorite_batch'),
     # алиас на тот же вью — чтобы шаблоны, где используется 'fav_toggle', тоже работали
     path('fav/toggle/<int:pk>/', views.favorite_toggle, name='fav_toggle'),
     path('toggle_favorite/<int:pk>/', views.favorite_toggle, name='toggle_favorite'),
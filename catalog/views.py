@@ -1,20 +1,54 @@
 # catalog/views.py
+import json
+
+from asgiref.sync import sync_to_async
 from django.contrib import messages
 from django.contrib.auth import login, authenticate
-from django.contrib.auth.decorators import login_required
+from django.contrib.auth.views import redirect_to_login
 from django.contrib.auth.forms import UserCreationForm
 from django.contrib.auth.mixins import LoginRequiredMixin, PermissionRequiredMixin
-from django.http import JsonResponse
-from django.shortcuts import render, redirect, get_object_or_404
+from django.http import Http404, JsonResponse, StreamingHttpResponse
+from django.shortcuts import redirect
+from django.template.response import TemplateResponse
 from django.urls import reverse_lazy
+from django.utils.safestring import mark_safe
 from django.views.generic import (
     CreateView, UpdateView, DeleteView, DetailView, ListView, FormView
 )
 from django_filters.views import FilterView
 
+from . import compare, counts, export, facets, favorites, fragments
+from .stamps import is_shared, conditional_page
 from .forms import CarForm
 from .filters import CarFilter
-from .models import Car, CarModel, Favorite
+from .models import Car, CarModel
+from .pagination import ALLOWED_SORTS, CursorPage, KnownCountPaginator, encode_cursor, keyset_page, normalize_sort, ordering_for
+
+
+# ---------- Async: сессия, пользователь, авто ----------
+# Горячие представления — async (под ASGI обходятся без потока на запрос).
+# Под WSGI каждое async-представление Django выполняет через async_to_sync —
+# со своим event loop на запрос, что дороже обычного вызова: async-путь
+# рассчитан на autoguide.asgi.
+# Ленивые request.user и request.session читают БД, а из event loop это
+# запрещено (SynchronousOnlyOperation), поэтому они вычисляются в потоке.
+# Гостю без сессионной куки БД не нужна — тогда обходимся без перехода.
+async def _in_request_thread(request, func):
+    if is_shared(request):
+        return func()
+    return await sync_to_async(func)()
+
+
+async def _auser(request):
+    await _in_request_thread(request, lambda: request.user.is_authenticated)
+    return request.user
+
+
+async def _aget_car(pk):
+    try:
+        return await Car.objects.select_related('brand', 'model').aget(pk=pk)
+    except Car.DoesNotExist:
+        raise Http404('Автомобиль не найден')
 
 
 # ---------- Список + фильтрация + сортировка + пагинация ----------
@@ -24,29 +58,82 @@ class CarListView(FilterView):
     context_object_name = 'cars'
     filterset_class = CarFilter
     paginate_by = 9
+    # COUNT(*) — из кеша по набору фильтров и не дальше порога (catalog/counts.py)
+    paginator_class = counts.CachedCountPaginator
+
+    # Фильтры, фасеты и карточки синхронные, поэтому и представление
+    # синхронное: под ASGI Django сам выполнит его (вместе с проверкой
+    # штампов для 304) одним переходом в поток
+    @classmethod
+    def as_view(cls, **initkwargs):
+        # 304 по штампам — до фильтров и шаблонов (см. catalog/stamps.py)
+        return conditional_page('list')(super().as_view(**initkwargs))
 
     def get_queryset(self):
-        qs = super().get_queryset()
-        sort = self.request.GET.get('sort')
-        if sort in {'price', '-price', 'year', '-year'}:
-            qs = qs.order_by(sort)
-        else:
-            qs = qs.order_by('-created_at')  # по умолчанию — новые выше
+        # Марка и модель — одним JOIN: карточка, которой нет в кеше, выводит обе
+        qs = super().get_queryset().select_related('brand', 'model')
+        # по умолчанию — новые выше; id в конце — для стабильного порядка
+        self.sort = normalize_sort(self.request.GET.get('sort'))
+        qs = qs.order_by(*ordering_for(self.sort))
+        if self.request.GET.get('q') and self.request.GET.get('sort') not in ALLOWED_SORTS:
+            # Поиск без явной сортировки упорядочен по релевантности (см. CarFilter),
+            # курсор по ключу сортировки тут не применим
+            self.sort = None
         return qs
 
+    def paginate_queryset(self, queryset, page_size):
+        # ?cursor=... — keyset-страница без OFFSET и COUNT(*),
+        # ?page=N — обычная пагинация (запасной вариант, старые ссылки)
+        token = self.request.GET.get('cursor')
+        if token and self.sort:
+            page = keyset_page(queryset, self.sort, token, page_size)
+            if page is not None:
+                return None, page, page.object_list, page.has_other_pages()
+        return super().paginate_queryset(queryset, page_size)
+
+    def get_paginator(self, queryset, per_page, **kwargs):
+        return super().get_paginator(queryset, per_page, signature=counts.signature(self.filterset), **kwargs)
+
     def get_context_data(self, **kwargs):
         ctx = super().get_context_data(**kwargs)
         ctx['current_sort'] = self.request.GET.get('sort', '')
-        # Идентификаторы авто в избранном — для подсветки ⭐
+        ctx.update(self._cursor_context(ctx.get('page_obj')))
+        # Счётчики фасетов: «(N)» в селектах и интервалы годов в сайдбаре
+        counts = facets.facet_counts(self.filterset)
+        facets.annotate_form(self.filterset.form, counts)
+        ctx['facet_counts'] = counts
+        ctx['year_buckets'] = facets.year_buckets(counts)
+        # Какие авто этой страницы в избранном — для подсветки ⭐
+        # (только id со страницы, а не всё избранное пользователя)
+        cars = list(ctx['object_list'])
         if self.request.user.is_authenticated:
-            ids = set(
-                Favorite.objects.filter(user=self.request.user)
-                .values_list('car_id', flat=True)
-            )
+            ids = favorites.member_ids(self.request.user.pk, [car.pk for car in cars])
         else:
             ids = set()
         ctx['fav_ids'] = ids           # чтобы работали твои текущие шаблоны
         ctx['favorite_ids'] = ids      # и альтернативное имя на будущее
+        # Готовые карточки: общий HTML из кеша + звёздочка/кнопки текущего пользователя
+        ctx['car_cards'] = fragments.render_cards(cars, self.request, ids)
+        return ctx
+
+    def _cursor_context(self, page):
+        # Строка запроса без page/cursor — к ней дописываем ссылку на страницу
+        query = self.request.GET.copy()
+        query.pop('page', None)
+        query.pop('cursor', None)
+        ctx = {'page_query': query.urlencode(), 'next_cursor': '', 'prev_cursor': ''}
+        if page is None or not self.sort:
+            return ctx
+        if isinstance(page, CursorPage):
+            ctx['next_cursor'] = page.next_cursor
+            ctx['prev_cursor'] = page.previous_cursor
+            return ctx
+        # Обычная страница: «Вперёд»/«Назад» уводят в keyset-режим
+        rows = list(page.object_list)
+        if rows and page.has_next():
+            ctx['next_cursor'] = encode_cursor(self.sort, rows[-1], 'next')
+        if rows and page.has_previous():
+            ctx['prev_cursor'] = encode_cursor(self.sort, rows[0], 'prev')
         return ctx
 
 
@@ -56,6 +143,15 @@ class CarDetailView(DetailView):
     template_name = 'catalog/car_detail.html'
     context_object_name = 'car'
 
+    @classmethod
+    def as_view(cls, **initkwargs):
+        return conditional_page('detail')(super().as_view(**initkwargs))
+
+    async def get(self, request, *args, **kwargs):
+        self.object = await _aget_car(kwargs['pk'])
+        # TemplateResponse отрисует обработчик Django (в потоке)
+        return self.render_to_response(self.get_context_data(object=self.object))
+
 
 # ---------- CRUD (по правам) ----------
 class CarCreateView(LoginRequiredMixin, PermissionRequiredMixin, CreateView):
@@ -82,41 +178,54 @@ class CarDeleteView(LoginRequiredMixin, PermissionRequiredMixin, DeleteView):
 
 
 # ---------- AJAX: модели по марке ----------
-def load_models(request):
+async def load_models(request):
     brand_id = request.GET.get('brand_id')
-    data = list(CarModel.objects.filter(brand_id=brand_id)
-                .values('id', 'name')) if brand_id else []
+    data = [row async for row in CarModel.objects.filter(brand_id=brand_id)
+            .values('id', 'name')] if brand_id else []
     return JsonResponse(data, safe=False)
 
 
-# ---------- Сравнение ----------
-def _get_compare_ids(request):
-    return set(request.session.get('compare_ids', []))
+# ---------- Выгрузка CSV / JSONL ----------
+def export_cars(request):
+    """
+    Отфильтрованный каталог целиком: те же параметры, что у списка
+    (фильтры CarFilter, ?sort=, ?q=), плюс ?format=csv|jsonl.
+    """
+    fmt = request.GET.get('format', 'csv')
+    if fmt not in export.STREAMS:
+        return JsonResponse({'error': 'format: csv или jsonl'}, status=400)
+    filterset, qs = export.filtered_queryset(request.GET)
+    if qs is None:
+        return JsonResponse({'errors': filterset.errors}, status=400)
+    response = StreamingHttpResponse(export.streaming(request, export.STREAMS[fmt](qs)),
+                                     content_type=export.CONTENT_TYPES[fmt])
+    response['Content-Disposition'] = f'attachment; filename="cars.{fmt}"'
+    return response
 
 
-def add_to_compare(request, pk):
-    car = get_object_or_404(Car, pk=pk)
-    ids = _get_compare_ids(request)
-    if len(ids) >= 4 and pk not in ids:
-        messages.warning(request, 'Можно сравнивать не более 4 автомобилей.')
-    else:
-        ids.add(pk)
-        request.session['compare_ids'] = list(ids)
-        messages.success(request, f'{car} добавлен(а) к сравнению.')
-    return redirect(request.META.get('HTTP_REFERER', reverse_lazy('car_list')))
+# ---------- Сравнение ----------
+# Список — в подписанной куке, таблица — в кеше (catalog/compare.py)
+async def add_to_compare(request, pk):
+    car = await _aget_car(pk)
+    ids = compare.add(compare.get_ids(request), pk)
+    response = redirect(request.META.get('HTTP_REFERER', reverse_lazy('car_list')))
+    if ids is None:
+        messages.warning(request, f'Можно сравнивать не более {compare.MAX_CARS} автомобилей.')
+        return response
+    messages.success(request, f'{car} добавлен(а) к сравнению.')
+    return compare.save_ids(request, response, ids)
 
 
-def remove_from_compare(request, pk):
-    ids = _get_compare_ids(request)
-    ids.discard(pk)
-    request.session['compare_ids'] = list(ids)
-    return redirect('compare')
+async def remove_from_compare(request, pk):
+    ids = compare.remove(compare.get_ids(request), pk)
+    return compare.save_ids(request, redirect('compare'), ids)
 
 
-def compare_view(request):
-    ids = request.session.get('compare_ids', [])
-    cars = Car.objects.filter(id__in=ids)
-    return render(request, 'catalog/compare.html', {'cars': cars})
+@conditional_page('compare')
+async def compare_view(request):
+    # Кеш таблицы (ключ — по штампам из общего кеша) и отрисовка — один переход в поток
+    matrix = await sync_to_async(compare.matrix)(compare.get_ids(request))
+    return TemplateResponse(request, 'catalog/compare.html', {'matrix': mark_safe(matrix)})
 
 
 # ---------- Регистрация ----------
@@ -135,43 +244,102 @@ class RegisterView(FormView):
 
 
 # ---------- ИЗБРАННОЕ ----------
-@login_required
-def favorite_toggle(request, pk):
+def _toggle_favorite(user_id, car_id):
+    # DELETE, а если нечего — INSERT; счётчик в той же транзакции (см. catalog/favorites.py)
+    created = favorites.toggle(user_id, car_id)
+    return created, favorites.get_count(user_id)
+
+
+async def favorite_toggle(request, pk):
     """
     Добавить/убрать авто в избранное для текущего пользователя.
     Возвращает JSON для AJAX (status, count), а при обычном запросе — редирект.
     """
-    car = get_object_or_404(Car, pk=pk)
-    fav, created = Favorite.objects.get_or_create(user=request.user, car=car)
+    user = await _auser(request)
+    if not user.is_authenticated:
+        # login_required в Django 4.2 не умеет async-представления
+        return redirect_to_login(request.get_full_path())
+    car = await _aget_car(pk)
+    # atomic() не работает в async-коде — транзакция целиком в потоке
+    created, count = await sync_to_async(_toggle_favorite)(user.pk, car.pk)
     if created:
         status = 'added'
         messages.success(request, f'{car} добавлен(а) в избранное.')
     else:
-        fav.delete()
         status = 'removed'
         messages.info(request, f'{car} удалён(а) из избранного.')
 
     # AJAX?
     if request.headers.get('x-requested-with') == 'XMLHttpRequest':
-        count = Favorite.objects.filter(user=request.user).count()
         return JsonResponse({'status': status, 'count': count})
 
     # обычный переход
     return redirect(request.META.get('HTTP_REFERER', reverse_lazy('car_list')))
 
 
+def _favorite_ids(data):
+    """id авто из JSON-списка или повторяющегося поля формы; ValueError/TypeError — не список чисел."""
+    if data is None:
+        return []
+    if not isinstance(data, list):
+        raise TypeError(data)
+    return [int(value) for value in data]
+
+
+def _favorite_batch(user_id, add, remove):
+    added, removed = favorites.update(user_id, add, remove)
+    return added, removed, favorites.get_count(user_id)
+
+
+async def favorite_batch(request):
+    """
+    Пакетное изменение избранного: POST с JSON {"add": [id, ...], "remove": [id, ...]}
+    (или поля формы add/remove). Один INSERT и один DELETE на весь пакет;
+    ответ — {"added": n, "removed": n, "count": всего в избранном}.
+    """
+    if request.method != 'POST':
+        return JsonResponse({'error': 'нужен POST'}, status=405, headers={'Allow': 'POST'})
+    user = await _auser(request)
+    if not user.is_authenticated:
+        return JsonResponse({'error': 'нужен вход'}, status=401)
+    try:
+        if request.content_type == 'application/json':
+            data = json.loads(request.body or b'{}')
+            add, remove = _favorite_ids(data.get('add')), _favorite_ids(data.get('remove'))
+        else:
+            add, remove = _favorite_ids(request.POST.getlist('add')), _favorite_ids(request.POST.getlist('remove'))
+    except (ValueError, TypeError, AttributeError):
+        return JsonResponse({'error': 'add/remove — списки id авто'}, status=400)
+    if len(set(add)) + len(set(remove)) > favorites.MAX_BATCH:
+        return JsonResponse({'error': f'не больше {favorites.MAX_BATCH} авто за раз'}, status=400)
+    added, removed, count = await sync_to_async(_favorite_batch)(user.pk, add, remove)
+    return JsonResponse({'added': added, 'removed': removed, 'count': count})
+
+
 class FavoriteListView(LoginRequiredMixin, ListView):
     template_name = 'catalog/favorites.html'
     context_object_name = 'cars'
+    paginate_by = 12
+    # Число строк — из счётчика избранного (catalog/favorites.py), без COUNT(*);
+    # разошёлся с таблицей — страница всё равно полная, а счётчик пересчитывается
+    paginator_class = KnownCountPaginator
 
     def get_queryset(self):
+        # Недавно добавленные выше; JOIN с избранным — тот же, что в фильтре
         return (Car.objects
                 .filter(favorited_by__user=self.request.user)
-                .select_related('brand', 'model'))
+                .select_related('brand', 'model')
+                .order_by('-favorited_by__created_at', '-favorited_by__id'))
+
+    def get_paginator(self, queryset, per_page, **kwargs):
+        user_id = self.request.user.pk
+        return super().get_paginator(queryset, per_page, count=favorites.get_count(user_id),
+                                     on_mismatch=lambda: favorites.repair([user_id]), **kwargs)
 
     def get_context_data(self, **kwargs):
         ctx = super().get_context_data(**kwargs)
-        ids = set(self.get_queryset().values_list('id', flat=True))
+        # Все авто на странице — из избранного, второй запрос не нужен
+        ids = {car.pk for car in ctx['object_list']}
         ctx['fav_ids'] = ids
         ctx['favorite_ids'] = ids
         return ctx
@@ -0,0 +1,150 @@
+"""
+Прогрев процесса до первого запроса и замеры старта.
+
+После деплоя или перезапуска воркера первые запросы к каталогу платили
+за всё сразу: компиляцию шаблонов, разбор URLconf, открытие соединений
+с БД (PRAGMA, см. catalog/db.py), пустые кеши справочника и штампов.
+autoguide/wsgi.py и asgi.py зовут run() сразу после создания приложения —
+до того, как сервер начнёт принимать запросы:
+  - соединения с БД (основное и для чтения);
+  - URLconf;
+  - все шаблоны из settings.TEMPLATES DIRS — в кеш cached.Loader;
+  - справочник марок/моделей (catalog/lookups.py) и штампы каталога;
+  - индекс похожих авто, если есть снимок (catalog/similar.py);
+  - запросы к settings.WARMUP_URLS через тестовый клиент: страницы
+    и их данные попадают в кеши, а страницы БД — в кеш ОС.
+В конце соединения с БД закрываются: под gunicorn --preload прогрев идёт
+в мастере, и воркеры после fork унаследовали бы его открытые дескрипторы
+SQLite (а с ними блокировки и состояние, которые нельзя делить между
+процессами). Каждый воркер откроет свои на первом запросе — это PRAGMA,
+а не чтение с диска: файл БД уже в кеше ОС.
+
+Замеры (старт интерпретатора не считается — от импорта wsgi/asgi):
+импорт и загрузка приложений, создание приложения, каждый шаг прогрева.
+Пишутся в лог catalog.warmup и отдаются в metrics/ (report()).
+Отключить прогрев — AUTOGUIDE_WARMUP=0 (или WARMUP = False в настройках).
+Холодный старт и первый запрос меряет команда bench_cold_start.
+"""
+import logging
+import time
+from pathlib import Path
+
+from django.conf import settings
+from django.db import connections
+from django.template.loader import get_template
+from django.urls import get_resolver
+
+logger = logging.getLogger(__name__)
+
+_marks = {}
+_report = {}
+
+
+def mark(name):
+    """Отметка времени этапа старта (perf_counter)."""
+    _marks[name] = time.perf_counter()
+
+
+def _ms(start, end):
+    return round((end - start) * 1000, 1)
+
+
+def enabled():
+    return getattr(settings, 'WARMUP', True)
+
+
+# ---------- Шаги ----------
+def _connections():
+    from .db import read_alias
+    for alias in dict.fromkeys(('default', read_alias())):
+        connections[alias].ensure_connection()
+
+
+def _urls():
+    get_resolver().url_patterns  # noqa: B018  (импорт urls.py и представлений)
+
+
+def template_names():
+    """Все шаблоны из каталогов DIRS движка шаблонов (templates/ проекта)."""
+    names = []
+    for engine in settings.TEMPLATES:
+        for directory in map(Path, engine.get('DIRS', ())):
+            names += sorted(p.relative_to(directory).as_posix()
+                            for p in directory.rglob('*.html') if p.is_file())
+    return names
+
+
+def _templates():
+    for name in template_names():
+        get_template(name)
+
+
+def _lookups():
+    from . import lookups, stamps
+    stamps.get()
+    lookups.get()
+
+
+def _similar():
+    from . import similar
+    if similar.available() and (similar.index_dir() / 'meta.json').exists():
+        similar.get_index()
+
+
+def _requests():
+    from django.test import Client  # тяжёлый импорт — только когда прогреваем
+    from . import metrics
+    hosts = [h.lstrip('.') for h in settings.ALLOWED_HOSTS if h != '*']
+    client = Client(HTTP_HOST=hosts[0] if hosts else 'localhost')
+    for url in getattr(settings, 'WARMUP_URLS', ()):
+        client.get(url)
+    # Прогревочные запросы — не в гистограммы metrics/
+    metrics.reset()
+
+
+STEPS = (
+    ('connections', _connections),
+    ('urls', _urls),
+    ('templates', _templates),
+    ('lookups', _lookups),
+    ('similar', _similar),
+    ('requests', _requests),
+)
+
+
+def warm():
+    """Прогреть процесс; {шаг: мс}. Сбой шага не мешает старту — только пишется в лог."""
+    timings = {}
+    for name, step in STEPS:
+        started = time.perf_counter()
+        try:
+            step()
+        except Exception:
+            logger.exception('Прогрев: шаг %s не удался', name)
+        timings[name] = _ms(started, time.perf_counter())
+    # Не оставлять соединений процессам, которые fork'нутся от этого (см. выше)
+    connections.close_all()
+    return timings
+
+
+def run(entry, started):
+    """
+    Вызывается из wsgi.py/asgi.py после get_*_application();
+    started — perf_counter() в начале модуля.
+    """
+    mark('application')
+    report = {
+        'entry': entry,
+        'apps_ms': _ms(started, _marks.get('ready', started)),
+        'application_ms': _ms(started, _marks['application']),
+        'warmup': warm() if enabled() else None,
+    }
+    report['total_ms'] = _ms(started, time.perf_counter())
+    _report.update(report)
+    logger.info('Старт %s: %s мс (приложения %s мс, прогрев %s)', entry, report['total_ms'],
+                report['apps_ms'], report['warmup'] or 'выключен')
+    return report
+
+
+def report():
+    return dict(_report)